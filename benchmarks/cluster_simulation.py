@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Convergence and message amplification of NetworkMemory clusters by topology.
+
+Builds clusters of real NetworkMemory objects on a simulated network of
+LoopbackConnectors, sets a key on one node, and reports how long, in
+simulated time, until every node has it and how many messages that took
+per node.  With a batch size above one, that many keys go out together in
+one message.
+
+    python3 cluster_simulation.py --topologies mesh random --latency 0.005 --loss 0.01 10 100 500
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+sys.path.append("..")  # because "benchmarks" directory is sibling to the package
+from netmem.loopback_connector import Link
+from netmem.simulation import Cluster, TOPOLOGIES
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topologies", nargs="+", default=list(TOPOLOGIES), choices=TOPOLOGIES)
+    parser.add_argument("--degree", type=int, default=3, help="links per node in the random topology")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per hop")
+    parser.add_argument("--jitter", type=float, default=0.001, help="up to this many extra seconds per hop")
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of messages dropped")
+    parser.add_argument("--reorder", type=float, default=0.0, help="fraction of messages overtaken")
+    parser.add_argument("--bandwidth", type=float, help="bytes per second per link")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1], help="keys set together in one message")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("sizes", nargs="*", type=int, default=[10, 100, 300])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    link = Link(latency=args.latency, jitter=args.jitter, loss=args.loss, reorder=args.reorder,
+                bandwidth=args.bandwidth)
+    results = []
+    for topology in args.topologies:
+        for size in args.sizes:
+            cluster = Cluster(size, topology=topology, link=link, degree=args.degree, seed=args.seed)
+            try:
+                for batch in args.batch:
+                    result = cluster.converge(batch=batch)
+                    results.append(result)
+                    print("{topology:<7} {nodes:>6} nodes batch {batch:<4}: {seconds:8.4f} sec, "
+                          "{reached:>6} reached, {amplification:7.2f} msgs per node, {bytes:>10} bytes".format(
+                              **result), file=sys.stderr)
+            finally:
+                cluster.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
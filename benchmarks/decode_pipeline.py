@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Measures inbound decode throughput with and without worker processes.
+
+A burst of encoded messages, each a batch of nested telemetry readings,
+is fed to a DecodePipeline the way a connector would feed it, and the
+script reports how many messages per second come back decoded, in order,
+on the event loop.  Run with several worker counts to see how decoding
+scales with cores:
+
+    python3 decode_pipeline.py --workers 0 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.append("..")  # because "benchmarks" directory is sibling to the package
+from netmem.codec import MessageCodec
+from netmem.pipeline import DecodePipeline
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+def make_payloads(count: int, readings: int, codec: MessageCodec) -> [bytes]:
+    payloads = []
+    for i in range(count):
+        value = [{"id": "robot-{}".format(r), "pose": [r * 0.5, i * 0.25, 0.0],
+                  "battery": 12.6 - r / 1000, "status": {"ok": True, "mode": "auto"}}
+                 for r in range(readings)]
+        msg = {"name": "bench", "node": "sender", "sent": time.time(),
+               "changes": [{"key": "fleet/{}".format(i % 50), "action": "update",
+                            "new_val": value, "timestamp": [1000.0 + i, 0, "sender"]}]}
+        payloads.append(codec.encode(msg))
+    return payloads
+
+
+def run(payloads: [bytes], workers: int, burst: int, codec: MessageCodec) -> (float, float):
+    """
+    Returns decoded messages per second and the CPU seconds spent in this
+    process, not counting the workers.  With the GIL that is what caps a node.
+    """
+    if not workers:
+        start, cpu = time.perf_counter(), time.process_time()
+        received = [codec.decode(data) for data in payloads]
+        return len(received) / (time.perf_counter() - start), time.process_time() - cpu
+
+    loop = asyncio.new_event_loop()
+    pipeline = DecodePipeline(workers=workers, min_batch=1, max_batch=max(1, burst // workers))
+    received = []
+    pipeline.start(loop, codec, lambda _, msgs: received.extend(msgs))
+    try:
+        feed_all(loop, pipeline, payloads[:workers * 4], burst, received)  # Start the worker processes
+        received.clear()
+        start, cpu = time.perf_counter(), time.process_time()
+        feed_all(loop, pipeline, payloads, burst, received)
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+    finally:
+        pipeline.close()
+        loop.close()
+
+    stamps = [m["changes"][0]["timestamp"][0] for m in received]
+    assert stamps == sorted(stamps), "messages came back out of order"
+    return len(received) / elapsed, cpu
+
+
+def feed_all(loop, pipeline: DecodePipeline, payloads: [bytes], burst: int, received: list):
+    """ Feeds payloads a burst at a time, as a connector would, and waits for them all to come back. """
+    expected = len(received) + len(payloads)
+
+    async def _feed():
+        for i in range(0, len(payloads), burst):
+            pipeline.feed(payloads[i:i + burst])
+            await asyncio.sleep(0)
+        while len(received) < expected:
+            await asyncio.sleep(0.001)
+
+    loop.run_until_complete(_feed())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4], help="worker counts to try")
+    parser.add_argument("--messages", type=int, default=2000, help="messages per run")
+    parser.add_argument("--readings", type=int, default=40, help="readings per message (sets message size)")
+    parser.add_argument("--burst", type=int, default=200, help="messages fed to the pipeline at a time")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    codec = MessageCodec()
+    payloads = make_payloads(args.messages, args.readings, codec)
+    size = sum(len(p) for p in payloads) / len(payloads)
+    print("{} messages of {:.0f} bytes, {} cores".format(len(payloads), size, os.cpu_count()))
+
+    results = []
+    for workers in args.workers:
+        rate, cpu = run(payloads, workers, args.burst, codec)
+        results.append({"workers": workers, "msgs_per_sec": round(rate), "parent_cpu_sec": round(cpu, 3)})
+        print("workers={:<3} {:>10.0f} msgs/sec {:>8.1f} MB/sec {:>8.3f} parent CPU sec".format(
+            workers, rate, rate * size / 1e6, cpu))
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+In-process simulation of GossipConnector clusters.
+
+Every node is a real NetworkMemory with a real GossipConnector, but the
+datagrams travel through an in-memory network that delivers everything
+sent in one round at the start of the next one, optionally dropping some.
+Each round also runs one anti-entropy exchange per node.
+
+For each cluster size, one random node sets a key and the simulation counts
+the rounds until every node holds the new value, along with how many
+messages and bytes each node sent per round on average.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import sys
+
+sys.path.append("..")  # because "benchmarks" directory is sibling to the package
+import netmem
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+class SimNetwork(object):
+    def __init__(self, loss: float = 0.0):
+        self.loss = loss
+        self.nodes = {}  # type: {(str, int): netmem.GossipConnector}
+        self.in_flight = []
+        self.messages = 0
+        self.bytes = 0
+
+    def deliver(self):
+        """ Delivers everything sent since the last call.  Anything sent while delivering waits for the next. """
+        batch, self.in_flight = self.in_flight, []
+        for data, src, dst in batch:
+            if dst in self.nodes and random.random() >= self.loss:
+                self.nodes[dst].datagram_received(data, src)
+
+
+class SimTransport(object):
+    """ Stands in for an asyncio.DatagramTransport. """
+
+    def __init__(self, network: SimNetwork, addr: (str, int)):
+        self.network = network
+        self.addr = addr
+
+    def sendto(self, data: bytes, addr: (str, int)):
+        self.network.messages += 1
+        self.network.bytes += len(data)
+        self.network.in_flight.append((data, self.addr, tuple(addr)))
+
+    def close(self):
+        pass
+
+
+def build_cluster(size: int, fanout: int, loss: float, loop) -> (SimNetwork, [netmem.NetworkMemory]):
+    network = SimNetwork(loss=loss)
+    addrs = [("10.{}.{}.{}".format(i >> 16, (i >> 8) & 0xff, i & 0xff), 9990) for i in range(size)]
+    seeds = addrs[:3]
+    mems = []
+    for addr in addrs:
+        mem = netmem.NetworkMemory(name=str(addr))
+        conn = netmem.GossipConnector(local_addr=addr, seeds=seeds, fanout=fanout)
+        netmem.Connector.connect(conn, mem, mem, loop=loop)  # Wire up without opening a socket
+        conn.connection_made(SimTransport(network, addr))
+        network.nodes[addr] = conn
+        mems.append(mem)
+    return network, mems
+
+
+def run_round(network: SimNetwork):
+    network.deliver()
+    for conn in list(network.nodes.values()):
+        conn.gossip_round()
+
+
+def simulate(size: int, fanout: int, loss: float, warmup: int, max_rounds: int) -> dict:
+    loop = asyncio.new_event_loop()
+    network, mems = build_cluster(size, fanout, loss, loop)
+    for _ in range(warmup):  # Let membership spread from the seeds
+        run_round(network)
+
+    network.messages = network.bytes = 0
+    random.choice(mems)["probe"] = "hello"
+    rounds = 0
+    while rounds < max_rounds and any(m.get("probe") != "hello" for m in mems):
+        run_round(network)
+        rounds += 1
+
+    loop.close()
+    return {"nodes": size, "rounds": rounds,
+            "converged": all(m.get("probe") == "hello" for m in mems),
+            "msgs_per_node_round": network.messages / size / max(rounds, 1),
+            "bytes_per_node_round": network.bytes / size / max(rounds, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of datagrams dropped")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--max-rounds", type=int, default=100)
+    parser.add_argument("sizes", nargs="*", type=int, default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    logging.getLogger("netmem").setLevel(logging.WARNING)
+    for size in args.sizes:
+        result = simulate(size, args.fanout, args.loss, args.warmup, args.max_rounds)
+        print("{nodes:>6} nodes : {rounds:>3} rounds (converged={converged}), "
+              "{msgs_per_node_round:6.2f} msgs and {bytes_per_node_round:8.1f} bytes per node per round".format(
+                  **result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Measures set() throughput of ShardedNetworkMemory as the number of shards grows.
+
+Each shard's NetworkMemory gets a CaptureConnector writing to the null
+device, so every set is applied, passed to listeners, encoded and written,
+as it would be with a network connector.  Sets are made from the parent
+in "with" blocks of --batch keys, and each run ends when every worker has
+applied all of them.  Shards of 0 means a plain NetworkMemory in this
+process, for comparison:
+
+    python3 sharded.py --shards 0 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.append("..")  # because "benchmarks" directory is sibling to the package
+from netmem.capture_connector import CaptureConnector
+from netmem.network_memory import NetworkMemory
+from netmem.sharded import ShardedNetworkMemory
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+def null_capture(shard: int):
+    return [CaptureConnector(os.devnull)]
+
+
+def run(shards: int, sets: int, batch: int, keys: int) -> float:
+    """ Returns sets per second. """
+    if not shards:
+        loop = asyncio.new_event_loop()
+        mem = NetworkMemory(heartbeat_interval=0)
+        mem.connect(null_capture(0)[0], loop=loop)
+        start = time.perf_counter()
+        for i in range(0, sets, batch):
+            with mem:
+                for j in range(i, min(i + batch, sets)):
+                    mem["sensor/{}".format(j % keys)] = j
+        elapsed = time.perf_counter() - start
+        mem.close_all()
+        loop.close()
+        return sets / elapsed
+
+    mem = ShardedNetworkMemory(shards=shards, connectors=null_capture, heartbeat_interval=0)
+    try:
+        mem.sync()  # Workers started
+        start = time.perf_counter()
+        for i in range(0, sets, batch):
+            with mem:
+                for j in range(i, min(i + batch, sets)):
+                    mem["sensor/{}".format(j % keys)] = j
+        mem.sync()
+        return sets / (time.perf_counter() - start)
+    finally:
+        mem.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=[0, 1, 2, 4], help="shard counts to try")
+    parser.add_argument("--sets", type=int, default=200000, help="sets per run")
+    parser.add_argument("--batch", type=int, default=500, help="sets per with block")
+    parser.add_argument("--keys", type=int, default=10000, help="distinct keys")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print("{} cores".format(os.cpu_count()), file=sys.stderr)
+    results = []
+    for shards in args.shards:
+        rate = run(shards, args.sets, args.batch, args.keys)
+        results.append({"shards": shards, "sets_per_sec": round(rate)})
+        print("shards={:<3} {:>10.0f} sets/sec".format(shards, rate), file=sys.stderr)
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Compares SharedMemoryConnector with UdpConnector over loopback.
+
+A second process echoes every "ping" value back as "pong", so latency is
+measured as a round trip from one process.  Throughput is how many distinct
+updates per second the first process can push while the second one counts
+how many of them arrive.
+"""
+
+import argparse
+import multiprocessing
+import statistics
+import sys
+import threading
+import time
+
+sys.path.append("..")  # because "benchmarks" directory is sibling to the package
+import netmem
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+UDP_A = ("127.0.0.1", 9961)
+UDP_B = ("127.0.0.1", 9962)
+
+
+def make_connector(transport, side):
+    if transport == "shm":
+        return netmem.SharedMemoryConnector(channel="bench", poll_interval=0.1)
+    elif side == "a":
+        return netmem.UdpConnector(local_addr=UDP_A, remote_addr=UDP_B)
+    else:
+        return netmem.UdpConnector(local_addr=UDP_B, remote_addr=UDP_A)
+
+
+def echo_process(transport, ready, done):
+    mem = netmem.NetworkMemory()
+    seen = set()
+
+    def _changed(_, key, old_val, new_val):
+        if key == "ping":
+            mem["pong"] = new_val
+        elif key == "burst":
+            seen.add(new_val)
+        elif key == "report":
+            mem["received"] = len(seen)
+
+    mem.add_listener(_changed)
+    mem.connect_on_new_thread(make_connector(transport, "b"))
+    ready.set()
+    done.wait()
+    mem.close_all()
+    time.sleep(0.2)
+
+
+def run(transport, rounds, burst):
+    ready = multiprocessing.Event()
+    done = multiprocessing.Event()
+    proc = multiprocessing.Process(target=echo_process, args=(transport, ready, done))
+    proc.start()
+    ready.wait()
+
+    mem = netmem.NetworkMemory()
+    pong = threading.Event()
+    received = threading.Event()
+
+    def _changed(_, key, old_val, new_val):
+        if key == "pong":
+            pong.set()
+        elif key == "received":
+            received.set()
+
+    mem.add_listener(_changed)
+    mem.connect_on_new_thread(make_connector(transport, "a"))
+    time.sleep(0.5)  # Give both sides time to find each other
+
+    rtts = []
+    for i in range(rounds):
+        pong.clear()
+        start = time.perf_counter()
+        mem["ping"] = i
+        if pong.wait(1):
+            rtts.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(burst):
+        mem["burst"] = i
+    elapsed = time.perf_counter() - start
+    time.sleep(0.5)
+    mem["report"] = 1
+    received.wait(2)
+    delivered = mem.get("received", 0)
+
+    done.set()
+    proc.join()
+    mem.close_all()
+    time.sleep(0.2)
+
+    print("{:>4} : rtt median {:8.1f} us  p99 {:8.1f} us  ({} of {} answered)".format(
+        transport,
+        statistics.median(rtts) * 1e6 if rtts else float("nan"),
+        sorted(rtts)[int(len(rtts) * 0.99) - 1] * 1e6 if rtts else float("nan"),
+        len(rtts), rounds))
+    print("{:>4} : {:8.0f} sets/s sent, {} of {} delivered".format(
+        transport, burst / elapsed, delivered, burst))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=1000)
+    parser.add_argument("--burst", type=int, default=20000)
+    parser.add_argument("transports", nargs="*", default=["shm", "udp"])
+    args = parser.parse_args()
+    for transport in args.transports:
+        run(transport, args.rounds, args.burst)
+
+
+if __name__ == "__main__":
+    main()
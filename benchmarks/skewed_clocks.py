@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Measures redundant traffic when peers' clocks disagree and the network
+reorders and duplicates messages.
+
+Several NetworkMemory objects are linked all-to-all in process.  Messages
+wait in one shared queue and are delivered in random order, and some are
+delivered twice.  Every node's wall clock is offset by a random skew.  After
+a burst of conflicting writes to a handful of keys, the queue is drained
+until quiet and the script reports how many messages went out for each
+local write and whether every node ended up with the same values.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+
+sys.path.append("..")  # because "benchmarks" directory is sibling to the package
+import netmem
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+class QueueConnector(netmem.Connector):
+    """ Puts every outgoing message on a shared queue addressed to each of the other nodes. """
+
+    def __init__(self, queue: list, others: list):
+        super().__init__()
+        self.queue = queue
+        self.others = others
+        self.sent = 0
+
+    def send_message(self, msg: dict):
+        if "changes" not in msg:
+            return
+        data = json.dumps(msg)
+        for other in self.others:
+            self.queue.append((other, data))
+            self.sent += 1
+
+
+def run(nodes: int, keys: int, writes: int, skew: float, duplicate: float, max_messages: int) -> dict:
+    loop = asyncio.new_event_loop()
+    queue = []
+    mems = [netmem.NetworkMemory(name="n{}".format(i), heartbeat_interval=0) for i in range(nodes)]
+    connectors = []
+    for mem in mems:
+        offset = random.uniform(-skew, skew)
+        mem._clock.clock = lambda offset=offset: time.time() + offset
+        connector = QueueConnector(queue, [])
+        connectors.append(connector)
+        mem.connect(connector, loop=loop)
+        mem.connection_made(connector)
+    for mem, connector in zip(mems, connectors):
+        connector.others = [c for c in connectors if c is not connector]
+
+    for i in range(writes):
+        random.choice(mems)["k{}".format(random.randrange(keys))] = i
+
+    delivered = 0
+    while queue and delivered < max_messages:
+        target, data = queue.pop(random.randrange(len(queue)))
+        if random.random() < duplicate:
+            queue.append((target, data))
+        target.listener.message_received(target, json.loads(data))
+        delivered += 1
+
+    loop.close()
+    return {"writes": writes, "messages": sum(c.sent for c in connectors),
+            "converged": all(dict(m) == dict(mems[0]) for m in mems), "quiet": not queue}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=4)
+    parser.add_argument("--keys", type=int, default=5)
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--skew", type=float, default=5.0, help="largest clock offset in seconds")
+    parser.add_argument("--duplicate", type=float, default=0.1, help="fraction of messages delivered twice")
+    parser.add_argument("--max-messages", type=int, default=200000)
+    args = parser.parse_args()
+
+    logging.getLogger("netmem").setLevel(logging.WARNING)
+    result = run(args.nodes, args.keys, args.writes, args.skew, args.duplicate, args.max_messages)
+    print("{writes} writes : {messages} messages sent ({:.2f} per write), converged={converged}, quiet={quiet}".format(
+        result["messages"] / result["writes"], **result))
+
+
+if __name__ == "__main__":
+    main()
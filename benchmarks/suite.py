@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmarks of netmem's sync paths, with machine-readable results.
+
+    python3 suite.py --output before.json
+    ... change something ...
+    python3 suite.py --output after.json --compare before.json
+
+Measures:
+
+    set             BindableDict.set() calls per second with 0 to 100 listeners
+    logging         NetworkMemory.set() per second with and without a LoggingConnector
+    latency_udp     set-to-remote-apply latency percentiles over UDP on localhost
+    latency_ws      the same over WsServerConnector and WsClientConnector
+    full_state      encoding, decoding and applying a whole memory, as dict size grows
+    import          milliseconds to import netmem, then to load a connector, in a fresh interpreter
+    prefix          keys(prefix=...) and count(prefix=...) over 200k keys, with and without key_index
+
+Each result is a flat dictionary of numbers, so two runs can be compared
+key by key.  A benchmark that cannot run here, eg, without aiohttp,
+records its error instead of numbers.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.append("..")  # because "benchmarks" directory is sibling to the package
+import netmem
+from netmem.__version__ import __version__ as netmem_version
+from netmem.bindable_variable import BindableDict
+from netmem.codec import MessageCodec
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+def percentiles(samples: [float], prefix: str) -> dict:
+    samples = sorted(samples)
+    if not samples:
+        return {}
+
+    def _at(p):
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+
+    return {prefix + "p50_ms": _at(50) * 1000, prefix + "p90_ms": _at(90) * 1000,
+            prefix + "p99_ms": _at(99) * 1000, prefix + "max_ms": samples[-1] * 1000,
+            prefix + "mean_ms": statistics.mean(samples) * 1000}
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench_set(count: int) -> dict:
+    results = {}
+    for listeners in (0, 1, 10, 100):
+        d = BindableDict()
+        for _ in range(listeners):
+            d.add_listener(lambda _d, _k, _o, _n: None)
+        start = time.perf_counter()
+        for i in range(count):
+            d["key{}".format(i % 1000)] = i
+        results["listeners_{}_sets_per_sec".format(listeners)] = count / (time.perf_counter() - start)
+    return results
+
+
+def bench_logging(count: int) -> dict:
+    results = {}
+    loop = asyncio.new_event_loop()
+    try:
+        for name, connect in (("bare", False), ("logging_connector", True)):
+            mem = netmem.NetworkMemory(heartbeat_interval=0)
+            if connect:
+                logging.getLogger("netmem.connector.LoggingConnector").disabled = True  # Measure the path, not the terminal
+                mem.connect(netmem.LoggingConnector(), loop=loop)
+            start = time.perf_counter()
+            for i in range(count):
+                mem["key{}".format(i % 1000)] = i
+            results[name + "_sets_per_sec"] = count / (time.perf_counter() - start)
+    finally:
+        loop.close()
+    results["overhead_pct"] = 100 * (results["bare_sets_per_sec"] / results["logging_connector_sets_per_sec"] - 1)
+    return results
+
+
+def _measure_latency(sender: netmem.NetworkMemory, receiver: netmem.NetworkMemory, count: int,
+                     interval: float) -> [float]:
+    """ Sets keys on sender and times how long each takes to show up on receiver. """
+    arrived = {}
+    receiver.add_listener(lambda _d, key, _o, _n: arrived.setdefault(key, time.perf_counter()))
+    sent = {}
+    for i in range(count):
+        key = "lat{}".format(i)
+        sent[key] = time.perf_counter()
+        sender[key] = i
+        time.sleep(interval)
+    deadline = time.time() + 2
+    while len(arrived) < count and time.time() < deadline:
+        time.sleep(0.01)
+    return [arrived[k] - sent[k] for k in sent if k in arrived]
+
+
+def _run_loop() -> asyncio.AbstractEventLoop:
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+
+def bench_latency_udp(count: int) -> dict:
+    loop = _run_loop()
+    a_port, b_port = free_port(), free_port()
+    a = netmem.NetworkMemory(heartbeat_interval=0)
+    b = netmem.NetworkMemory(heartbeat_interval=0)
+    a.connect(netmem.UdpConnector(local_addr=("127.0.0.1", a_port), remote_addr=("127.0.0.1", b_port)), loop=loop)
+    b.connect(netmem.UdpConnector(local_addr=("127.0.0.1", b_port), remote_addr=("127.0.0.1", a_port)), loop=loop)
+    time.sleep(0.2)
+    try:
+        samples = _measure_latency(a, b, count, 0.001)
+    finally:
+        a.close_all()
+        b.close_all()
+        time.sleep(0.1)
+        loop.call_soon_threadsafe(loop.stop)
+    results = percentiles(samples, "")
+    results["delivered_pct"] = 100 * len(samples) / count
+    return results
+
+
+def bench_latency_ws(count: int) -> dict:
+    loop = _run_loop()
+    port = free_port()
+    server = netmem.NetworkMemory(heartbeat_interval=0)
+    client = netmem.NetworkMemory(heartbeat_interval=0)
+    try:
+        server.connect(netmem.WsServerConnector(host="127.0.0.1", port=port), loop=loop)
+        time.sleep(0.3)
+        client.connect(netmem.WsClientConnector(url="ws://127.0.0.1:{}/ws_updates".format(port)), loop=loop)
+        time.sleep(0.3)
+        if not client._connectors:
+            raise RuntimeError("websocket client did not connect")
+        samples = _measure_latency(client, server, count, 0.001)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+    results = percentiles(samples, "")
+    results["delivered_pct"] = 100 * len(samples) / count
+    return results
+
+
+def bench_full_state(sizes: [int]) -> dict:
+    results = {}
+    codec = MessageCodec()
+    for size in sizes:
+        source = netmem.NetworkMemory(heartbeat_interval=0)
+        with source:
+            for i in range(size):
+                source["robot/{}/pose".format(i)] = {"x": i * 0.5, "y": i * 0.25, "ok": True}
+        start = time.perf_counter()
+        data = codec.encode(source.state_message())
+        encoded = time.perf_counter()
+        msg = codec.decode(data)
+        decoded = time.perf_counter()
+        target = netmem.NetworkMemory(heartbeat_interval=0)
+        target.message_received(None, msg)
+        applied = time.perf_counter()
+        assert len(target) == size
+
+        prefix = "keys_{}_".format(size)
+        results[prefix + "bytes"] = len(data)
+        results[prefix + "encode_ms"] = (encoded - start) * 1000
+        results[prefix + "decode_ms"] = (decoded - encoded) * 1000
+        results[prefix + "apply_ms"] = (applied - decoded) * 1000
+        results[prefix + "total_ms"] = (applied - start) * 1000
+    return results
+
+
+def bench_prefix(keys: int = 200000, queries: int = 100) -> dict:
+    results = {}
+    for name, indexed in (("scan", False), ("indexed", True)):
+        mem = netmem.NetworkMemory(heartbeat_interval=0, key_index=indexed)
+        start = time.perf_counter()
+        with mem:
+            for i in range(keys):
+                mem["robot/{}/{}".format(i % 2000, i)] = i
+        results[name + "_fill_sec"] = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(queries):
+            mem.keys(prefix="robot/{}/".format(i))
+        results[name + "_keys_ms"] = (time.perf_counter() - start) / queries * 1000
+        start = time.perf_counter()
+        for i in range(queries):
+            mem.count(prefix="robot/{}/".format(i))
+        results[name + "_count_ms"] = (time.perf_counter() - start) / queries * 1000
+    return results
+
+
+def _import_ms(attribute: str = None) -> [float]:
+    """
+    Returns milliseconds to import netmem and then to get attribute from it,
+    the fastest of three runs, each in a fresh interpreter.
+    """
+    code = ("import time; start = time.perf_counter(); import netmem; imported = time.perf_counter(); "
+            "{}; print(imported - start, time.perf_counter() - imported)").format(
+        "netmem." + attribute if attribute else "pass")
+    runs = []
+    for _ in range(3):
+        out = subprocess.run([sys.executable, "-c", code], cwd="..", stdout=subprocess.PIPE,
+                             universal_newlines=True, check=True).stdout
+        runs.append([float(t) * 1000 for t in out.split()])
+    return min(runs)
+
+
+def bench_import() -> dict:
+    results = {"netmem_ms": _import_ms()[0]}
+    for name in ("UdpConnector", "WsServerConnector"):
+        results[name + "_ms"] = _import_ms(name)[1]
+    return results
+
+
+def compare(before: dict, after: dict):
+    """ Prints the percent change of every number the two runs share. """
+    for bench, numbers in sorted(after["results"].items()):
+        old = before.get("results", {}).get(bench, {})
+        for name, value in sorted(numbers.items()):
+            if isinstance(value, (int, float)) and isinstance(old.get(name), (int, float)) and old[name]:
+                change = 100 * (value - old[name]) / old[name]
+                print("{:<12} {:<36} {:>14.3f} {:>+8.1f}%".format(bench, name, value, change))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", help="run only these benchmarks")
+    parser.add_argument("--sets", type=int, default=100000, help="set() calls per throughput run")
+    parser.add_argument("--samples", type=int, default=500, help="latency samples per transport")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="dict sizes for full_state")
+    parser.add_argument("--output", help="write results as JSON to this file as well as stdout")
+    parser.add_argument("--compare", help="print percent changes against an earlier results file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    benchmarks = {
+        "set": lambda: bench_set(args.sets),
+        "logging": lambda: bench_logging(args.sets // 10),
+        "latency_udp": lambda: bench_latency_udp(args.samples),
+        "latency_ws": lambda: bench_latency_ws(args.samples),
+        "full_state": lambda: bench_full_state(args.sizes),
+        "import": bench_import,
+        "prefix": bench_prefix,
+    }
+    report = {"netmem": netmem_version, "python": platform.python_version(),
+              "platform": platform.platform(), "time": time.time(), "results": {}}
+    for name, bench in benchmarks.items():
+        if args.only and name not in args.only:
+            continue
+        print("Running {}...".format(name), file=sys.stderr)
+        try:
+            report["results"][name] = bench()
+        except Exception as e:
+            report["results"][name] = {"error": "{}: {}".format(e.__class__.__name__, e)}
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,34 @@
+import sys
+import types
+
 from .network_memory import NetworkMemory
 from .connector import Connector, ConnectorListener
-from .udp_connector import UdpConnector
-from .websocket_connector import WsServerConnector, WsClientConnector
-from .logging_connector import LoggingConnector
+from .registry import register_connector, connector_class, connector_names
+
+# Connectors, eg, netmem.UdpConnector, are imported on first use; see netmem.registry
+
+
+def __getattr__(name):
+    try:
+        if not name.endswith("Connector"):
+            raise KeyError(name)  # Only connectors are looked up, so other names never read the entry points
+        cls = connector_class(name)
+    except KeyError:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name)) from None
+    globals()[name] = cls
+    return cls
+
+
+def __dir__():
+    return sorted(set(globals()) | set(connector_names()))
+
+
+if sys.version_info < (3, 7):  # Before module level __getattr__ (PEP 562), the module's class must supply it
+    class _LazyModule(types.ModuleType):
+        def __getattr__(self, name):
+            return __getattr__(name)
+
+        def __dir__(self):
+            return __dir__()
 
+    sys.modules[__name__].__class__ = _LazyModule
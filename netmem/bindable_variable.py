@@ -6,15 +6,58 @@ similar to the tkinter.StringVar, IntVar, etc classes.
 This is an extract from the code available at http://github.com/rharder/handy
 """
 
+import collections.abc
 import logging
-
+import sys
+import threading
 import time
+import uuid
+
+from . import budget
+from . import crdt
+from . import metrics
+from . import patch as _patch
+from . import tracing
+from .budget import MemoryBudget, SpilledValue, size_of
+from .hlc import HybridLogicalClock, Timestamp, ZERO
+from .keyindex import KeyIndex, prefix_bounds
+from .lazy import LazyValue, resolve
+from .region import NumericRegion
+from .snapshot import CowIndex, Snapshot
 
 __author__ = "Robert Harder"
 __email__ = "rob@iharder.net"
 __date__ = "5 Dec 2016"
 __license__ = "Public Domain"
 
+_cow_lock = threading.Lock()  # So two first snapshots of a dictionary build only one index
+
+
+class _SpilledValuesView(collections.abc.ValuesView):
+    """ values() of a dictionary with spilled values, which are read from disk without faulting them back in. """
+
+    def __iter__(self):
+        for val in dict.values(self._mapping):
+            yield self._mapping._read_spilled(val)
+
+    def __contains__(self, value):
+        return any(v is value or v == value for v in self)
+
+
+class _SpilledItemsView(collections.abc.ItemsView):
+    """ items() of a dictionary with spilled values, as for _SpilledValuesView. """
+
+    def __iter__(self):
+        for key, val in dict.items(self._mapping):
+            yield key, self._mapping._read_spilled(val)
+
+    def __contains__(self, item):
+        key, value = item
+        if not dict.__contains__(self._mapping, key):
+            return False
+        v = self._mapping._read_spilled(dict.__getitem__(self._mapping, key))
+        return v is value or v == value
+
 
 class BindableDict(dict):
     def __init__(self, *args, **kwargs):
@@ -22,33 +65,203 @@ class BindableDict(dict):
 
         self.log = logging.getLogger(__name__ + '.' + self.__class__.__name__)
         self.__listeners = []
+        self.__patch_listeners = []
         self._changes = []
-        self._timestamps = {}
+        self._timestamps = {}  # maps keys to the hlc.Timestamp of their last change
+        self._patch_marks = {}  # maps patched keys to (base value timestamp, {node: latest patch timestamp})
+        self._regions = {}  # type: {str: NumericRegion}
+        self._region_marks = {}  # maps region keys to {node: latest slice timestamp}
+        self._lazy_keys = set()  # keys whose values are LazyValues not yet read
+        self._cow = None  # type: CowIndex  # Shadow copy of the entries, from the first snapshot()
+        self._key_index = None  # type: KeyIndex  # Sorted keys, once index_keys() is called
+        self._budget = None  # type: MemoryBudget  # Bytes per key, once limit_memory() is called
         self._suspend_notifications = False
+        self.tracer = None  # type: tracing.Tracer
+        self.node_id = uuid.uuid4().hex
+        self._clock = HybridLogicalClock(self.node_id)
+
+        label = getattr(self, "name", None) or self.__class__.__name__  # NetworkMemory sets its name first
+        self._changes_metric = metrics.REGISTRY.counter("netmem_changes_total", "Changes made", memory=label)
+        self._listeners_metric = metrics.REGISTRY.histogram(
+            "netmem_listener_seconds", "Time spent calling listeners per round of notifications", memory=label)
 
     def __getitem__(self, key):
         val = super().__getitem__(key)
+        if isinstance(val, LazyValue):
+            val = self._decode_lazy(key, val)
+        elif self._budget is not None:
+            self._budget.hit(key)
+        return val
+
+    def get(self, key, default=None):
+        val = super().get(key, default)
+        if isinstance(val, LazyValue):
+            val = self._decode_lazy(key, val)
+        elif self._budget is not None and key in self:
+            self._budget.hit(key)
+        return val
+
+    def keys(self, prefix: str = None, start: str = None, stop: str = None):
+        """
+        With no arguments, the usual keys view.  Otherwise a sorted list of
+        the string keys beginning with prefix and within start <= key < stop.
+        Fast with index_keys(), a scan of every key without.
+        """
+        if prefix is None and start is None and stop is None:
+            return super().keys()
+        start, stop = prefix_bounds(prefix, start, stop)
+        if self._key_index is not None:
+            return list(self._key_index.irange(start, stop))
+        return sorted(k for k in super().keys()
+                      if type(k) is str and (start is None or k >= start) and (stop is None or k < stop))
+
+    def count(self, prefix: str = None, start: str = None, stop: str = None) -> int:
+        """ Returns how many keys keys() would return with the same arguments. """
+        if prefix is None and start is None and stop is None:
+            return len(self)
+        if self._key_index is not None:
+            return self._key_index.count(*prefix_bounds(prefix, start, stop))
+        return len(self.keys(prefix, start, stop))
+
+    def values(self):
+        if self._budget is not None and self._budget.spilled:
+            return _SpilledValuesView(self)  # Not faulting every value back in
+        self._decode_all_lazy()
+        return super().values()
+
+    def items(self, prefix: str = None, start: str = None, stop: str = None):
+        """ With no arguments, the usual items view.  Otherwise a sorted list as for keys(). """
+        if prefix is None and start is None and stop is None:
+            if self._budget is not None and self._budget.spilled:
+                return _SpilledItemsView(self)
+            self._decode_all_lazy()
+            return super().items()
+        return [(k, self[k]) for k in self.keys(prefix, start, stop)]
+
+    def index_keys(self):
+        """ Keeps the keys in sorted order from now on, for fast keys(prefix=...) and count(). """
+        if self._key_index is None:
+            self._key_index = KeyIndex(super().keys())
+        return self
+
+    def limit_memory(self, max_bytes: int = None, spill_path: str = None, **kwargs):
+        """
+        Keeps count of roughly how many bytes each key takes and, past
+        max_bytes, spills the least recently used values to disk; see
+        netmem.budget.  With no max_bytes, only keeps count.
+
+        :param spill_path: file for the spilled values, by default a temporary file
+        :param kwargs: passed to budget.MemoryBudget, eg, min_spill=4096
+        """
+        if self._budget is None:
+            label = getattr(self, "name", None) or self.__class__.__name__
+            self._budget = MemoryBudget(max_bytes, spill_path, label=label, **kwargs)
+            for key, val in super().items():
+                self._budget.account(key, val)
+        else:
+            self._budget.max_bytes = max_bytes
+        self._enforce_budget()
+        return self
+
+    def memory_usage(self) -> dict:
+        """ Returns approximate bytes in memory and spilled to disk, and counts of reads of each. """
+        if self._budget is not None:
+            return self._budget.usage()
+        resident = sum(budget.ENTRY_OVERHEAD + size_of(k) + size_of(v) for k, v in super().items())
+        return {"keys": len(self), "resident": resident, "spilled": 0, "spilled_keys": 0, "budget": None}
+
+    def memory_size(self, key) -> int:
+        """ Returns the approximate bytes key and its value take, or would take if its value were not spilled. """
+        if self._budget is not None:
+            return self._budget.size(key)
+        return budget.ENTRY_OVERHEAD + size_of(key) + size_of(super().__getitem__(key))
+
+    def _enforce_budget(self, keep=None):
+        """ Spills the least recently used values, other than keep's, until back under the budget. """
+        if not self._budget.over():
+            return
+        for key in self._budget.cold_keys():
+            if key == keep:
+                continue
+            spilled = self._budget.spill(key, super().__getitem__(key))
+            if spilled is not None:
+                super().__setitem__(key, spilled)
+                if self._cow is not None:
+                    self._cow.put(key, spilled)
+                self._lazy_keys.add(key)
+
+    def _read_spilled(self, val):
+        """ Returns val, read from disk if spilled, without keeping it in memory. """
+        if isinstance(val, SpilledValue):
+            self._budget.miss()
+            return val.peek()
+        return resolve(val)
+
+    def _decode_lazy(self, key, lazy: LazyValue):
+        """ Decodes a LazyValue on first read and keeps the decoded value in its place. """
+        if self._budget is not None:
+            if isinstance(lazy, SpilledValue):
+                self._budget.miss()
+            else:
+                self._budget.hit(key)
+        val = lazy.value
+        if super().get(key) is lazy:
+            self._store(key, val)
+            self._lazy_keys.discard(key)
         return val
 
+    def _decode_all_lazy(self):
+        for key in list(self._lazy_keys):
+            val = super().get(key)
+            if isinstance(val, LazyValue):
+                self._decode_lazy(key, val)
+            else:
+                self._lazy_keys.discard(key)
+
     def __setitem__(self, key, new_val):
         self.set(key, new_val)
 
     def set(self, key, new_val, force_notify=False, timestamp=None):
-        old_val = self.get(key)
-        old_timestamp = self._timestamps.get(key, 0)
-        now = time.time()
-
-        # Only make change if timestamp is newer
-        if timestamp is None or now > old_timestamp:
-            self._timestamps[key] = now
-            super().__setitem__(key, new_val)
-
-            # Only make notification if value changed
-            if old_val != new_val or force_notify:
-                # self._changes.append((key, old_val, new_val))
-                self._changes.append({"key": key, "action": "update", "old_val": old_val,
-                                      "new_val": new_val, "timestamp": now})
-                self._notify_listeners()
+        """
+        Sets a value and notifies listeners if it changed.
+
+        Without a timestamp this is a local change and is stamped by our clock.
+        With a timestamp, as for changes arriving from peers, the change is
+        only made if the timestamp is newer than that of the key's current
+        value; stale or replayed changes are dropped without notification.
+
+        :param timestamp: an hlc.Timestamp, its list form, or a unix time from older peers
+        :return: True if the change was made
+        """
+        if isinstance(key, str):
+            key = sys.intern(key)  # So the dictionary, _timestamps and change records share one key object
+        if timestamp is None:
+            stamp = self._clock.now()
+            if self.tracer is not None:
+                self.tracer.local_set(self, key, tracing.trace_id(stamp))
+        else:
+            stamp = Timestamp.parse(timestamp)
+            self._clock.update(stamp)
+            if stamp <= self._timestamps.get(key, ZERO):
+                return False
+
+        old_val = super().get(key)  # Possibly a LazyValue, which is not decoded just to be replaced
+        self._timestamps[key] = stamp
+        self._patch_marks.pop(key, None)
+        self._store(key, new_val)
+        if isinstance(new_val, LazyValue):
+            self._lazy_keys.add(key)
+        else:
+            self._lazy_keys.discard(key)
+
+        # Only make notification if value changed, not decoding lazy values to find out
+        lazy = isinstance(old_val, LazyValue) or isinstance(new_val, LazyValue)
+        if lazy or old_val != new_val or force_notify:
+            # self._changes.append((key, old_val, new_val))
+            self._changes.append({"key": key, "action": "update", "old_val": old_val,
+                                  "new_val": new_val, "timestamp": stamp})
+            self._notify_listeners()
+        return True
 
     def mark_as_changed(self, key, timestamp=None):
         """
@@ -62,10 +275,288 @@ class BindableDict(dict):
         :param key: the key to alert listeners to
         """
         val = self.get(key)
-        timestamp = timestamp or time.time()
+        if timestamp is None:
+            stamp = self._clock.now()
+        else:
+            stamp = Timestamp.parse(timestamp)
+            self._clock.update(stamp)
+        self._timestamps[key] = max(stamp, self._timestamps.get(key, ZERO))
         self._changes.append({"key": key, "action": "update", "old_val": None,
-                              "new_val": val, "timestamp": timestamp})
+                              "new_val": val, "timestamp": stamp})
+        self._notify_listeners()
+
+    def patch(self, key, ops: [dict], timestamp=None):
+        """
+        Edits the value under key in place with a list of patch operations
+        (see netmem.patch) and sends only those operations to peers, rather
+        than the whole value as mark_as_changed() does.
+
+        Listeners are called as for mark_as_changed(), and patch listeners
+        are called once for each operation.
+
+        The operations are applied all together or not at all: if any of
+        them does not fit the value, the error is raised and the value is
+        left as it was.
+
+        A remote patch is dropped if the key's whole value was replaced by a
+        newer change, or if a newer patch from the same peer was already
+        applied.  Otherwise patches are applied in the order they arrive.  A
+        patch that arrives after a newer change to its key was applied may
+        have landed in a different order here than on other peers, so the
+        whole value is then sent again with a new timestamp, which replaces
+        whatever the other peers ended up with.
+
+        :param timestamp: set for patches arriving from peers, as with set()
+        :return: True if the patch was applied
+        """
+        if timestamp is None:
+            stamp = self._clock.now()
+        else:
+            stamp = Timestamp.parse(timestamp)
+            self._clock.update(stamp)
+
+        base, latest = self._patch_marks.get(key, (self._timestamps.get(key, ZERO), {}))
+        if timestamp is not None and (stamp <= base or stamp <= latest.get(stamp.node, ZERO)):
+            return False
+
+        # Try the operations on a copy that shares all but the changed containers, so one that
+        # does not fit raises before anything is changed
+        value = self[key]
+        edited = value
+        for op in ops:
+            edited = _patch.copy_path(edited, op.get("path") or [])
+            _patch.apply_op(edited, op)
+        if self._cow is not None and self._cow.shared(key):
+            value = edited  # A snapshot holds the old value, so keep the edited copy
+            self._store(key, value)
+        else:
+            for op in ops:
+                _patch.apply_op(value, op)
+        if self._budget is not None:
+            self._budget.account(key, value)  # Edited in place, so its size has changed
+
+        newest = self._timestamps.get(key, ZERO)
+        self._changes.append({"key": key, "action": "patch", "ops": ops, "timestamp": stamp})
+        if stamp < newest:
+            # Out of order, so send the whole value; as with set(), later patches older than it are dropped
+            resend = self._clock.now()
+            self._timestamps[key] = resend
+            self._patch_marks.pop(key, None)
+            self._changes.append({"key": key, "action": "update", "old_val": None,
+                                  "new_val": value, "timestamp": resend})
+        else:
+            latest[stamp.node] = stamp
+            self._patch_marks[key] = (base, latest)
+            self._timestamps[key] = stamp
+        self._notify_listeners()
+        return True
+
+    def set_at(self, key, path, value):
+        """ Sets the item at path inside the value under key. """
+        return self.patch(key, [_patch.make_op(_patch.SET, path, value)])
+
+    def insert_at(self, key, path, value):
+        """ Inserts into a list at path inside the value under key.  A last step of "-" appends. """
+        return self.patch(key, [_patch.make_op(_patch.INSERT, path, value)])
+
+    def remove_at(self, key, path):
+        """ Removes the item at path inside the value under key. """
+        return self.patch(key, [_patch.make_op(_patch.REMOVE, path)])
+
+    def merge(self, key, delta: dict, timestamp=None):
+        """
+        Merges a delta into the CRDT value under key (see netmem.crdt),
+        creating the value if the key is empty, and sends the delta to peers.
+        Deltas may arrive in any order and more than once.
+
+        :param delta: partial state of a CRDT type, including its "crdt" tag
+        :param timestamp: set for deltas arriving from peers
+        :return: True if the merge changed anything
+        """
+        cls = crdt.TYPES.get(delta.get("crdt"))
+        if cls is None:
+            raise ValueError("Not a CRDT delta: {}".format(delta))
+        if timestamp is None:
+            stamp = self._clock.now()
+        else:
+            stamp = Timestamp.parse(timestamp)
+            self._clock.update(stamp)
+
+        state = self.get(key)
+        if not isinstance(state, cls) or (self._cow is not None and self._cow.shared(key)):
+            if state is None:
+                state = cls()
+            elif isinstance(state, dict) and state.get("crdt") == cls.TYPE:
+                state = cls(state)  # Copies, leaving the state alone for any snapshot that holds it
+            else:
+                raise TypeError("Key {!r} holds {!r}, not a {}".format(key, state, cls.TYPE))
+            self._store(key, state)
+
+        if not state.join(delta):
+            return False
+        if self._budget is not None:
+            self._budget.account(key, state)
+        self._timestamps[key] = max(stamp, self._timestamps.get(key, ZERO))
+        self._changes.append({"key": key, "action": "merge", "delta": delta, "timestamp": stamp})
+        self._notify_listeners()
+        return True
+
+    def _store(self, key, value):
+        """ Puts value in the dictionary and in the copy-on-write index behind snapshot(). """
+        if self._key_index is not None and key not in self:
+            self._key_index.add(key)
+        super().__setitem__(key, value)
+        if self._cow is not None:
+            self._cow.put(key, value)
+        if self._budget is not None:
+            self._budget.account(key, value)
+            self._enforce_budget(keep=key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._forget(key)
+
+    def pop(self, key, *default):
+        val = super().pop(key, *default)
+        self._forget(key)
+        return val
+
+    def popitem(self):
+        key, val = super().popitem()
+        self._forget(key)
+        return key, val
+
+    def clear(self):
+        super().clear()
+        if self._cow is not None:
+            self._cow.clear()
+        self._lazy_keys.clear()
+        if self._budget is not None:
+            self._budget.clear()
+        if self._key_index is not None:
+            self._key_index.clear()
+
+    def _forget(self, key):
+        """ Takes a removed key out of the snapshot and key indexes and the memory accounting. """
+        if self._cow is not None:
+            self._cow.remove(key)
+        self._lazy_keys.discard(key)
+        if self._key_index is not None:
+            self._key_index.discard(key)
+        if self._budget is not None:
+            self._budget.forget(key)
+
+    def snapshot(self) -> Snapshot:
+        """
+        Returns a read-only, consistent view of the dictionary as it is now,
+        for reading on another thread while this one goes on changing.
+        Taking a snapshot does not copy the dictionary, except that the first
+        one builds the index later ones are taken from; see netmem.snapshot.
+        """
+        if self._cow is None:
+            with _cow_lock:
+                if self._cow is None:
+                    CowIndex().load(self, lambda index: setattr(self, "_cow", index))
+        return self._cow.snapshot()
+
+    def counter(self, key) -> crdt.CounterHandle:
+        """ Returns a handle to the PN-counter under key, eg, mem.counter("hits").add(1) """
+        return crdt.CounterHandle(self, key)
+
+    def orset(self, key) -> crdt.ORSetHandle:
+        """ Returns a handle to the observed-remove set under key, eg, mem.orset("online").add("robot-17") """
+        return crdt.ORSetHandle(self, key)
+
+    def lwwmap(self, key) -> crdt.LWWMapHandle:
+        """ Returns a handle to the last-writer-wins map under key, eg, mem.lwwmap("config")["speed"] = 3 """
+        return crdt.LWWMapHandle(self, key)
+
+    def array(self, key, dtype: str = "f8", length: int = None) -> NumericRegion:
+        """
+        Returns the numeric region named key, creating it if needed.  Regions
+        are kept apart from the dictionary's own keys and values.
+
+            lidar = mem.array("lidar", "f4", 4096)
+            lidar[0:3] = [1.5, 2.5, 3.5]
+
+        :param dtype: element type as a NumPy style string, eg, "f4", "f8", "i4", "u1"
+        :param length: number of elements, required when creating the region
+        """
+        region = self._regions.get(key)
+        if region is None:
+            if length is None:
+                raise KeyError("No region {!r}; a length is needed to create it".format(key))
+            region = NumericRegion(self, key, dtype, length)
+            self._regions[key] = region
+        elif region.dtype != dtype or (length is not None and len(region) != length):
+            raise ValueError("{!r} exists with a different dtype or length".format(region))
+        return region
+
+    def regions(self) -> {str: NumericRegion}:
+        return dict(self._regions)
+
+    def region_timestamp(self, key):
+        """ Returns the timestamp of the newest slice written to or received for the region named key. """
+        return max(self._region_marks.get(key, {}).values(), default=ZERO)
+
+    def region_state(self, key) -> dict:
+        """
+        Returns a "slice" change carrying the whole region named key, for
+        catching up peers that missed earlier slices.  It is stamped with the
+        region's newest slice and replaces a peer's copy only where that copy
+        has seen nothing newer.
+        """
+        region = self._regions[key]
+        return {"key": key, "action": "slice", "dtype": region.dtype, "length": len(region),
+                "start": 0, "count": len(region), "data": region.encode(0, len(region)),
+                "timestamp": self.region_timestamp(key), "state": True}
+
+    def _region_written(self, region: NumericRegion, start: int, stop: int):
+        """ Called by a region after a local write to elements start through stop - 1. """
+        if stop <= start:
+            return
+        stamp = self._clock.now()
+        self._region_marks.setdefault(region.key, {})[stamp.node] = stamp
+        self._changes.append({"key": region.key, "action": "slice", "dtype": region.dtype,
+                              "length": len(region), "start": start, "count": stop - start,
+                              "data": region.encode(start, stop), "timestamp": stamp})
+        self._notify_listeners()
+
+    def apply_slice(self, change: dict):
+        """
+        Applies a "slice" change received from a peer, creating the region if
+        needed.  Replays and slices older than one already applied from the
+        same peer are dropped, as is a whole region state (see region_state())
+        no newer than every slice already applied.  A slice that does not fit
+        raises before anything is written.
+
+        :return: True if the slice was applied
+        """
+        key = change["key"]
+        stamp = Timestamp.parse(change.get("timestamp"))
+        self._clock.update(stamp)
+        if stamp <= self._region_marks.get(key, {}).get(stamp.node, ZERO):
+            return False
+        if change.get("state") and stamp <= self.region_timestamp(key):
+            return False
+
+        region = self._regions.get(key)
+        if region is None:
+            region = NumericRegion(self, key, change["dtype"], int(change["length"]))  # Kept if the slice fits
+        elif region.dtype != change["dtype"] or len(region) != int(change["length"]):
+            raise ValueError("Slice {} does not fit {!r}".format(key, region))
+        region.decode_into(int(change["start"]), change["data"], int(change["count"]))
+        self._regions.setdefault(key, region)
+        self._region_marks.setdefault(key, {})[stamp.node] = stamp
+        self._changes.append(change)
         self._notify_listeners()
+        return True
+
+    def unregister_metrics(self):
+        """ Stops reporting this dictionary's metrics, eg, once it is no longer used. """
+        metrics.REGISTRY.unregister(self._changes_metric, self._listeners_metric)
+        if self._budget is not None:
+            self._budget.unregister_metrics()
 
     def __repr__(self):
         dictrepr = super().__repr__()
@@ -79,6 +570,17 @@ class BindableDict(dict):
             for k, v in dict(*args, **kwargs).items():
                 self[k] = v
 
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, key, default=None):
+        """ Like dict.setdefault, but sets a missing key as set() would, notifying listeners. """
+        if key in self:
+            return self[key]
+        self.set(key, default)
+        return default
+
     def add_listener(self, listener):
         """
         Registers listener as a callable object (a function or lambda generally) that will be
@@ -113,6 +615,30 @@ class BindableDict(dict):
         Removes all listeners that are registered to be notified when the value changes.
         """
         self.__listeners.clear()
+        self.__patch_listeners.clear()
+
+    def add_patch_listener(self, listener):
+        """
+        Registers a listener to be notified of each operation in a patch.
+        The listener will be called with five arguments:
+
+            def memory_patched(netmem_dict, key, path, op, value):
+                ...
+
+        value is None for "remove" operations.
+
+        :param listener: the listener to notify
+        """
+        self.__patch_listeners.append(listener)
+
+    def remove_patch_listener(self, listener):
+        """
+        Removes a listener registered with add_patch_listener()
+
+        :param listener: the listener to remove
+        """
+        if listener in self.__patch_listeners:
+            self.__patch_listeners.remove(listener)
 
     def _notify_listeners(self):
         """
@@ -122,15 +648,46 @@ class BindableDict(dict):
         if not self._suspend_notifications:
             changes = self._changes.copy()
             self._changes.clear()
+            self._changes_metric.value += len(changes)
+            if not changes:
+                return
+            began = time.perf_counter()
+            for change in changes:
+                if change["action"] == "slice":
+                    start = change["start"]
+                    self._regions[change["key"]]._notify(start, start + change["count"])
+            tracer = self.tracer
             for listener in self.__listeners:
                 # for key, old_val, new_val in changes:
                 for change in changes:
+                    if tracer is not None:
+                        called = time.perf_counter()
                     if change["action"] == "update":
                         key = change["key"]
-                        old_val = change["old_val"]
-                        new_val = change["new_val"]
+                        old_val = resolve(change["old_val"])
+                        new_val = resolve(change["new_val"])
                         timestamp = change["timestamp"]
                         listener(self, key, old_val, new_val)
+                    elif change["action"] in ("patch", "merge"):
+                        key = change["key"]
+                        listener(self, key, None, self.get(key))
+                    else:
+                        continue
+                    if tracer is not None:
+                        tracer.listener_called(self, listener, change["key"], tracing.trace_id(change["timestamp"]),
+                                               time.perf_counter() - called)
+
+            for listener in self.__patch_listeners:
+                for change in changes:
+                    if change["action"] == "patch":
+                        if tracer is not None:
+                            called = time.perf_counter()
+                        for op in change["ops"]:
+                            listener(self, change["key"], op["path"], op["op"], op.get("value"))
+                        if tracer is not None:
+                            tracer.listener_called(self, listener, change["key"],
+                                                   tracing.trace_id(change["timestamp"]), time.perf_counter() - called)
+            self._listeners_metric.observe(time.perf_counter() - began)
 
     def __enter__(self):
         """ For use with Python's "with" construct. """
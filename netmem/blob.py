@@ -0,0 +1,360 @@
+"""
+Content-addressed transfer of large values in chunks.
+
+A value whose JSON is at least the threshold size goes out as a reference
+in its place:
+
+    {"key": "map", "action": "update", "new_val": {"$blob": "<sha256 hex>", "size": 5242880}, ...}
+
+A receiver that already holds that hash fills the value in at once.
+Otherwise it holds the message back and asks for the blob:
+
+    {"blob_want": ["<sha256 hex>"]}
+
+and the sender streams it back as binary frames, each
+
+    0x02 | 32 byte sha256 digest | 8 byte total size | 8 byte offset | bytes
+
+that are copied straight into a buffer of the final size.  When the last
+byte arrives the hash is checked and the held messages are delivered with
+the blob's text as the change's "raw_val" (see netmem.lazy), or decoded
+into "new_val" for CRDT states, whose references are marked "crdt".
+
+Peers announce that they understand references by sending {"blobs": 1},
+and peers that never do keep getting whole values.  Connectors send
+through outgoing_in_order(), which encodes and hashes large values in the
+loop's default executor so the loop keeps running meanwhile.
+"""
+
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import struct
+
+from . import crdt, lazy
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+HELLO = {"blobs": 1}
+CHUNK = 0x02
+REF = "$blob"
+_HEADER = struct.Struct(">B32sQQ")
+
+
+def is_ref(value) -> bool:
+    return isinstance(value, dict) and isinstance(value.get(REF), str)
+
+
+def _at_least(value, limit: int) -> bool:
+    """
+    Roughly whether value's JSON is at least limit bytes, looking at no more
+    of the value than it takes to tell, so small values stay cheap.
+    """
+    total = 0
+    stack = [value]
+    while stack:
+        v = stack.pop()
+        if isinstance(v, str):
+            total += len(v) + 2
+        elif isinstance(v, dict):
+            total += 2 + 4 * len(v)
+            stack.extend(v.keys())
+            stack.extend(v.values())
+        elif isinstance(v, (list, tuple)):
+            total += 2 + 2 * len(v)
+            stack.extend(v)
+        else:
+            total += 4
+        if total >= limit:
+            return True
+    return False
+
+
+def _encode(values: {int: object}) -> {int: (bytes, str)}:
+    """ Returns the JSON bytes of each value, or of each raw text as it is, and their sha256 hashes. """
+    encoded = {}
+    for i, value in values.items():
+        data = value.encode() if isinstance(value, str) else lazy.dumps(value, sort_keys=True).encode()
+        encoded[i] = data, hashlib.sha256(data).hexdigest()
+    return encoded
+
+
+class BlobStore(object):
+    """ Blobs by hash, dropping the least recently used ones beyond max_bytes. """
+
+    def __init__(self, max_bytes: int = 1 << 28):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._blobs = collections.OrderedDict()  # type: {str: bytes}
+
+    def __contains__(self, digest: str):
+        return digest in self._blobs
+
+    def __len__(self):
+        return len(self._blobs)
+
+    def get(self, digest: str):
+        data = self._blobs.get(digest)
+        if data is not None:
+            self._blobs.move_to_end(digest)
+        return data
+
+    def put(self, data, digest: str = None) -> dict:
+        """ Stores data (bytes or bytearray, not copied) and returns a reference to it. """
+        digest = digest or hashlib.sha256(data).hexdigest()
+        if digest in self._blobs:
+            self._blobs.move_to_end(digest)
+        else:
+            self._blobs[digest] = data
+            self.size += len(data)
+            while self.size > self.max_bytes and len(self._blobs) > 1:
+                _, old = self._blobs.popitem(last=False)
+                self.size -= len(old)
+        return {REF: digest, "size": len(data)}
+
+
+class _Assembly(object):
+    """ One blob being received, written in place as its chunks arrive. """
+
+    def __init__(self, size: int):
+        self.buffer = bytearray(size)
+        self._offsets = set()
+        self.received = 0
+
+    @property
+    def complete(self) -> bool:
+        return self.received >= len(self.buffer)
+
+    def write(self, offset: int, data: memoryview):
+        if offset + len(data) > len(self.buffer):
+            raise ValueError("Chunk at {} of {} bytes runs past blob of {} bytes".format(
+                offset, len(data), len(self.buffer)))
+        if offset not in self._offsets:
+            self._offsets.add(offset)
+            self.buffer[offset:offset + len(data)] = data
+            self.received += len(data)
+
+
+class BlobTransfer(object):
+    """ Blob state for one connector: what it can serve and what it is waiting for. """
+
+    def __init__(self, threshold: int = 1 << 20, chunk_size: int = 1 << 16, max_bytes: int = 1 << 28):
+        """
+        :param threshold: send values whose JSON is at least this many bytes as blobs
+        :param chunk_size: bytes of blob per binary frame
+        :param max_bytes: most bytes of blobs to keep for serving and skipping repeat transfers
+        """
+        self.log = logging.getLogger(__name__ + '.' + self.__class__.__name__)
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+        self.store = BlobStore(max_bytes)
+        self._assemblies = {}  # type: {str: _Assembly}
+        self._held = {}  # type: {str: [(dict, object)]}  # Messages, and who sent them, waiting on each missing blob
+        self._sizes = {}  # type: {str: int}  # Size each missing blob's references give
+        self._wanted = {}  # type: {object: {str}}  # Blobs asked of each connection and not yet received
+        self._sending = collections.deque()  # (msg, send, encoding future) waiting on outgoing_in_order()
+
+    def outgoing(self, msg: dict, encoded: {int: (bytes, str)} = None) -> dict:
+        """
+        Returns msg with large values replaced by references, keeping the
+        blobs to serve requests for them.  The original message is not changed.
+
+        :param encoded: large values already encoded by _encode(), by change index
+        """
+        changes = msg.get("changes")
+        if not changes:
+            return msg
+
+        encoded = _encode(self._large_values(msg)) if encoded is None else encoded
+        replaced = None
+        for i, change in enumerate(changes):
+            if change.get("action") != "update":
+                continue
+            short = {}
+            if _at_least(change.get("old_val"), self.threshold):
+                short["old_val"] = None  # Receivers work out old values for themselves
+            if i in encoded:
+                data, digest = encoded[i]
+                if len(data) >= self.threshold:
+                    short["new_val"] = self.store.put(data, digest)
+                    if "raw_val" not in change and crdt.is_state(change.get("new_val")):
+                        short["new_val"]["crdt"] = 1
+            if short:
+                if replaced is None:
+                    replaced = list(changes)
+                replaced[i] = dict(change, **short)
+                if "new_val" in short:
+                    replaced[i].pop("raw_val", None)
+        return msg if replaced is None else dict(msg, changes=replaced)
+
+    def outgoing_in_order(self, msg: dict, send, loop: asyncio.BaseEventLoop):
+        """
+        Calls send() with msg as outgoing() returns it, once it is ready and
+        after every message given before it.  Large values are encoded and
+        hashed in loop's default executor.  Must be called on loop.
+        """
+        values = self._large_values(msg)
+        if not values and not self._sending:
+            send(self.outgoing(msg, {}))
+            return
+        future = loop.run_in_executor(None, _encode, values) if values else None
+        self._sending.append((msg, send, future))
+        if future is not None:
+            future.add_done_callback(lambda _: self._send_ready())
+        self._send_ready()
+
+    def _send_ready(self):
+        """ Sends the queued messages whose values are encoded, up to the first that is not. """
+        while self._sending:
+            msg, send, future = self._sending[0]
+            if future is not None and not future.done():
+                return
+            self._sending.popleft()
+            try:
+                encoded = {} if future is None else future.result()
+            except (TypeError, ValueError) as e:
+                self.log.error("Could not send message with a value that does not encode: {}".format(e))
+                continue
+            send(self.outgoing(msg, encoded))
+
+    def _large_values(self, msg: dict) -> {int: object}:
+        """ Returns the new values, or their raw text, that might be sent as blobs, by change index. """
+        values = {}
+        for i, change in enumerate(msg.get("changes") or []):
+            if change.get("action") != "update":
+                continue
+            raw = change.get("raw_val")
+            if raw is not None:
+                if len(raw) >= self.threshold:
+                    values[i] = raw
+            elif _at_least(change.get("new_val"), self.threshold):
+                values[i] = change["new_val"]
+        return values
+
+    def incoming(self, msg: dict, source=None) -> (dict, [str]):
+        """
+        Fills in references whose blobs are at hand.  Returns the message, or
+        None if it is being held until missing blobs arrive, and the hashes
+        to ask source, the connection msg came from, for.
+        """
+        missing = self._resolve(msg)
+        if not missing:
+            return msg, []
+        wanted = self._wanted.setdefault(source, set())
+        wants = [d for d in missing if d not in wanted]
+        wanted.update(wants)
+        for digest, size in missing.items():
+            self._held.setdefault(digest, []).append((msg, source))
+            self._sizes.setdefault(digest, size)
+        return None, wants
+
+    def closed(self, source) -> {object: [str]}:
+        """
+        Forgets a connection that has gone away.  Messages it sent that wait
+        on blobs nobody else was asked for are dropped, and the blobs that
+        messages from other connections still wait on are returned by
+        connection, to ask them for instead.
+        """
+        asks = {}
+        for digest in self._wanted.pop(source, ()):
+            if any(digest in wanted for wanted in self._wanted.values()):
+                continue  # Still coming from another connection
+            held = [(msg, src) for msg, src in self._held.get(digest, []) if src is not source]
+            if not held:
+                self._drop(digest)
+                continue
+            self._held[digest] = held
+            self._assemblies.pop(digest, None)  # Starts over from the new sender
+            for _, src in held:
+                wanted = self._wanted.setdefault(src, set())
+                if digest not in wanted:
+                    wanted.add(digest)
+                    asks.setdefault(src, []).append(digest)
+        for digest, held in list(self._held.items()):  # Messages source sent that wait on blobs others send
+            kept = [(msg, src) for msg, src in held if src is not source]
+            if not kept:
+                self._drop(digest)
+            elif len(kept) < len(held):
+                self._held[digest] = kept
+        return asks
+
+    def chunks(self, digest: str):
+        """ Yields the binary frames for one blob, or nothing if it is no longer stored. """
+        data = self.store.get(digest)
+        if data is None:
+            self.log.warning("Asked for blob {} that is not stored".format(digest))
+            return
+        view = memoryview(data)
+        raw_digest = bytes.fromhex(digest)
+        for offset in range(0, len(data), self.chunk_size):
+            yield _HEADER.pack(CHUNK, raw_digest, len(data), offset) + view[offset:offset + self.chunk_size]
+
+    def receive_chunk(self, frame: bytes) -> [dict]:
+        """ Copies one chunk frame into place and returns any held messages it completes. """
+        _, raw_digest, size, offset = _HEADER.unpack_from(frame)
+        digest = raw_digest.hex()
+        if digest not in self._held:
+            return []  # Not asked for, or already complete
+
+        assembly = self._assemblies.get(digest)
+        if assembly is None:
+            if size != self._sizes.get(digest) or size > self.store.max_bytes:
+                self.log.error("Dropping blob {}: chunk gives size {}, references give {}".format(
+                    digest, size, self._sizes.get(digest)))
+                self._drop(digest)
+                return []
+            assembly = self._assemblies[digest] = _Assembly(size)
+        try:
+            assembly.write(offset, memoryview(frame)[_HEADER.size:])
+        except ValueError as e:
+            self.log.error("Dropping blob {}: {}".format(digest, e))
+            self._drop(digest)
+            return []
+        if not assembly.complete:
+            return []
+
+        del self._assemblies[digest]
+        if hashlib.sha256(assembly.buffer).hexdigest() != digest:
+            self.log.error("Dropping blob {}: contents do not match hash".format(digest))
+            self._drop(digest)
+            return []
+        self.store.put(assembly.buffer, digest)
+        self._sizes.pop(digest, None)
+        for wanted in self._wanted.values():
+            wanted.discard(digest)
+
+        ready = []
+        for msg, _ in self._held.pop(digest):
+            if not self._resolve(msg):
+                ready.append(msg)
+        return ready
+
+    def _resolve(self, msg: dict) -> {str: int}:
+        """ Replaces references in msg with stored values in place and returns the hashes still missing, with sizes. """
+        missing = {}
+        for change in msg.get("changes") or []:
+            value = change.get("new_val")
+            if change.get("action") == "update" and is_ref(value):
+                data = self.store.get(value[REF])
+                if data is None:
+                    missing[value[REF]] = value.get("size")
+                elif value.get("crdt"):
+                    change["new_val"] = json.loads(data)
+                else:
+                    del change["new_val"]
+                    change["raw_val"] = data.decode()
+        return missing
+
+    def _drop(self, digest: str):
+        self._assemblies.pop(digest, None)
+        self._sizes.pop(digest, None)
+        for wanted in self._wanted.values():
+            wanted.discard(digest)
+        held = self._held.pop(digest, [])
+        if held:
+            self.log.error("Discarding {} messages that were waiting on blob {}".format(len(held), digest))
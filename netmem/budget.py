@@ -0,0 +1,318 @@
+"""
+Memory accounting for a BindableDict, with cold values spilled to disk past a budget.
+
+Once accounting is on, the dictionary keeps an approximate size in bytes
+for each key: its value's objects as sys.getsizeof counts them, the key,
+and a fixed allowance for its timestamp and index entries.
+
+    mem = NetworkMemory(memory_budget=512 * 1024 * 1024)
+    mem.memory_usage()     # {"keys": ..., "resident": ..., "spilled": ..., ...}
+    mem.memory_size("robot/17/scan")
+
+When the keys and values held in memory add up to more than the budget,
+the least recently read or written values are written to an on-disk store,
+as JSON, until memory use is back under it.  Keys and timestamps stay in
+memory.  A spilled value is a kind of LazyValue, so it is read back in the
+first time its key is read, exactly as a lazy value is decoded, and
+anything that passes lazy values along, such as sending the whole memory
+to a peer, reads it from disk without bringing it back into memory.
+Reading every value, eg, with values(), or reading a snapshot, leaves
+spilled values on disk.
+
+Reads of values in memory count as hits and reads from disk as misses,
+in the netmem_spill_hits_total and netmem_spill_misses_total metrics.
+Only values that read back from JSON exactly as they were are spilled, so
+tuples, dictionaries with keys other than strings, and such stay in
+memory, as do values smaller than min_spill.
+"""
+
+import collections
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import weakref
+
+from . import metrics
+from .lazy import LazyValue, dumps
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+ENTRY_OVERHEAD = 200  # Bytes per key for its timestamp and its slots in the dictionary and indexes
+
+
+def size_of(value) -> int:
+    """ Approximate bytes used by value and everything it contains. """
+    if isinstance(value, SpilledValue):
+        return sys.getsizeof(value)
+    if isinstance(value, LazyValue):
+        return sys.getsizeof(value) + sys.getsizeof(value.raw)
+    total = 0
+    stack = [value]
+    while stack:
+        v = stack.pop()
+        total += sys.getsizeof(v)
+        if isinstance(v, dict):
+            stack.extend(v.keys())
+            stack.extend(v.values())
+        elif isinstance(v, (list, tuple)):
+            stack.extend(v)
+    return total
+
+
+def round_trips(value, raw: str) -> bool:
+    """ Whether raw, the JSON text of value, decodes to the same value with the same types throughout. """
+    stack = [(value, json.loads(raw))]
+    while stack:
+        a, b = stack.pop()
+        if type(a) is not type(b):
+            return False
+        if type(a) is dict:
+            if len(a) != len(b):
+                return False
+            for k, v in a.items():
+                if type(k) is not str or k not in b:
+                    return False
+                stack.append((v, b[k]))
+        elif type(a) is list:
+            if len(a) != len(b):
+                return False
+            stack.extend(zip(a, b))
+        elif a != b:
+            return False
+    return True
+
+
+def _discard(db: sqlite3.Connection, path: str):
+    db.close()
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class SpillStore(object):
+    """ Values written out as JSON text in a SQLite file, which only lasts as long as the store. """
+
+    def __init__(self, path: str = None):
+        """
+        :param path: file to use, by default a new temporary file
+        """
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="netmem-", suffix=".spill")
+            os.close(fd)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=OFF")  # A cache, not a record, so skip the durability
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute("DROP TABLE IF EXISTS spill")
+        self._db.execute("CREATE TABLE spill (id INTEGER PRIMARY KEY, raw TEXT)")
+        self._finalizer = weakref.finalize(self, _discard, self._db, path)  # Also runs at exit
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self.path)
+
+    def put(self, raw: str) -> int:
+        with self._lock:
+            return self._db.execute("INSERT INTO spill (raw) VALUES (?)", (raw,)).lastrowid
+
+    def get(self, ref: int) -> str:
+        with self._lock:
+            row = self._db.execute("SELECT raw FROM spill WHERE id = ?", (ref,)).fetchone()
+        if row is None:
+            raise KeyError("No spilled value {} in {}".format(ref, self))
+        return row[0]
+
+    def delete(self, ref: int):
+        with self._lock:
+            if self._db is not None:
+                self._db.execute("DELETE FROM spill WHERE id = ?", (ref,))
+
+    def close(self):
+        with self._lock:
+            self._db = None
+            self._finalizer()
+
+
+class SpilledValue(LazyValue):
+    """
+    A value that lives in a SpillStore.  Its row is deleted when nothing
+    refers to it any longer, so a snapshot holding it can still read it.
+    Like any LazyValue it keeps its value once decoded, which happens when
+    the dictionary reads it back in, replacing it, or when a listener given
+    it as an old value reads it.
+    """
+    __slots__ = ("_store", "_ref", "__weakref__")
+
+    def __init__(self, store: SpillStore, raw: str):
+        self._store = store
+        self._ref = store.put(raw)
+        self._value = None
+        self._decoded = False
+        weakref.finalize(self, store.delete, self._ref)
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self._ref)
+
+    @property
+    def raw(self) -> str:
+        return self._store.get(self._ref)
+
+    def peek(self):
+        """ The decoded value, read from disk unless already decoded, and not kept. """
+        return self._value if self._decoded else json.loads(self.raw)
+
+
+class MemoryBudget(object):
+    def __init__(self, max_bytes: int = None, path: str = None, low_water: float = 0.9, min_spill: int = 1024,
+                 label: str = ""):
+        """
+        :param max_bytes: most bytes to keep in memory, or None to only keep count
+        :param path: file for the spilled values, by default a temporary file
+        :param low_water: spilling stops once memory use is under this fraction of max_bytes
+        :param min_spill: values taking fewer bytes than this stay in memory
+        """
+        self.log = logging.getLogger(__name__ + '.' + self.__class__.__name__)
+        self.max_bytes = max_bytes
+        self.path = path
+        self.low_water = low_water
+        self.min_spill = min_spill
+        self.store = None  # type: SpillStore  # Opened on the first spill
+        self._sizes = collections.OrderedDict()  # type: {object: int}  # Bytes per key, least recently used first
+        self._spilled = {}  # type: {object: int}  # Bytes the spilled values took in memory
+        self.resident = 0  # Bytes in memory
+        self.spilled = 0  # Bytes in memory that spilled values would take
+        self._exhausted_at = None  # The budget under which cold_keys() last found nothing to spill
+
+        registry = metrics.REGISTRY
+        self.hits = registry.counter("netmem_spill_hits_total", "Reads of values in memory", memory=label)
+        self.misses = registry.counter("netmem_spill_misses_total", "Reads of values spilled to disk", memory=label)
+        self.spills = registry.counter("netmem_spills_total", "Values spilled to disk", memory=label)
+        self._resident_gauge = registry.gauge("netmem_memory_bytes", "Approximate bytes in memory", memory=label)
+        self._spilled_gauge = registry.gauge("netmem_spilled_bytes", "Approximate bytes spilled to disk", memory=label)
+
+    def __repr__(self):
+        return "{}({} of {} bytes)".format(self.__class__.__name__, self.resident, self.max_bytes)
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def size(self, key) -> int:
+        """ Approximate bytes key takes, as if its value were in memory. """
+        return self._spilled.get(key) or self._sizes[key]
+
+    def account(self, key, value):
+        """ Records the size of a value just stored under key, which becomes the most recently used. """
+        size = size_of(key) + size_of(value) + ENTRY_OVERHEAD
+        self.resident += size - self._sizes.pop(key, 0)
+        self._sizes[key] = size
+        self.spilled -= self._spilled.pop(key, 0)
+        if size >= self.min_spill:
+            self._exhausted_at = None
+        self._update_gauges()
+
+    def forget(self, key):
+        self.resident -= self._sizes.pop(key, 0)
+        self.spilled -= self._spilled.pop(key, 0)
+        self._update_gauges()
+
+    def clear(self):
+        self._sizes.clear()
+        self._spilled.clear()
+        self.resident = 0
+        self.spilled = 0
+        self._exhausted_at = None
+        self._update_gauges()
+
+    def _update_gauges(self):
+        self._resident_gauge.set(self.resident)
+        self._spilled_gauge.set(self.spilled)
+
+    def hit(self, key):
+        """ Counts a read of a value in memory and makes key the most recently used. """
+        self.hits.value += 1
+        if key in self._sizes:
+            self._sizes.move_to_end(key)
+
+    def miss(self):
+        """ Counts a read of a spilled value. """
+        self.misses.value += 1
+
+    def over(self) -> bool:
+        return self.max_bytes is not None and self.resident > self.max_bytes
+
+    def cold_keys(self, limit: int = 1000):
+        """
+        Yields keys, least recently used first, until memory use is under the
+        low water mark.  Each key yielded is expected to go through spill(),
+        which makes it the most recently used whether it spills or not, so the
+        next key is always the first one and the keys are never copied.  Once
+        a pass spills nothing, later calls yield nothing until a value large
+        enough to spill is stored.
+        """
+        if self._exhausted_at == self.max_bytes:
+            return
+        target = self.low_water * self.max_bytes
+        spilled_any = False
+        for _ in range(min(limit, len(self._sizes))):
+            if self.resident <= target or not self._sizes:
+                return
+            key = next(iter(self._sizes))
+            if key not in self._spilled:
+                yield key
+                spilled_any = spilled_any or key in self._spilled
+                if key in self._sizes and next(iter(self._sizes)) == key:
+                    self._sizes.move_to_end(key)  # Passed over without calling spill()
+            else:
+                self._sizes.move_to_end(key)
+        if not spilled_any and self.resident > target:
+            self._exhausted_at = self.max_bytes
+
+    def spill(self, key, value) -> SpilledValue:
+        """ Writes value to disk and returns the SpilledValue to store under key in its place, or None. """
+        size = self._sizes.get(key, 0)
+        if size < self.min_spill or isinstance(value, SpilledValue):
+            self._sizes.move_to_end(key)  # So it is not looked at again on the next spill
+            return None
+        try:
+            if isinstance(value, LazyValue):
+                raw = value.raw
+            else:
+                raw = dumps(value)
+                if not round_trips(value, raw):
+                    raise TypeError("does not read back from JSON unchanged")
+        except (TypeError, ValueError) as e:
+            self.log.debug("{} : Not spilling {!r}: {}".format(self, key, e))
+            self._sizes.move_to_end(key)
+            return None
+        if self.store is None:
+            self.store = SpillStore(self.path)
+            self.log.info("{} : Spilling cold values to {}".format(self, self.store.path))
+        spilled = SpilledValue(self.store, raw)
+        self.account(key, spilled)
+        self._spilled[key] = size
+        self.spilled += size
+        self._update_gauges()
+        self.spills.value += 1
+        return spilled
+
+    def unregister_metrics(self):
+        metrics.REGISTRY.unregister(self.hits, self.misses, self.spills, self._resident_gauge, self._spilled_gauge)
+
+    def usage(self) -> dict:
+        return {"keys": len(self._sizes), "resident": self.resident, "spilled": self.spilled,
+                "spilled_keys": len(self._spilled), "budget": self.max_bytes,
+                "hits": self.hits.value, "misses": self.misses.value}
+
+    def close(self):
+        """ Deletes the spill file.  Spilled values can no longer be read. """
+        if self.store is not None:
+            self.store.close()
+            self.store = None
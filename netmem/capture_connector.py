@@ -0,0 +1,108 @@
+"""
+A Connector that records outgoing change batches to a capture file for replay.
+
+Each batch of changes the NetworkMemory sends is appended to the file as
+a small binary record: the time it was sent and the message encoded by
+the connector's codec.  The default codec compresses messages of at least
+COMPRESS_THRESHOLD bytes at zlib's fastest level, with the preset
+dictionary of netmem.codec.  Writes go through a buffer, so capturing
+costs little more than encoding the message does and can be left on.
+Heartbeats are not recorded.
+
+    mem.connect(CaptureConnector("traffic.nmcap"))
+
+A NetworkMemory also sends the changes it receives from peers on to its
+connectors, so a capture taken on any one node records the changes made
+by every node it hears from.  See netmem.replay to feed a capture back
+into a NetworkMemory.
+
+File layout, after a six byte MAGIC header, repeated until the end:
+
+    8 bytes   unix time the batch was sent, big endian double
+    4 bytes   length of the payload, big endian unsigned
+    payload   the message as encoded by netmem.codec.MessageCodec
+"""
+
+import asyncio
+import struct
+import time
+
+from .codec import MessageCodec
+from .connector import Connector, ConnectorListener
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+MAGIC = b"NMCAP\x01"
+RECORD = struct.Struct(">dI")
+COMPRESS_THRESHOLD = 256  # Bytes of JSON from which the default codec compresses a message
+
+
+def read_capture(filename: str, codec: MessageCodec = None):
+    """
+    Yields (time sent, message) for each batch in a capture file, in the
+    order they were written.  A record cut short, as by a crash while
+    capturing, ends the capture.
+    """
+    codec = codec or MessageCodec()
+    with open(filename, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is not a netmem capture file".format(filename))
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            sent, length = RECORD.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            yield sent, codec.decode(payload)
+
+
+class CaptureConnector(Connector):
+    def __init__(self, filename: str, codec: MessageCodec = None, buffer_size: int = 1 << 16):
+        """
+        :param filename: capture file, appended to if it already exists
+        :param codec: encodes the messages, by default compressing those of at least COMPRESS_THRESHOLD bytes;
+                      replay with a codec that has the same dictionary
+        :param buffer_size: bytes held in memory before they are written to the file
+        """
+        super().__init__()
+        self.filename = filename
+        self.codec = codec or MessageCodec(threshold=COMPRESS_THRESHOLD, level=1)
+        self.buffer_size = buffer_size
+        self._file = None
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self.filename)
+
+    def connect(self, listener: ConnectorListener, netmem_dict, loop: asyncio.BaseEventLoop = None):
+        super().connect(listener, netmem_dict, loop=loop)
+        self._file = open(self.filename, "ab", buffering=self.buffer_size)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self.log.info("{} : Capturing changes".format(self))
+        self.listener.connection_made(self)
+        return self
+
+    def send_message(self, msg: dict):
+        if not msg.get("changes") or self._file is None:
+            return  # Heartbeat, or closed
+        data = self.codec.encode(msg)
+        self._file.write(RECORD.pack(time.time(), len(data)) + data)  # One write, so threads don't interleave
+        self.metrics.sent(RECORD.size + len(data))
+
+    def flush(self):
+        """ Writes out everything buffered so far. """
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self.log.info("{} : Capture closed".format(self))
+        if self.listener is not None:
+            self.listener.connection_lost(self, "connector closed")
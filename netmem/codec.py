@@ -0,0 +1,133 @@
+"""
+Turns messages into bytes for the connectors, optionally compressing large ones.
+
+A plain message is its JSON text, which always starts with "{".  Any other
+first byte is a frame type:
+
+    0x01  the rest is the JSON text compressed with zlib, using a preset
+          dictionary of common key names and value shapes
+
+Messages shorter than the codec's threshold are never compressed, since
+small messages rarely shrink enough to pay for the CPU time, and a message
+that does not get smaller is sent plain.  Every codec can read compressed
+frames whether or not it compresses its own, as long as both ends use the
+same dictionary.
+"""
+
+import json
+import time
+import zlib
+
+from . import lazy
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+PLAIN = ord("{")
+COMPRESSED = 0x01
+
+# The parts of every message that repeat no matter what the application stores
+_PROTOCOL_SAMPLES = [
+    '{"changes": [{"key": "', '", "action": "update", "old_val": ', ', "new_val": ',
+    ', "timestamp": [', '], "kid": ', '{"op": "set", "path": [', '"action": "patch", "ops": [',
+    '"action": "merge", "delta": {"crdt": "pncounter", "p": {', '"action": "slice", "dtype": "f4", "length": ',
+    '"start": ', '"count": ', '"data": "', '}], "name": "NetworkMemory_1", "node": "', '", "sent": ',
+    'null', 'true', 'false', '}, {"key": "',
+]
+
+
+def build_dictionary(keys=(), samples=()) -> bytes:
+    """
+    Builds a preset compression dictionary from the key names and typical
+    values an application sends.  Peers must use the same dictionary.
+    zlib gives the most weight to whatever is at the end, so the protocol's
+    own boilerplate goes last.
+    """
+    parts = [json.dumps(s) if not isinstance(s, str) else s for s in samples]
+    parts.extend('"{}"'.format(k) for k in keys)
+    parts.extend(_PROTOCOL_SAMPLES)
+    return "".join(parts).encode()[-32768:]
+
+
+DEFAULT_DICTIONARY = build_dictionary()
+
+
+class MessageCodec(object):
+    def __init__(self, threshold: int = None, level: int = 6, dictionary: bytes = None):
+        """
+        :param threshold: compress messages of at least this many bytes of JSON, or never if None
+        :param level: zlib compression level, 1 (fastest) to 9 (smallest)
+        :param dictionary: preset dictionary from build_dictionary(), the same on all peers
+        """
+        self.threshold = threshold
+        self.level = level
+        self.dictionary = DEFAULT_DICTIONARY if dictionary is None else dictionary
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, 9,
+                                            zlib.Z_DEFAULT_STRATEGY, self.dictionary)
+        self._decompressor = zlib.decompressobj(zlib.MAX_WBITS, self.dictionary)
+
+        self.messages_out = 0
+        self.compressed_out = 0
+        self.json_bytes_out = 0  # JSON bytes of the messages that were compressed
+        self.wire_bytes_out = 0  # what those same messages took once compressed
+        self.compress_seconds = 0.0
+        self.messages_in = 0
+        self.compressed_in = 0
+        self.decompress_seconds = 0.0
+
+    def __repr__(self):
+        return "{}(threshold={}, level={})".format(self.__class__.__name__, self.threshold, self.level)
+
+    def encode(self, msg: dict) -> bytes:
+        return self.encode_json(lazy.dumps(msg).encode())
+
+    def encode_json(self, data: bytes) -> bytes:
+        """ Compresses already encoded JSON if it is large enough and it helps. """
+        self.messages_out += 1
+        if self.threshold is None or len(data) < self.threshold:
+            return data
+
+        start = time.perf_counter()
+        compressor = self._compressor.copy()
+        packed = compressor.compress(data) + compressor.flush()
+        self.compress_seconds += time.perf_counter() - start
+        if len(packed) + 1 >= len(data):
+            return data
+        self.compressed_out += 1
+        self.json_bytes_out += len(data)
+        self.wire_bytes_out += len(packed) + 1
+        return bytes((COMPRESSED,)) + packed
+
+    def decode(self, data: bytes) -> dict:
+        """
+        :raises ValueError: if the frame type is unknown or it does not decompress
+        """
+        self.messages_in += 1
+        if data[:1] == b"{" or not data:
+            return json.loads(data.decode())
+        if data[0] == COMPRESSED:
+            start = time.perf_counter()
+            decompressor = self._decompressor.copy()
+            try:
+                text = decompressor.decompress(memoryview(data)[1:]) + decompressor.flush()
+            except zlib.error as e:
+                raise ValueError("Could not decompress message (different dictionary?): {}".format(e))
+            self.decompress_seconds += time.perf_counter() - start
+            self.compressed_in += 1
+            return json.loads(text.decode())
+        raise ValueError("Unknown frame type 0x{:02x}".format(data[0]))
+
+    def metrics(self) -> dict:
+        """ Counts, compression ratio and CPU time, for tuning the threshold. """
+        return {
+            "messages_out": self.messages_out,
+            "compressed_out": self.compressed_out,
+            "compression_ratio": self.wire_bytes_out / self.json_bytes_out if self.json_bytes_out else 1.0,
+            "bytes_saved": self.json_bytes_out - self.wire_bytes_out,
+            "compress_seconds": self.compress_seconds,
+            "messages_in": self.messages_in,
+            "compressed_in": self.compressed_in,
+            "decompress_seconds": self.decompress_seconds,
+        }
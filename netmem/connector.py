@@ -2,6 +2,10 @@
 
 import asyncio
 import logging
+import time
+
+from . import tracing
+from .metrics import ConnectorMetrics
 
 __author__ = "Robert Harder"
 __email__ = "rob@iharder.net"
@@ -19,6 +23,7 @@ class Connector(object):
         self.log = logging.getLogger(__name__ + '.' + self.__class__.__name__)
         self.listener = None  # type: ConnectorListener
         self.loop = None  # type: asyncio.BaseEventLoop
+        self.metrics = ConnectorMetrics(self)  # Subclasses count what they send and receive
 
     def connect(self, listener, netmem_dict, loop: asyncio.BaseEventLoop = None):
         """
@@ -50,6 +55,24 @@ class Connector(object):
         """ Provides an opportunity for the Connector to gracefully close. """
         pass
 
+    def _decode(self, data: bytes) -> dict:
+        """ Decodes a payload with the connector's codec, reporting to the listener's tracer if it has one. """
+        tracer = getattr(self.listener, "tracer", None)  # type: tracing.Tracer
+        if tracer is None:
+            return self.codec.decode(data)
+        start = time.perf_counter()
+        msg = self.codec.decode(data)
+        tracer.decoded(self, tracing.trace_ids(msg), len(data), time.perf_counter() - start)
+        return msg
+
+    def peer_lost(self, node: str):
+        """
+        Called by the NetworkMemory when a peer reached through this Connector
+        has stopped sending heartbeats.  Connectors that hold a session per
+        peer should drop it so they stop paying to send to it.
+        """
+        pass
+
 
 class ConnectorListener(object):
     """ Used more like a Java interface so that connectors know
@@ -58,6 +81,11 @@ class ConnectorListener(object):
     def message_received(self, connector: Connector, msg: dict):
         pass
 
+    def messages_received(self, connector: Connector, msgs: [dict]):
+        """ Called with several messages that arrived together, eg, a burst of datagrams. """
+        for msg in msgs:
+            self.message_received(connector, msg)
+
     def connection_made(self, connector: Connector):
         pass
 
@@ -0,0 +1,220 @@
+"""
+Mergeable value types (CRDTs) for NetworkMemory.
+
+Each type's state is a dictionary tagged with a "crdt" entry, so it travels
+as ordinary JSON.  A change to one of these values goes to peers as a
+"merge" change whose delta is a small, partial state, for instance only
+this peer's own count.  Merging is idempotent, commutative and associative,
+so concurrent changes from any number of peers converge no matter the order
+in which they arrive, and no change is ever lost to last-writer-wins.
+
+Use them through the typed handles on NetworkMemory:
+
+    mem.counter("hits").add(1)
+    mem.orset("online").add("robot-17")
+    mem.lwwmap("config")["speed"] = 3
+"""
+
+from .hlc import Timestamp, ZERO
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+class PNCounter(dict):
+    """
+    Counter that can go up and down.  Each peer keeps its own running totals
+    of increments ("p") and decrements ("n"); merging keeps the larger total
+    per peer, and the value is the sum of all increments less all decrements.
+    """
+    TYPE = "pncounter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self["crdt"] = self.TYPE
+        self["p"] = dict(self.get("p", {}))
+        self["n"] = dict(self.get("n", {}))
+
+    @property
+    def value(self) -> int:
+        return sum(self["p"].values()) - sum(self["n"].values())
+
+    def join(self, delta: dict) -> bool:
+        """ Merges delta into this state in place and returns whether anything changed. """
+        changed = False
+        for side in ("p", "n"):
+            mine = self[side]
+            for node, total in delta.get(side, {}).items():
+                if total > mine.get(node, 0):
+                    mine[node] = total
+                    changed = True
+        return changed
+
+
+class ORSet(dict):
+    """
+    Observed-remove set.  Every add is recorded under a unique tag, and a
+    remove retires only the tags its peer had seen, so an add that happens
+    concurrently with a remove survives.  Retired tags are kept forever.
+    """
+    TYPE = "orset"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self["crdt"] = self.TYPE
+        self["adds"] = dict(self.get("adds", {}))  # maps tag to element
+        self["removes"] = dict(self.get("removes", {}))  # maps retired tag to 1
+
+    @property
+    def value(self) -> list:
+        elements = []
+        for tag, elem in self["adds"].items():
+            if tag not in self["removes"] and elem not in elements:
+                elements.append(elem)
+        return elements
+
+    def live_tags(self, elem) -> [str]:
+        removes = self["removes"]
+        return [tag for tag, e in self["adds"].items() if e == elem and tag not in removes]
+
+    def join(self, delta: dict) -> bool:
+        changed = False
+        for tag, elem in delta.get("adds", {}).items():
+            if tag not in self["adds"]:
+                self["adds"][tag] = elem
+                changed = True
+        for tag in delta.get("removes", {}):
+            if tag not in self["removes"]:
+                self["removes"][tag] = 1
+                changed = True
+        return changed
+
+
+class LWWMap(dict):
+    """
+    Map whose fields are each resolved last-writer-wins by hybrid logical
+    clock timestamp, so concurrent writes to different fields never clobber
+    each other.  Removed fields are kept as timestamped tombstones.
+    """
+    TYPE = "lwwmap"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self["crdt"] = self.TYPE
+        # Maps field to [timestamp, value, present]
+        self["entries"] = {f: list(e) for f, e in self.get("entries", {}).items()}
+
+    @property
+    def value(self) -> dict:
+        return {f: e[1] for f, e in self["entries"].items() if e[2]}
+
+    def join(self, delta: dict) -> bool:
+        changed = False
+        entries = self["entries"]
+        for field, entry in delta.get("entries", {}).items():
+            mine = entries.get(field)
+            if mine is None or Timestamp.parse(entry[0]) > Timestamp.parse(mine[0]):
+                entries[field] = list(entry)
+                changed = True
+        return changed
+
+
+TYPES = {cls.TYPE: cls for cls in (PNCounter, ORSet, LWWMap)}
+
+
+def is_state(value) -> bool:
+    """ True if value is the state of one of the CRDT types, possibly as a plain dictionary from the wire. """
+    return isinstance(value, dict) and value.get("crdt") in TYPES
+
+
+class _Handle(object):
+    """ Typed access to the CRDT stored under one key of a BindableDict. """
+    STATE = None  # type: type
+
+    def __init__(self, bdict, key):
+        self.bdict = bdict
+        self.key = key
+
+    def __repr__(self):
+        return "{}({!r}, {!r})".format(self.__class__.__name__, self.key, self.value)
+
+    @property
+    def state(self):
+        state = self.bdict.get(self.key)
+        if state is None:
+            return self.STATE()
+        if not isinstance(state, self.STATE):
+            if not (isinstance(state, dict) and state.get("crdt") == self.STATE.TYPE):
+                raise TypeError("Key {!r} does not hold a {}".format(self.key, self.STATE.TYPE))
+            state = self.STATE(state)
+        return state
+
+    @property
+    def value(self):
+        return self.state.value
+
+    def _merge(self, **fields):
+        delta = {"crdt": self.STATE.TYPE}
+        delta.update(fields)
+        self.bdict.merge(self.key, delta)
+
+
+class CounterHandle(_Handle):
+    STATE = PNCounter
+
+    def add(self, amount: int = 1):
+        """ Adds amount, which may be negative, to the counter. """
+        if amount == 0:
+            return
+        node = self.bdict.node_id
+        side = "p" if amount > 0 else "n"
+        total = self.state[side].get(node, 0) + abs(amount)
+        self._merge(**{side: {node: total}})
+
+
+class ORSetHandle(_Handle):
+    STATE = ORSet
+
+    def __contains__(self, elem):
+        return bool(self.state.live_tags(elem))
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def add(self, elem):
+        stamp = self.bdict._clock.now()
+        tag = "{}:{}:{}".format(stamp.node, stamp.wall, stamp.logical)
+        self._merge(adds={tag: elem})
+
+    def remove(self, elem):
+        """ Removes elem as this peer currently sees it.  Does nothing if elem is absent. """
+        tags = self.state.live_tags(elem)
+        if tags:
+            self._merge(removes={tag: 1 for tag in tags})
+
+
+class LWWMapHandle(_Handle):
+    STATE = LWWMap
+
+    def __getitem__(self, field):
+        return self.value[field]
+
+    def __setitem__(self, field: str, value):
+        self._merge(entries={field: [self.bdict._clock.now(), value, True]})
+
+    def __delitem__(self, field: str):
+        self._merge(entries={field: [self.bdict._clock.now(), None, False]})
+
+    def __contains__(self, field):
+        return field in self.value
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def get(self, field, default=None):
+        return self.value.get(field, default)
@@ -0,0 +1,243 @@
+"""
+Connecting NetworkMemory objects with unicast UDP gossip, for networks without multicast.
+
+Each batch of changes goes to a few randomly chosen peers, who apply it and,
+because NetworkMemory passes along whatever actually changed, forward it to a
+few random peers of their own.  An update therefore reaches the whole cluster
+in a logarithmic number of hops while each node sends only fanout messages
+per update, no matter how large the cluster grows.
+
+Anything lost along the way is repaired by anti-entropy: once per interval
+every node sends one random peer a fixed-size digest of which version of
+each key it holds, its key and hybrid logical clock timestamp, hashed into
+buckets.  The peer answers with its entries for each bucket that
+differs and asks for the sender's entries for those same buckets.
+
+Membership starts from a list of seed addresses and spreads by piggybacking
+a small sample of known peers on every message.
+
+Gossip adds one entry to the usual message dictionary:
+
+{
+    "name": ...,
+    "changes": [...],  # optional
+    "gossip": {
+        "id": random identifier of the sending connector
+        "members": [[host, port], ...],  # sample of peers the sender knows
+        "digest": [int, ...],  # optional, bucket hashes of the sender's keys and timestamps
+        "pull": [int, ...]  # optional, buckets the sender wants entries for
+    }
+}
+"""
+import asyncio
+import random
+import time
+import uuid
+import zlib
+
+from .codec import MessageCodec
+from .connector import Connector, ConnectorListener
+from .hlc import ZERO
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+class GossipConnector(Connector):
+    def __init__(self, local_addr: (str, int) = None, seeds: [(str, int)] = None,
+                 fanout: int = 3, interval: float = 1.0, buckets: int = 64,
+                 member_sample: int = 4, peer_timeout: float = 30, max_batch: int = 50,
+                 codec: MessageCodec = None):
+        """
+        :param local_addr: (host, port) to listen on
+        :param seeds: addresses of peers to contact when joining the cluster
+        :param fanout: number of random peers each batch of changes is sent to
+        :param interval: seconds between anti-entropy rounds
+        :param buckets: number of hash buckets in the anti-entropy digest
+        :param member_sample: number of known peers piggybacked on each message
+        :param peer_timeout: seconds after which a silent peer is forgotten
+        :param max_batch: most anti-entropy entries to put in one datagram
+        :param codec: encodes outgoing datagrams, eg, MessageCodec(threshold=1024) to compress large ones
+        """
+        super().__init__()
+        self.local_addr = local_addr or ("0.0.0.0", 9990)
+        self.seeds = [tuple(s) for s in (seeds or [])]
+        self.fanout = fanout
+        self.interval = interval
+        self.buckets = buckets
+        self.member_sample = member_sample
+        self.peer_timeout = peer_timeout
+        self.max_batch = max_batch
+        self.codec = codec or MessageCodec()
+
+        self.node_id = uuid.uuid4().hex
+        self.members = {}  # type: {(str, int): float}  # maps peer address to time last heard from
+        self._own_addrs = set()  # Addresses other peers know us by, learned when we hear ourselves
+        self._transport = None  # type: asyncio.DatagramTransport
+        self._round_handle = None  # type: asyncio.TimerHandle
+
+    def __repr__(self):
+        return "{}(local_addr={}, members={})".format(self.__class__.__name__, self.local_addr, len(self.members))
+
+    def connect(self, listener: ConnectorListener, netmem_dict, loop: asyncio.BaseEventLoop = None) -> Connector:
+        super().connect(listener, netmem_dict, loop=loop)
+
+        async def _connect():
+            """ Used internally to connect on the appropriate event loop. """
+            await self.loop.create_datagram_endpoint(lambda: self, local_addr=self.local_addr)
+            self._schedule_round()
+
+        asyncio.run_coroutine_threadsafe(_connect(), loop=self.loop)
+        return self
+
+    def close(self):
+        self.log.debug("{} : close() called".format(self))
+        if self._round_handle is not None:
+            self._round_handle.cancel()
+            self._round_handle = None
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def send_message(self, msg: dict):
+        targets = self._random_members(self.fanout)
+        self.log.debug("{} : Gossiping to {}: {}".format(self, targets, msg))
+        for addr in targets:
+            self._sendto(msg, addr)
+
+    def gossip_round(self):
+        """ Forgets silent peers and starts an anti-entropy exchange with one random peer. """
+        cutoff = time.time() - self.peer_timeout
+        for addr, last_seen in list(self.members.items()):
+            if last_seen < cutoff and addr not in self.seeds:
+                del self.members[addr]
+
+        targets = self._random_members(1) or self.seeds[:1]
+        for addr in targets:
+            self._sendto({"name": self.netmem.name, "gossip": {"digest": self.digest()}}, addr)
+
+    def digest(self) -> [int]:
+        """
+        Hashes each key and the timestamp of its last change into a fixed number
+        of buckets so two peers can tell where they differ, without encoding values.
+        Numeric regions are hashed likewise, with the timestamp of their newest slice.
+        """
+        digest = [0] * self.buckets
+        timestamps = self.netmem._timestamps
+        for key in list(dict.keys(self.netmem)):
+            self._add_version(digest, key, timestamps.get(key, ZERO))
+        for key in self._written_regions():
+            self._add_version(digest, key, self.netmem.region_timestamp(key), tag="region\0")
+        return digest
+
+    def _add_version(self, digest: [int], key, timestamp, tag: str = ""):
+        wall, logical, node = timestamp
+        text = str(key)
+        version = "{}{}\0{!r}\0{}\0{}".format(tag, text, wall, logical, node).encode()
+        digest[zlib.crc32(text.encode()) % self.buckets] ^= zlib.crc32(version)
+
+    def entries(self, buckets) -> [dict]:
+        """
+        Returns the memory's contents in the given buckets as a list of update
+        changes, followed by whole region slices for its numeric regions.
+        """
+        buckets = set(buckets)
+        timestamps = self.netmem._timestamps
+        entries = [{"key": key, "action": "update", "old_val": None, "new_val": value,
+                    "timestamp": timestamps.get(key, 0)}
+                   for key, value in list(dict.items(self.netmem)) if self._bucket(key) in buckets]
+        entries += [self.netmem.region_state(key) for key in self._written_regions() if self._bucket(key) in buckets]
+        return entries
+
+    def _written_regions(self) -> list:
+        """ Regions never written to hold only zeros and are left out, as state_message() does. """
+        return [key for key in self.netmem.regions() if key in self.netmem._region_marks]
+
+    def _send_entries(self, buckets, addr: (str, int)):
+        entries = self.entries(buckets)
+        for i in range(0, len(entries), self.max_batch):
+            self._sendto({"name": self.netmem.name, "changes": entries[i:i + self.max_batch]}, addr)
+
+    def _bucket(self, key) -> int:
+        return zlib.crc32(str(key).encode()) % self.buckets
+
+    def _random_members(self, count: int) -> [(str, int)]:
+        members = list(self.members)
+        return random.sample(members, min(count, len(members)))
+
+    def _sendto(self, msg: dict, addr: (str, int)):
+        if self._transport is None:
+            return
+        msg = dict(msg)
+        gossip = dict(msg.get("gossip", {}))
+        gossip["id"] = self.node_id
+        gossip["members"] = [m for m in self._random_members(self.member_sample) if m != addr]
+        msg["gossip"] = gossip
+        data = self.codec.encode(msg)
+        self._transport.sendto(data, addr)
+        self.metrics.sent(len(data))
+
+    def _schedule_round(self):
+        self.gossip_round()
+        self._round_handle = self.loop.call_later(self.interval, self._schedule_round)
+
+    # ########
+    # asyncio.DatagramProtocol methods
+
+    def connection_made(self, transport):
+        self.log.info("{} : Connection made {}".format(self, transport))
+        self._transport = transport
+        self.listener.connection_made(self)
+        for addr in self.seeds:
+            self._sendto({"name": self.netmem.name}, addr)  # Announce ourselves
+
+    def connection_lost(self, exc):
+        self.log.info("{} : Connection lost (Error: {})".format(self, exc))
+        self._transport = None
+        self.listener.connection_lost(self, exc=exc)
+
+    def datagram_received(self, data, addr):
+        self.log.debug("{} : Datagram received from {}: {}".format(self, addr, data))
+        self.metrics.received(len(data))
+        try:
+            msg = self._decode(data)
+        except ValueError as e:
+            self.log.error("{} : Dropping unreadable datagram from {}: {}".format(self, addr, e))
+            return
+        gossip = msg.get("gossip", {})
+
+        addr = tuple(addr)
+        if gossip.get("id") == self.node_id:
+            self._own_addrs.add(addr)
+            self.members.pop(addr, None)
+            return
+
+        now = time.time()
+        self.members[addr] = now
+        for member in gossip.get("members", []):
+            member = tuple(member)
+            if member not in self._own_addrs:
+                self.members.setdefault(member, now)
+
+        if "changes" in msg:
+            self.listener.message_received(self, msg)
+
+        if "digest" in gossip:
+            theirs = gossip["digest"]
+            mine = self.digest()
+            differ = [b for b, (h1, h2) in enumerate(zip(mine, theirs)) if h1 != h2]
+            if differ:
+                self._sendto({"name": self.netmem.name, "gossip": {"pull": differ}}, addr)
+                self._send_entries(differ, addr)
+
+        if "pull" in gossip:
+            self._send_entries(gossip["pull"], addr)
+
+    def error_received(self, exc):
+        self.log.error("{} : Error received: {}".format(self, exc))
+        self.listener.connection_error(self, exc=exc)
+
+    # End asyncio.DatagramProtocol methods
+    # ########
@@ -0,0 +1,83 @@
+"""
+Hybrid logical clocks for ordering changes across NetworkMemory peers.
+
+A hybrid logical clock timestamp pairs the wall clock with a logical
+counter.  It stays close to real time but, unlike time.time(), never runs
+backwards and always moves past any timestamp it has seen from a peer, so
+"happened after" is preserved even when the hosts' clocks disagree.  The
+node identifier breaks the tie between two different peers that produce
+the same wall and counter values.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+class Timestamp(namedtuple("Timestamp", ["wall", "logical", "node"])):
+    """
+    Compares as a tuple: wall clock seconds, then logical counter, then node.
+    Being a tuple, it travels in JSON as a list [wall, logical, node].
+    """
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, value) -> "Timestamp":
+        """ Accepts a Timestamp, its list form from the wire, or a bare unix time from older peers. """
+        if isinstance(value, Timestamp):
+            return value
+        if isinstance(value, (list, tuple)):
+            wall, logical, node = value
+            return cls(float(wall), int(logical), str(node))
+        return cls(float(value or 0), 0, "")
+
+
+ZERO = Timestamp(0.0, 0, "")
+
+
+class HybridLogicalClock(object):
+    def __init__(self, node: str, clock=time.time):
+        """
+        :param node: identifier of this peer, used to break ties
+        :param clock: source of wall clock time, replaceable to simulate skew
+        """
+        self.node = node
+        self.clock = clock
+        self._last = ZERO
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "{}({}, last={})".format(self.__class__.__name__, self.node, self._last)
+
+    def now(self) -> Timestamp:
+        """ Returns a timestamp for a local change, later than every timestamp issued or seen so far. """
+        wall = self.clock()
+        with self._lock:
+            last = self._last
+            if wall > last.wall:
+                self._last = Timestamp(wall, 0, self.node)
+            else:
+                self._last = Timestamp(last.wall, last.logical + 1, self.node)
+            return self._last
+
+    def update(self, remote: Timestamp) -> Timestamp:
+        """ Moves the clock past a timestamp received from a peer. """
+        wall = self.clock()
+        with self._lock:
+            last = self._last
+            top = max(wall, last.wall, remote.wall)
+            if top == last.wall and top == remote.wall:
+                logical = max(last.logical, remote.logical) + 1
+            elif top == last.wall:
+                logical = last.logical + 1
+            elif top == remote.wall:
+                logical = remote.logical + 1
+            else:
+                logical = 0
+            self._last = Timestamp(top, logical, self.node)
+            return self._last
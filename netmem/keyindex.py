@@ -0,0 +1,176 @@
+"""
+A sorted index of a BindableDict's keys, for prefix and range queries.
+
+Keys with a shared prefix, like "robot/17/pose" and "robot/17/battery",
+are neighbors in sorted order, so finding or counting them takes a pair of
+binary searches instead of a scan of every key.  The index keeps its keys
+in a list of short sorted lists, so adding or removing a key moves at most
+a few hundred references rather than shifting one long list.  A Fenwick
+tree over the lengths of the short lists keeps counting in logarithmic
+time as keys come and go.
+
+    mem = NetworkMemory(key_index=True)
+    mem.keys(prefix="robot/17/")
+    mem.count(prefix="robot/")
+    mem.items(start="a", stop="m")
+
+Only string keys are indexed.
+"""
+
+import bisect
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+def prefix_bounds(prefix: str = None, start: str = None, stop: str = None) -> (str, str):
+    """
+    Returns the (start, stop) range of keys that begin with prefix and fall
+    within start <= key < stop.  None means no bound.
+    """
+    if prefix:
+        end = prefix
+        while end and end[-1] == chr(0x10ffff):
+            end = end[:-1]
+        end = end[:-1] + chr(ord(end[-1]) + 1) if end else None
+        start = prefix if start is None else max(start, prefix)
+        stop = end if stop is None else (stop if end is None else min(stop, end))
+    return start, stop
+
+
+class KeyIndex(object):
+    LOAD = 512  # Sublists are split when they grow past twice this
+
+    def __init__(self, keys=()):
+        ordered = sorted({k for k in keys if type(k) is str})
+        self._lists = [ordered[i:i + self.LOAD] for i in range(0, len(ordered), self.LOAD)]
+        self._maxes = [sub[-1] for sub in self._lists]
+        self._len = len(ordered)
+        self._tree = []  # Fenwick tree of sublist lengths, rebuilt only when sublists split or go
+        self._build_tree()
+
+    def __repr__(self):
+        return "{}({} keys)".format(self.__class__.__name__, self._len)
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, key):
+        if type(key) is not str:
+            return False
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._lists):
+            return False
+        sub = self._lists[i]
+        j = bisect.bisect_left(sub, key)
+        return j < len(sub) and sub[j] == key
+
+    def add(self, key):
+        if type(key) is not str:
+            return
+        if not self._lists:
+            self._lists.append([key])
+            self._maxes.append(key)
+            self._len = 1
+            self._build_tree()
+            return
+        i = min(bisect.bisect_left(self._maxes, key), len(self._lists) - 1)
+        sub = self._lists[i]
+        j = bisect.bisect_left(sub, key)
+        if j < len(sub) and sub[j] == key:
+            return
+        sub.insert(j, key)
+        self._maxes[i] = sub[-1]
+        self._len += 1
+        if len(sub) > 2 * self.LOAD:
+            self._lists[i:i + 1] = [sub[:self.LOAD], sub[self.LOAD:]]
+            self._maxes[i:i + 1] = [sub[self.LOAD - 1], sub[-1]]
+            self._build_tree()
+        else:
+            self._grow(i, 1)
+
+    def discard(self, key):
+        if type(key) is not str:
+            return
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._lists):
+            return
+        sub = self._lists[i]
+        j = bisect.bisect_left(sub, key)
+        if j == len(sub) or sub[j] != key:
+            return
+        del sub[j]
+        self._len -= 1
+        if sub:
+            self._maxes[i] = sub[-1]
+            self._grow(i, -1)
+        else:
+            del self._lists[i]
+            del self._maxes[i]
+            self._build_tree()
+
+    def clear(self):
+        self._lists = []
+        self._maxes = []
+        self._len = 0
+        self._tree = []
+
+    def _build_tree(self):
+        tree = [0] + [len(sub) for sub in self._lists]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _grow(self, i: int, amount: int):
+        """ Adds amount to the length of sublist i in the tree. """
+        i += 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += amount
+            i += i & -i
+
+    def _before(self, i: int) -> int:
+        """ Returns how many keys are in the sublists before sublist i. """
+        total = 0
+        tree = self._tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, key: str) -> (int, int):
+        """ Returns (sublist, position in it) of the first key not less than key. """
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._lists):
+            return i, 0
+        return i, bisect.bisect_left(self._lists[i], key)
+
+    def _rank(self, key: str) -> int:
+        """ Returns how many keys are less than key. """
+        if key is None:
+            return self._len
+        i, j = self._locate(key)
+        if i == len(self._lists):
+            return self._len
+        return self._before(i) + j
+
+    def irange(self, start: str = None, stop: str = None):
+        """ Yields keys in order from start, inclusive, up to stop, exclusive. """
+        i, j = self._locate(start) if start is not None else (0, 0)
+        lists = self._lists
+        while i < len(lists):
+            sub = lists[i]
+            if stop is not None and sub[-1] >= stop:
+                yield from sub[j:bisect.bisect_left(sub, stop)]
+                return
+            yield from sub[j:]
+            i, j = i + 1, 0
+
+    def count(self, start: str = None, stop: str = None) -> int:
+        """ Returns how many keys fall within start <= key < stop. """
+        low = self._rank(start) if start is not None else 0
+        return max(0, self._rank(stop) - low)
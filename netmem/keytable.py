@@ -0,0 +1,130 @@
+"""
+Per-connection key tables that replace repeated key strings with small integers.
+
+The first time a key goes out on a connection, its change carries both the
+key and a key ID:
+
+    {"key": "fleet/robot-0042/telemetry/battery_voltage", "kid": 17, ...}
+
+and after that only the ID:
+
+    {"kid": 17, ...}
+
+The receiving end of each connection remembers the IDs it has been told
+about.  Both ends announce that they understand key IDs by sending
+{"keytable": 1} when the connection opens, and a connection only uses IDs
+after hearing that from its peer, so peers that never announce, such as
+the html view, keep getting plain keys.
+
+Key tables need a reliable, ordered connection, so they are used by the
+stream and websocket connectors but not by the datagram based ones.
+"""
+
+import logging
+import sys
+
+from . import lazy
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+HELLO = {"keytable": 1}
+
+
+class KeyEncoder(object):
+    """
+    Assigns key IDs for one connector.  IDs are shared by all of the
+    connector's connections, and each connection's KeySession remembers
+    which of them it has announced.
+    """
+
+    def __init__(self, max_keys: int = 1 << 20):
+        self.max_keys = max_keys
+        self._ids = {}  # type: {str: int}
+
+    def encode(self, msg: dict) -> (dict, dict, [int]):
+        """
+        Returns the message with key IDs only, the message with keys and IDs
+        both, and the IDs used.  The original message is not changed.
+        """
+        changes = msg.get("changes")
+        if not changes:
+            return msg, msg, []
+
+        compact, defining, kids = [], [], []
+        for change in changes:
+            key = change.get("key")
+            kid = self._ids.get(key)
+            if kid is None and isinstance(key, str) and len(self._ids) < self.max_keys:
+                kid = self._ids[key] = len(self._ids)
+            if kid is None:
+                compact.append(change)
+                defining.append(change)
+                continue
+            short = dict(change)
+            del short["key"]
+            short["kid"] = kid
+            compact.append(short)
+            defining.append(dict(short, key=key))
+            kids.append(kid)
+        return dict(msg, changes=compact), dict(msg, changes=defining), kids
+
+
+class KeySession(object):
+    """ Key table state for one connection. """
+
+    def __init__(self):
+        self.log = logging.getLogger(__name__ + '.' + self.__class__.__name__)
+        self.enabled = False  # Set once the peer says it understands key IDs
+        self.announced = set()  # IDs whose keys we have sent on this connection
+        self.incoming = {}  # type: {int: str}
+
+    def choose(self, msg: dict, compact: dict, defining: dict, kids: [int]) -> dict:
+        """ Picks which form of an outgoing message (see KeyEncoder.encode) this connection should get. """
+        if not self.enabled or not kids:
+            return msg
+        if self.announced.issuperset(kids):
+            return compact
+        self.announced.update(kids)
+        return defining
+
+    def decode(self, msg: dict) -> dict:
+        """ Restores keys in an incoming message in place, dropping changes whose ID is unknown. """
+        if msg.get("keytable"):
+            self.enabled = True
+        changes = msg.get("changes")
+        if not changes:
+            return msg
+
+        restored = []
+        for change in changes:
+            kid = change.pop("kid", None)
+            if kid is not None:
+                if "key" in change:
+                    self.incoming[kid] = sys.intern(str(change["key"]))
+                elif kid in self.incoming:
+                    change["key"] = self.incoming[kid]
+                else:
+                    self.log.error("Dropping change with unknown key ID {}: {}".format(kid, change))
+                    continue
+            restored.append(change)
+        msg["changes"] = restored
+        return msg
+
+
+def encode_for(sessions, msg: dict, encoder: KeyEncoder, codec=None):
+    """
+    Yields (session, bytes) for each session, encoding each distinct form of
+    the message only once, with codec (a netmem.codec.MessageCodec) if given
+    or as plain JSON otherwise.
+    """
+    compact, defining, kids = encoder.encode(msg)
+    encoded = {}
+    for session in sessions:
+        form = session.choose(msg, compact, defining, kids)
+        data = encoded.get(id(form))
+        if data is None:
+            data = encoded[id(form)] = codec.encode(form) if codec else lazy.dumps(form).encode()
+        yield session, data
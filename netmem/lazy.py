@@ -0,0 +1,130 @@
+"""
+Values kept in their encoded form until something reads them.
+
+A NetworkMemory created with lazy=True sends nested values (dictionaries
+and lists) as their JSON text in a "raw_val" field instead of "new_val":
+
+    {"key": "scan", "action": "update", "raw_val": "{\\"points\\": [...]}", "timestamp": ...}
+
+Decoding such a message costs one string copy rather than building every
+nested object.  A lazy receiver stores the text as a LazyValue, which is
+decoded the first time the key is read, and a node that only relays the
+value passes the same text along without ever decoding it, so turn lazy
+mode on for the nodes that send values as well as those that relay them.  Any
+NetworkMemory understands "raw_val", lazy or not, but other consumers of
+the messages, such as the html view, do not, so only use lazy mode where
+every peer is a NetworkMemory.
+"""
+
+import json
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+class LazyValue(object):
+    __slots__ = ("raw", "_value", "_decoded")
+
+    def __init__(self, raw: str):
+        self.raw = raw
+        self._value = None
+        self._decoded = False
+
+    def __repr__(self):
+        return "{}({} chars)".format(self.__class__.__name__, len(self.raw))
+
+    def __eq__(self, other):
+        if isinstance(other, LazyValue):
+            return self.raw == other.raw or self.value == other.value
+        return self.value == other
+
+    __hash__ = None
+
+    @property
+    def decoded(self) -> bool:
+        return self._decoded
+
+    @property
+    def value(self):
+        """ The decoded value, decoded on first use. """
+        if not self._decoded:
+            self._value = json.loads(self.raw)
+            self._decoded = True
+        return self._value
+
+    def peek(self):
+        """ The decoded value, for readers that should not make this LazyValue keep it, eg, snapshots. """
+        return self.value
+
+
+def resolve(value):
+    """ Returns value, decoded first if it is a LazyValue. """
+    return value.value if isinstance(value, LazyValue) else value
+
+
+def raw_text(value):
+    """ Returns the JSON text of a value to send as "raw_val", or None if it should go as is. """
+    if isinstance(value, LazyValue):
+        return value.raw
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)  # Sorted so equal values have equal text, and blob hashes
+    return None
+
+
+def dumps(obj, **kwargs) -> str:
+    """ Like json.dumps but copies the text of any LazyValues in obj without decoding them. """
+    return _LazyEncoder(**kwargs).encode(obj)
+
+
+class _FoundLazy(Exception):
+    """ Stops the C encoder, which cannot copy text in, at the first LazyValue. """
+
+
+class _LazyEncoder(json.JSONEncoder):
+    """
+    Writes the text of LazyValues in place as it goes.  Parts of a value
+    with no LazyValues in them go through the usual C encoder, and only the
+    containers that hold LazyValues are walked here.
+    """
+
+    def __init__(self, **kwargs):
+        self._fallback = kwargs.pop("default", None)
+        super().__init__(**kwargs)
+        self._string = json.encoder.encode_basestring_ascii if self.ensure_ascii else json.encoder.encode_basestring
+
+    def default(self, o):
+        if isinstance(o, LazyValue):
+            raise _FoundLazy()
+        if self._fallback is not None:
+            return self._fallback(o)
+        return super().default(o)
+
+    def iterencode(self, o, _one_shot=False):
+        try:
+            return list(super().iterencode(o, _one_shot=True))
+        except _FoundLazy:
+            return self._iterencode_lazy(o)
+
+    def _iterencode_lazy(self, o):
+        if isinstance(o, LazyValue):
+            yield o.raw
+        elif isinstance(o, dict):
+            yield "{"
+            for i, (key, value) in enumerate(sorted(o.items()) if self.sort_keys else o.items()):
+                if i:
+                    yield self.item_separator
+                yield self._string(key if isinstance(key, str) else json.dumps(key))
+                yield self.key_separator
+                yield from self.iterencode(value)
+            yield "}"
+        elif isinstance(o, (list, tuple)):
+            yield "["
+            for i, value in enumerate(o):
+                if i:
+                    yield self.item_separator
+                yield from self.iterencode(value)
+            yield "]"
+        else:
+            yield from self.iterencode(self._fallback(o))  # Something default turned into a LazyValue
@@ -21,9 +21,10 @@ class LoggingConnector(Connector):
         self.log.setLevel(logging.DEBUG)
 
     def connect(self, listener:ConnectorListener, netmem_dict, loop: asyncio.BaseEventLoop = None):
-        super().connect(listener, loop)
+        super().connect(listener, netmem_dict, loop=loop)
         self.log.info("Connected.")
         self.listener.connection_made(self)
 
     def send_message(self, msg: dict):
         self.log.info("Sending message: {}".format(msg))
+        self.metrics.sent(0)
@@ -0,0 +1,200 @@
+"""
+Connecting NetworkMemory objects in the same process over a simulated network.
+
+Every LoopbackConnector joins a LoopbackNetwork, which carries encoded
+messages between them over links with configurable latency, jitter, loss,
+reordering and bandwidth.  Time on the network is simulated: messages wait
+in a queue ordered by when they would arrive, and run() delivers them in
+that order, advancing the network's clock as it goes.  Hundreds of nodes
+can therefore run in one process, on one event loop, as fast as the CPU
+allows, and the same seed makes the same choices of jitter, loss and
+reordering every time.
+
+    network = LoopbackNetwork(Link(latency=0.005, loss=0.01), seed=1)
+    loop = asyncio.new_event_loop()
+    a, b = NetworkMemory(), NetworkMemory()
+    a.connect(LoopbackConnector(network, "a"), loop=loop)
+    b.connect(LoopbackConnector(network, "b"), loop=loop)
+    a["x"] = 1
+    network.run()
+    b["x"]  # 1, 5 simulated milliseconds later
+
+Messages only move while run() is called.  See netmem.simulation to run
+whole clusters.
+"""
+
+import asyncio
+import heapq
+import random
+
+from .codec import MessageCodec
+from .connector import Connector, ConnectorListener
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+class Link(object):
+    """ How a message crosses from one connector to another. """
+
+    def __init__(self, latency: float = 0.001, jitter: float = 0.0, loss: float = 0.0,
+                 reorder: float = 0.0, bandwidth: float = None):
+        """
+        :param latency: seconds for a message to cross
+        :param jitter: up to this many seconds more, chosen at random for each message
+        :param loss: fraction of messages dropped
+        :param reorder: fraction of messages held back one more latency, letting later ones pass
+        :param bandwidth: bytes per second the link carries, or None for no limit
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.reorder = reorder
+        self.bandwidth = bandwidth
+
+    def __repr__(self):
+        return "{}(latency={}, jitter={}, loss={}, reorder={}, bandwidth={})".format(
+            self.__class__.__name__, self.latency, self.jitter, self.loss, self.reorder, self.bandwidth)
+
+
+class LoopbackNetwork(object):
+    def __init__(self, link: Link = None, seed=None):
+        """
+        :param link: the link between every pair of connectors not given one with set_link()
+        :param seed: seeds the random choices of jitter, loss and reordering
+        """
+        self.link = link or Link()
+        self.random = random.Random(seed)
+        self.now = 0.0  # Simulated seconds
+        self.connectors = {}  # type: {str: LoopbackConnector}
+        self._links = {}  # type: {(str, str): Link}
+        self._free_at = {}  # type: {(str, str): float}  # When each link finishes sending what it has
+        self._last_arrival = {}  # type: {(str, str): float}  # Keeps links in order unless reordering
+        self._queue = []  # Heap of (arrival time, sequence, source name, destination name, data)
+        self._sequence = 0
+
+        self.messages = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.delivered = 0
+
+    def __repr__(self):
+        return "{}({} connectors, t={:.6f})".format(self.__class__.__name__, len(self.connectors), self.now)
+
+    def set_link(self, src: str, dst: str, link: Link, both_ways: bool = True):
+        """ Gives the link from src to dst, and by default from dst to src, its own behavior. """
+        self._links[(src, dst)] = link
+        if both_ways:
+            self._links[(dst, src)] = link
+
+    def reset_counts(self):
+        self.messages = self.bytes = self.dropped = self.delivered = 0
+
+    @property
+    def idle(self) -> bool:
+        return not self._queue
+
+    def send(self, src: str, dst: str, data: bytes):
+        """ Puts a message on the link from src to dst. """
+        self.messages += 1
+        self.bytes += len(data)
+        pair = (src, dst)
+        link = self._links.get(pair, self.link)
+        if link.loss and self.random.random() < link.loss:
+            self.dropped += 1
+            return
+
+        start = max(self.now, self._free_at.get(pair, 0.0))
+        sent = start + (len(data) / link.bandwidth if link.bandwidth else 0.0)
+        self._free_at[pair] = sent
+        arrival = sent + link.latency
+        if link.jitter:
+            arrival += self.random.uniform(0, link.jitter)
+        if link.reorder and self.random.random() < link.reorder:
+            arrival += link.latency  # Does not hold up the messages behind it
+        else:
+            arrival = max(arrival, self._last_arrival.get(pair, 0.0))
+            self._last_arrival[pair] = arrival
+        self._sequence += 1
+        heapq.heappush(self._queue, (arrival, self._sequence, src, dst, data))
+
+    def step(self) -> bool:
+        """ Delivers the next message to arrive, if any, and returns whether there was one. """
+        if not self._queue:
+            return False
+        arrival, _, src, dst, data = heapq.heappop(self._queue)
+        self.now = max(self.now, arrival)
+        connector = self.connectors.get(dst)
+        if connector is None:
+            self.dropped += 1
+        else:
+            self.delivered += 1
+            connector.datagram_received(data, src)
+        return True
+
+    def run(self, until: float = None, max_messages: int = None) -> int:
+        """
+        Delivers messages in order of arrival until none are left, or the
+        simulated clock would pass until, or max_messages have been delivered.
+        Returns how many were delivered.
+        """
+        count = 0
+        while self._queue and (max_messages is None or count < max_messages):
+            if until is not None and self._queue[0][0] > until:
+                self.now = max(self.now, until)
+                break
+            self.step()
+            count += 1
+        return count
+
+
+class LoopbackConnector(Connector):
+    def __init__(self, network: LoopbackNetwork, name: str = None, peers: [str] = None,
+                 codec: MessageCodec = None):
+        """
+        :param network: the network to join
+        :param name: this connector's address on the network, by default a number
+        :param peers: names of the connectors to send to, by default every other connector on the network
+        :param codec: encodes messages, so the sizes the network sees match a real transport
+        """
+        super().__init__()
+        self.network = network
+        self.name = name or str(len(network.connectors))
+        self.peers = None if peers is None else list(peers)
+        self.codec = codec or MessageCodec()
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self.name)
+
+    def connect(self, listener: ConnectorListener, netmem_dict, loop: asyncio.BaseEventLoop = None):
+        super().connect(listener, netmem_dict, loop=loop)
+        if self.name in self.network.connectors:
+            raise ValueError("{} is already on the network".format(self.name))
+        self.network.connectors[self.name] = self
+        self.listener.connection_made(self)
+        return self
+
+    def send_message(self, msg: dict):
+        data = self.codec.encode(msg)
+        peers = self.peers if self.peers is not None else self.network.connectors
+        for peer in peers:
+            if peer != self.name:
+                self.network.send(self.name, peer, data)
+                self.metrics.sent(len(data))
+
+    def datagram_received(self, data: bytes, src: str):
+        self.metrics.received(len(data))
+        try:
+            msg = self._decode(data)
+        except ValueError as e:
+            self.log.error("{} : Dropping unreadable message from {}: {}".format(self, src, e))
+            return
+        self.listener.message_received(self, msg)
+
+    def close(self):
+        if self.network.connectors.get(self.name) is self:
+            del self.network.connectors[self.name]
+            if self.listener is not None:
+                self.listener.connection_lost(self, "connector closed")
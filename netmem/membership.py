@@ -0,0 +1,81 @@
+""" Keeps track of which peers a NetworkMemory has heard from, and when. """
+
+import threading
+import time
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+class Peer(object):
+    """
+    A remote NetworkMemory we have received messages from.
+
+    lag is the time between when the peer sent its most recent message and
+    when we received it, so it includes any clock difference between hosts.
+    """
+
+    def __init__(self, node: str, name: str, connector):
+        self.node = node
+        self.name = name
+        self.connector = connector
+        self.last_seen = 0.0
+        self.lag = 0.0
+
+    def __repr__(self):
+        return "{}({}, name={}, last_seen={:.3f}, lag={:.3f})".format(
+            self.__class__.__name__, self.node, self.name, self.last_seen, self.lag)
+
+
+class Membership(object):
+    """
+    Table of peers, refreshed by every message received from them, whether it
+    carries changes or is only a heartbeat.  Peers that go quiet for longer
+    than timeout seconds are evicted.  Connector loops update the table while
+    user threads read it, so every method holds a lock.
+    """
+
+    def __init__(self, timeout: float = 5.0):
+        self.timeout = timeout
+        self._peers = {}  # type: {str: Peer}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._peers)
+
+    def seen(self, node: str, name: str, connector, sent: float = None) -> Peer:
+        """ Records a message from a peer and returns its entry. """
+        now = time.time()
+        with self._lock:
+            peer = self._peers.get(node)
+            if peer is None or peer.connector is not connector:
+                peer = Peer(node, name, connector)
+                self._peers[node] = peer
+            peer.last_seen = now
+            if sent is not None:
+                peer.lag = now - sent
+            return peer
+
+    def evict_expired(self) -> [Peer]:
+        """ Removes and returns the peers that have not been heard from within the timeout. """
+        cutoff = time.time() - self.timeout
+        with self._lock:
+            expired = [p for p in self._peers.values() if p.last_seen < cutoff]
+            for peer in expired:
+                del self._peers[peer.node]
+            return expired
+
+    def remove_connector(self, connector) -> [Peer]:
+        """ Removes and returns the peers that were reached through a connector that has gone away. """
+        with self._lock:
+            gone = [p for p in self._peers.values() if p.connector is connector]
+            for peer in gone:
+                del self._peers[peer.node]
+            return gone
+
+    def peers(self) -> {str: Peer}:
+        with self._lock:
+            return dict(self._peers)
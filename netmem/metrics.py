@@ -0,0 +1,175 @@
+"""
+Counters and histograms that netmem keeps about itself, cheap enough to leave on.
+
+NetworkMemory, BindableDict and the connectors update the default
+registry on their hot paths: messages and bytes in and out per connector,
+how many messages arrive together and how many changes each carries, how
+long applying them takes, and time spent in listeners.  Updating a metric
+is an attribute increment or a bisect, with no locks, so counts may be
+off by a little when several threads update the same metric at once.
+NetworkMemory.close_all() drops the memory's and its connectors' metrics
+from the registry.
+
+Read them as a dictionary:
+
+    netmem.metrics.snapshot()
+
+or as Prometheus style text, which WsServerConnector serves at /metrics:
+
+    netmem.metrics.render_text()
+"""
+
+import bisect
+import itertools
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+SECONDS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+SIZES = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+class Counter(object):
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def read(self):
+        return self.value
+
+
+class Gauge(Counter):
+    """ A value that goes up and down, eg, bytes in use. """
+    __slots__ = ()
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram(object):
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=SECONDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # The last is for values above every bound
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def read(self) -> dict:
+        return {"count": self.count, "sum": self.sum,
+                "buckets": dict(zip([str(b) for b in self.bounds] + ["+Inf"], itertools.accumulate(self.counts)))}
+
+
+class Registry(object):
+    def __init__(self):
+        self._metrics = {}  # type: {(str, tuple): Counter or Histogram}
+        self._help = {}  # type: {str: str}
+
+    def counter(self, name: str, help: str = "", **labels) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str = "", **labels) -> Gauge:
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str = "", bounds=SECONDS, **labels) -> Histogram:
+        return self._get(lambda: Histogram(bounds), name, help, labels)
+
+    def _get(self, factory, name, help, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = self._metrics[key] = factory()
+            self._help.setdefault(name, help)
+        return metric
+
+    def unregister(self, *metrics):
+        """ Stops reporting the given metrics, eg, those of a closed connector. """
+        dropped = set(id(metric) for metric in metrics)
+        for key, metric in list(self._metrics.items()):
+            if id(metric) in dropped:
+                del self._metrics[key]
+
+    def snapshot(self) -> dict:
+        """ Returns every metric's current value, keyed by name and then by its labels as text. """
+        snap = {}
+        for (name, labels), metric in list(self._metrics.items()):
+            snap.setdefault(name, {})[_label_text(labels)] = metric.read()
+        return snap
+
+    def render_text(self) -> str:
+        """ Returns the metrics in the Prometheus text exposition format. """
+        lines = []
+        by_name = {}
+        for (name, labels), metric in sorted(self._metrics.items(), key=lambda item: item[0]):
+            by_name.setdefault(name, []).append((labels, metric))
+        for name, metrics in by_name.items():
+            metric = metrics[0][1]
+            kind = "histogram" if isinstance(metric, Histogram) else "gauge" if isinstance(metric, Gauge) else "counter"
+            if self._help.get(name):
+                lines.append("# HELP {} {}".format(name, self._help[name]))
+            lines.append("# TYPE {} {}".format(name, kind))
+            for labels, metric in metrics:
+                if kind != "histogram":
+                    lines.append("{}{} {}".format(name, _label_text(labels, braces=True), metric.value))
+                    continue
+                for bound, total in zip(list(metric.bounds) + ["+Inf"], itertools.accumulate(metric.counts)):
+                    le = labels + (("le", str(bound)),)
+                    lines.append("{}_bucket{} {}".format(name, _label_text(le, braces=True), total))
+                lines.append("{}_sum{} {}".format(name, _label_text(labels, braces=True), metric.sum))
+                lines.append("{}_count{} {}".format(name, _label_text(labels, braces=True), metric.count))
+        return "\n".join(lines) + "\n"
+
+
+def _label_text(labels: tuple, braces: bool = False) -> str:
+    text = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels)
+    return "{" + text + "}" if braces and text else text
+
+
+REGISTRY = Registry()
+
+
+def snapshot() -> dict:
+    return REGISTRY.snapshot()
+
+
+def render_text() -> str:
+    return REGISTRY.render_text()
+
+
+class ConnectorMetrics(object):
+    """ The metrics for one connector, labeled with its class and a number to tell instances apart. """
+    _numbers = {}  # type: {str: itertools.count}
+
+    def __init__(self, connector, registry: Registry = None):
+        self.registry = registry = registry or REGISTRY
+        kind = connector.__class__.__name__
+        number = next(self._numbers.setdefault(kind, itertools.count(1)))
+        self.label = "{}-{}".format(kind, number)
+        self.messages_out = registry.counter("netmem_messages_sent_total", "Messages sent", connector=self.label)
+        self.bytes_out = registry.counter("netmem_bytes_sent_total", "Bytes sent", connector=self.label)
+        self.messages_in = registry.counter("netmem_messages_received_total", "Messages received",
+                                            connector=self.label)
+        self.bytes_in = registry.counter("netmem_bytes_received_total", "Bytes received", connector=self.label)
+
+    def sent(self, nbytes: int, messages: int = 1):
+        self.messages_out.value += messages
+        self.bytes_out.value += nbytes
+
+    def received(self, nbytes: int, messages: int = 1):
+        self.messages_in.value += messages
+        self.bytes_in.value += nbytes
+
+    def unregister(self):
+        """ Stops reporting these metrics, once the connector is closed. """
+        self.registry.unregister(self.messages_out, self.bytes_out, self.messages_in, self.bytes_in)
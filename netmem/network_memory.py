@@ -7,25 +7,39 @@ Websocket protocol dictionary:
 
 {
     "name" : name of NetworkMemory object
-    "changes" :  # List of changes to dictionary
+    "node" : unique identifier of the NetworkMemory object
+    "sent" : unix epoch timestamp of when the message was sent, as a float
+    "changes" :  # List of changes to dictionary, absent in heartbeats
         [
             {
                 "key": dictionary key that is changed
-                "action": action type - "update", "delete"
-                "value": new value, if needed
-                "timestamp": unix epoch timestamp of change as a float
+                "action": action type - "update", "patch", "merge", "slice", "delete"
+                "new_val": new value, for updates
+                "raw_val": new value as JSON text, for updates from lazy peers (see netmem.lazy)
+                "ops": list of patch operations, for patches (see netmem.patch)
+                "delta": partial CRDT state, for merges (see netmem.crdt)
+                "dtype", "length", "start", "count", "data": for slices of numeric regions
+                                                          (see netmem.region)
+                "state": true for a slice carrying a whole region, to catch up late joiners
+                "timestamp": hybrid logical clock timestamp of change as [wall, logical, node],
+                             where wall is unix epoch time as a float
             }, ...
         ]
 
 """
 import asyncio
+import json
 import logging
 import socket
 import threading
 import time
 
+from . import crdt, lazy, metrics, tracing
+from .priority import OutboundScheduler, PriorityClass
 from .bindable_variable import BindableDict
 from .connector import Connector
+from .hlc import Timestamp, ZERO
+from .membership import Membership, Peer
 
 __author__ = "Robert Harder"
 __email__ = "rob@iharder.net"
@@ -35,21 +49,53 @@ __license__ = "Public Domain"
 
 class NetworkMemory(BindableDict):
     NAME_COUNTER = 1
+
     def __init__(self, **kwargs):
         if "name" in kwargs:
             self.name = kwargs["name"]
             del kwargs["name"]
         else:
-            self.name = "{}_{}".format(self.__class__.__name__, self.NAME_COUNTER)
-            self.NAME_COUNTER += 1
+            self.name = "{}_{}".format(self.__class__.__name__, NetworkMemory.NAME_COUNTER)
+            NetworkMemory.NAME_COUNTER += 1  # On the class, so every unnamed memory gets its own name and metrics
+        self.heartbeat_interval = kwargs.pop("heartbeat_interval", None)  # Seconds, or None to send no heartbeats
+        peer_timeout = kwargs.pop("peer_timeout", 5.0)
+        self.lazy = kwargs.pop("lazy", False)  # Keep nested values from peers encoded until read
+        tracer = kwargs.pop("tracer", None)  # type: tracing.Tracer
+        key_index = kwargs.pop("key_index", False)  # Keep keys sorted for prefix queries, see netmem.keyindex
+        memory_budget = kwargs.pop("memory_budget", None)  # Bytes before cold values spill to disk, see netmem.budget
+        spill_path = kwargs.pop("spill_path", None)
+        priorities = kwargs.pop("priorities", None)  # {key or pattern: PriorityClass}, see netmem.priority
 
         super().__init__(**kwargs)
         self.log = logging.getLogger(__name__ + '.' + self.__class__.__name__)
+        self.tracer = tracer  # Called at each stage of the update pipeline, see netmem.tracing
+        if key_index:
+            self.index_keys()
+        if memory_budget is not None:
+            self.limit_memory(memory_budget, spill_path)
 
         # Data
-        self._timestamps = {}  # maps keys to timestamp of change
         self._connectors = []  # type: [Connector]
         self.loop = None  # type: asyncio.BaseEventLoop
+        self._membership = Membership(timeout=peer_timeout)
+        self._last_sent = {}  # type: {Connector: float}
+        self._heartbeats = {}  # type: {Connector: asyncio.TimerHandle}
+        self._outbound = None  # type: OutboundScheduler  # Once a key is given a priority class
+        self._release_pending = False  # A release of held changes is scheduled
+        for pattern, cls in (priorities or {}).items():
+            self.assign_priority(pattern, cls)
+
+        # Metrics
+        registry = metrics.REGISTRY
+        self._batch_metric = registry.histogram("netmem_batch_messages", "Messages received together",
+                                                metrics.SIZES, memory=self.name)
+        self._message_changes_metric = registry.histogram("netmem_message_changes", "Changes per received message",
+                                                          metrics.SIZES, memory=self.name)
+        self._apply_metric = registry.histogram("netmem_apply_seconds", "Time to apply one received message",
+                                                memory=self.name)
+        self._coalesced_metric = registry.counter("netmem_coalesced_updates_total",
+                                                  "Received updates skipped for newer ones in the same burst",
+                                                  memory=self.name)
 
     def __repr__(self):
         return "{} {} ({})".format(self.__class__.__name__, self.name, str(self))
@@ -72,10 +118,18 @@ class NetworkMemory(BindableDict):
         self.log.info("{} : Connection made {}".format(repr(self), connector))
         self._connectors.append(connector)
         connector.message_received = self.message_received
+        if self.heartbeat_interval:
+            connector.loop.call_soon_threadsafe(self._heartbeat, connector)
 
     def connection_lost(self, connector: Connector, exc=None):
         self.log.info("{} : Connection lost. Removing {} ({})".format(repr(self), connector, exc))
-        self._connectors.remove(connector)
+        if connector in self._connectors:
+            self._connectors.remove(connector)
+        handle = self._heartbeats.pop(connector, None)
+        if handle is not None:
+            handle.cancel()
+        self._last_sent.pop(connector, None)
+        self._membership.remove_connector(connector)
         self.log.info("{} : Connectors remaining: {}".format(self, len(self._connectors)))
         # connector.close()
 
@@ -84,21 +138,127 @@ class NetworkMemory(BindableDict):
         print("connector_error", connector, exc)
 
     def message_received(self, connector: Connector, msg: dict):
-        self.log.debug("{} : Message received from {}: {}".format(repr(self), connector, msg))
+        if self.log.isEnabledFor(logging.DEBUG):  # repr(self) formats the whole dictionary
+            self.log.debug("{} : Message received from {}: {}".format(repr(self), connector, msg))
+        self._batch_metric.observe(1)
+        if msg.get("changes"):
+            with self:
+                self._apply_message(connector, msg)
+        else:
+            self._apply_message(connector, msg)  # Heartbeat
+
+    def messages_received(self, connector: Connector, msgs: [dict]):
+        """
+        Applies a burst of messages, eg, all the datagrams waiting on a socket,
+        with a single round of notifications.  When several updates in the
+        burst replace the same key, only the newest is applied, unless the
+        key also has patches or other changes in the burst that depend on order.
+        """
+        self.log.debug("{} : {} messages received from {}".format(self.name, len(msgs), connector))
+        newest = {}  # type: {str: (Timestamp, dict)}
+        stale = []  # Updates replaced by newer ones in the same burst
+        ordered = set()  # Keys with patches, merges and such, whose updates must all be applied in order
+        for msg in msgs:
+            if msg.get("node") == self.node_id:
+                continue
+            for change in msg.get("changes") or []:  # type: dict
+                key = change.get("key")
+                if change.get("action") != "update" or crdt.is_state(change.get("new_val")):
+                    ordered.add(key)
+                    continue
+                stamp = Timestamp.parse(change.get("timestamp"))
+                if key not in newest:
+                    newest[key] = (stamp, change)
+                elif stamp > newest[key][0]:
+                    stale.append(newest[key][1])
+                    newest[key] = (stamp, change)
+                else:
+                    stale.append(change)
+        skip = {id(c) for c in stale if c.get("key") not in ordered}
+        self._batch_metric.observe(len(msgs))
+        self._coalesced_metric.value += len(skip)
 
-        name = str(msg.get("name"))
         with self:
-            for change in msg.get("changes", []):  # type: dict
-                timestamp = float(change.get("timestamp", 0))
-                action = str(change.get("action", ""))
-                if action == "update":
-                    if "key" in change:
-                        key = str(change["key"])
-                        timestamp = float(change.get("timestamp", 0))
+            for msg in msgs:
+                changes = msg.get("changes")
+                if skip and changes:
+                    kept = [c for c in changes if id(c) not in skip]
+                    if len(kept) < len(changes):
+                        msg = dict(msg, changes=kept)
+                self._apply_message(connector, msg)
+
+    def _apply_message(self, connector: Connector, msg: dict):
+        name = str(msg.get("name"))
+        node = msg.get("node")
+        if node is not None:
+            if node == self.node_id:
+                return  # Our own message, eg, looped back by multicast
+            self._membership.seen(str(node), name, connector, sent=msg.get("sent"))
+
+        if not msg.get("changes"):
+            return  # Heartbeat
+        start = time.perf_counter()
+        self._message_changes_metric.observe(len(msg["changes"]))
+        for change in msg.get("changes", []):  # type: dict
+            action = str(change.get("action", ""))
+            if action == "update":
+                if "key" in change:
+                    key = str(change["key"])
+                    timestamp = change.get("timestamp")
+                    if "raw_val" in change:
+                        raw = str(change["raw_val"])
+                        value = lazy.LazyValue(raw) if self.lazy else json.loads(raw)
+                    else:
                         value = change.get("new_val")
-                        self.set(key, value, timestamp=timestamp)
+                    if crdt.is_state(value):
+                        # Whole CRDT state, eg, from anti-entropy, merges rather than overwrites
+                        self._merge_received(key, value, timestamp, change)
                     else:
-                        self.log.error("{} : Received an update with no key specified: {}".format(repr(self), change))
+                        self.set(key, value, timestamp=timestamp)
+                else:
+                    self.log.error("{} : Received an update with no key specified: {}".format(repr(self), change))
+            elif action == "merge":
+                if "key" in change and crdt.is_state(change.get("delta")):
+                    self._merge_received(str(change["key"]), change["delta"], change.get("timestamp"), change)
+                else:
+                    self.log.error("{} : Received a malformed merge: {}".format(repr(self), change))
+            elif action == "slice":
+                try:
+                    self.apply_slice(change)
+                except (KeyError, IndexError, TypeError, ValueError) as e:
+                    self.log.error("{} : Could not apply slice {}: {}".format(repr(self), change, e))
+            elif action == "patch":
+                if "key" in change:
+                    key = str(change["key"])
+                    try:
+                        self.patch(key, list(change.get("ops", [])), timestamp=change.get("timestamp"))
+                    except (KeyError, IndexError, TypeError, ValueError) as e:
+                        self.log.error("{} : Could not apply patch {}: {}".format(repr(self), change, e))
+                else:
+                    self.log.error("{} : Received a patch with no key specified: {}".format(repr(self), change))
+        elapsed = time.perf_counter() - start
+        self._apply_metric.observe(elapsed)
+        if self.tracer is not None:
+            self.tracer.applied(self, connector, tracing.trace_ids(msg), elapsed)
+
+    def _merge_received(self, key, delta: dict, timestamp, change: dict):
+        try:
+            self.merge(key, delta, timestamp=timestamp)
+        except TypeError as e:
+            self.log.error("{} : Could not merge {}: {}".format(repr(self), change, e))
+
+    @staticmethod
+    def _raw_change(change: dict) -> dict:
+        """ Sends nested values in updates as JSON text, passing LazyValues along without decoding them. """
+        if change.get("action") != "update" or crdt.is_state(change.get("new_val")):
+            return change
+        raw = lazy.raw_text(change.get("new_val"))
+        if raw is None:
+            return change
+        short = {k: v for k, v in change.items() if k != "new_val"}
+        short["raw_val"] = raw
+        short["old_val"] = None  # Receivers work out old values for themselves
+        return short
 
     # End ConnectorListener methods
     # ########
@@ -107,14 +267,129 @@ class NetworkMemory(BindableDict):
 
         if not self._suspend_notifications:
             changes = self._changes.copy()
-            if len(changes) > 0:
-                data = {"changes": changes, "name": self.name}
-                for connector in self._connectors.copy():  # type: Connector
-                    self.log.info("{} : Notifying connector {}: {}".format(repr(self), connector, data))
-                    connector.send_message(data)
+            if self._outbound is not None:
+                groups, wait = self._outbound.schedule(changes)
+                for group in groups:
+                    self._send_changes(group)
+                self._schedule_release(wait)
+            elif len(changes) > 0:
+                self._send_changes(changes)
 
         super()._notify_listeners()
 
+    def _send_changes(self, changes: [dict]):
+        """ Sends changes to every connector in one message. """
+        now = time.time()
+        if self.lazy:
+            changes = [self._raw_change(c) for c in changes]
+        data = {"changes": changes, "name": self.name, "node": self.node_id, "sent": now}
+        tracer = self.tracer
+        if tracer is not None:
+            ids = tracing.trace_ids(data)
+            tracer.batch(self, ids)
+        for connector in self._connectors.copy():  # type: Connector
+            if self.log.isEnabledFor(logging.INFO):  # repr(self) formats the whole dictionary
+                self.log.info("{} : Notifying connector {}: {}".format(repr(self), connector, data))
+            if tracer is None:
+                connector.send_message(data)
+            else:
+                start = time.perf_counter()
+                connector.send_message(data)
+                tracer.sent(self, connector, ids, time.perf_counter() - start)
+            self._last_sent[connector] = now
+
+    # ########
+    # Priorities
+
+    def assign_priority(self, pattern, cls: PriorityClass):
+        """
+        Sends changes to the key pattern, or to keys matching it if it has
+        wildcards, eg, "telemetry/*", with the priority and rate limit of cls.
+        See netmem.priority.
+        """
+        if self._outbound is None:
+            self._outbound = OutboundScheduler(label=self.name)
+        self._outbound.assign(pattern, cls)
+
+    def flush_outbound(self):
+        """ Sends every change held back by a rate limit now. """
+        if self._outbound is not None:
+            groups, _ = self._outbound.release(everything=True)
+            for group in groups:
+                self._send_changes(group)
+
+    def _schedule_release(self, wait: float):
+        """ Arranges for held changes to be sent after wait seconds, on the first connector's loop. """
+        if wait is None or self._release_pending or not self._connectors:
+            return
+        loop = self._connectors[0].loop
+        if loop is None or loop.is_closed():
+            return
+        self._release_pending = True
+        loop.call_soon_threadsafe(loop.call_later, wait, self._release_outbound)
+
+    def _release_outbound(self):
+        self._release_pending = False
+        groups, wait = self._outbound.release()
+        for group in groups:
+            self._send_changes(group)
+        self._schedule_release(wait)
+
+    def state_message(self, prefix: str = None) -> dict:
+        """
+        Returns a message carrying the whole memory, or only the keys that
+        begin with prefix, as update changes a peer can apply to catch up.
+        Numeric regions that have been written to come along as whole region
+        slices.
+        """
+        keys = dict.keys(self) if prefix is None else self.keys(prefix=prefix)
+        changes = [{"key": key, "action": "update", "old_val": None, "new_val": dict.__getitem__(self, key),
+                    "timestamp": self._timestamps.get(key, ZERO)}
+                   for key in keys]  # Lazy values are sent as they are, without decoding
+        changes += [self.region_state(key) for key in list(self._regions)
+                    if key in self._region_marks and (prefix is None or str(key).startswith(prefix))]
+        return {"changes": changes, "name": self.name, "node": self.node_id, "sent": time.time()}
+
+    def peers(self) -> {str: Peer}:
+        """
+        Returns the peers heard from within the peer timeout, keyed by their node_id.
+        Each Peer reports its name, the connector it was heard on, when it was last
+        heard from (last_seen), and how old its last message was on arrival (lag).
+        Peers only time out while heartbeats are on, eg, NetworkMemory(heartbeat_interval=1.0);
+        otherwise they are listed until the connector they were heard on is lost.
+        """
+        return self._membership.peers()
+
+    def _heartbeat(self, connector: Connector):
+        """
+        Runs periodically on each connector's loop.  Sends a heartbeat if no
+        changes have gone out on the connector recently, and evicts peers
+        that have stopped talking.
+        """
+        if connector not in self._connectors:
+            return
+        now = time.time()
+        if now - self._last_sent.get(connector, 0) >= self.heartbeat_interval:
+            connector.send_message({"name": self.name, "node": self.node_id, "sent": now})
+            self._last_sent[connector] = now
+
+        for peer in self._membership.evict_expired():  # type: Peer
+            self.log.info("{} : Peer {} timed out".format(repr(self), peer))
+            peer.connector.peer_lost(peer.node)
+
+        self._heartbeats[connector] = connector.loop.call_later(self.heartbeat_interval, self._heartbeat, connector)
+
     def close_all(self):
+        self.flush_outbound()
         for connector in self._connectors.copy():  # type: Connector
             connector.close()
+            connector.metrics.unregister()
+        self.unregister_metrics()
+
+    def unregister_metrics(self):
+        """ Stops reporting this memory's metrics, as close_all() does. """
+        super().unregister_metrics()
+        metrics.REGISTRY.unregister(self._batch_metric, self._message_changes_metric, self._apply_metric,
+                                    self._coalesced_metric)
+        if self._outbound is not None:
+            self._outbound.unregister_metrics()
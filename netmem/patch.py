@@ -0,0 +1,93 @@
+"""
+Path-addressed edits to values nested inside a NetworkMemory.
+
+A patch is a list of operations, each a small dictionary that travels as-is
+in a "patch" change instead of the whole value:
+
+    {"op": "set", "path": ["robots", 3, "pose"], "value": ...}
+    {"op": "insert", "path": ["log", 10], "value": ...}   # "-" as the last step appends
+    {"op": "remove", "path": ["robots", 3]}
+
+Each step in a path is a dictionary key or a list index, starting from the
+value stored under the NetworkMemory key.
+"""
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+SET = "set"
+INSERT = "insert"
+REMOVE = "remove"
+APPEND = "-"
+
+
+def make_op(op: str, path, value=None) -> dict:
+    """ Builds one patch operation. """
+    if op not in (SET, INSERT, REMOVE):
+        raise ValueError("Unknown patch operation: {}".format(op))
+    if isinstance(path, (str, int)):
+        path = [path]
+    path = list(path)
+    if not path:
+        raise ValueError("Patch path must not be empty")
+    if op == REMOVE:
+        return {"op": op, "path": path}
+    return {"op": op, "path": path, "value": value}
+
+
+def copy_path(root, path):
+    """
+    Returns a copy of root that shares everything with it except the
+    containers along path, so an operation at path can be applied to the
+    copy without changing root.
+    """
+    top = _shallow_copy(root)
+    container = top
+    for step in list(path)[:-1]:
+        child = _shallow_copy(container[step])
+        container[step] = child
+        container = child
+    return top
+
+
+def _shallow_copy(value):
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+def apply_op(root, op: dict):
+    """
+    Applies one operation in place to root.
+
+    :raises ValueError: if the operation is malformed
+    :raises KeyError, IndexError, TypeError: if the path does not fit the value
+    """
+    path = op.get("path")
+    if not path:
+        raise ValueError("Patch path must not be empty: {}".format(op))
+
+    container = root
+    for step in path[:-1]:
+        container = container[step]
+    last = path[-1]
+
+    kind = op.get("op")
+    if kind == SET:
+        container[last] = op["value"]
+    elif kind == INSERT:
+        if isinstance(container, list):
+            if last == APPEND:
+                container.append(op["value"])
+            else:
+                container.insert(int(last), op["value"])
+        else:
+            container[last] = op["value"]
+    elif kind == REMOVE:
+        del container[last]
+    else:
+        raise ValueError("Unknown patch operation: {}".format(op))
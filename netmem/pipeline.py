@@ -0,0 +1,145 @@
+"""
+Decoding of incoming payloads on a pool of worker processes.
+
+A connector normally decodes every payload on its loop's thread, so one
+core bounds how fast a node can take in traffic.  A connector given a
+DecodePipeline instead feeds it the raw payloads as they arrive.  Large
+payloads, and batches of many small ones, are decoded in worker processes
+while the loop goes on receiving; small, scattered payloads are decoded
+right away, since sending them to a worker would cost more than it saves.
+Either way the decoded messages come back on the loop in the order their
+payloads arrived.
+
+    mem.connect(UdpConnector(..., decoder=DecodePipeline(workers=4)))
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import marshal
+
+from .codec import MessageCodec
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+_worker_codecs = {}  # type: {bytes: MessageCodec}  # One codec per dictionary in each worker process
+
+
+def _decode_all(codec: MessageCodec, payloads) -> [(dict, str)]:
+    """ Returns (message, None) or (None, error) for each payload. """
+    results = []
+    for data in payloads:
+        try:
+            results.append((codec.decode(data), None))
+        except ValueError as e:
+            results.append((None, str(e)))
+    return results
+
+
+def _decode_in_worker(dictionary: bytes, payloads) -> bytes:
+    """
+    Decodes in a worker process.  Results go back marshaled, which the
+    parent loads several times faster than it could parse the JSON itself
+    or unpickle the decoded objects.
+    """
+    codec = _worker_codecs.get(dictionary)
+    if codec is None:
+        codec = _worker_codecs[dictionary] = MessageCodec(dictionary=dictionary)
+    return marshal.dumps(_decode_all(codec, payloads))
+
+
+class DecodePipeline(object):
+    def __init__(self, workers: int = None, executor: concurrent.futures.Executor = None,
+                 min_bytes: int = 16384, min_batch: int = 32, max_batch: int = 256):
+        """
+        :param workers: number of worker processes, by default one per core
+        :param executor: an executor to use instead, eg, one shared by several connectors
+        :param min_bytes: payloads fed together totaling at least this many bytes go to a worker
+        :param min_batch: so do at least this many payloads fed together
+        :param max_batch: most payloads to send to one worker at a time
+        """
+        self.log = logging.getLogger(__name__ + '.' + self.__class__.__name__)
+        self.workers = workers
+        self.min_bytes = min_bytes
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self._executor = executor
+        self._own_executor = executor is None
+        self._codec = None  # type: MessageCodec
+        self._deliver = None
+        self.loop = None  # type: asyncio.BaseEventLoop
+        self._pending = collections.deque()  # (future, tag) in arrival order
+
+        self.inline_payloads = 0
+        self.worker_payloads = 0
+
+    def __repr__(self):
+        return "{}(workers={})".format(self.__class__.__name__, self.workers)
+
+    def start(self, loop: asyncio.BaseEventLoop, codec: MessageCodec, deliver):
+        """
+        Called by the connector when it connects.  deliver is called on the
+        loop with each batch of decoded messages and the tag they were fed with:
+
+            def deliver(tag, msgs):
+                ...
+        """
+        self.loop = loop
+        self._codec = codec
+        self._deliver = deliver
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+
+    def feed(self, payloads: [bytes], tag=None):
+        """ Takes payloads that arrived together, in order.  Must be called on the loop. """
+        if not payloads:
+            return
+        if len(payloads) < self.min_batch and sum(len(p) for p in payloads) < self.min_bytes:
+            self.inline_payloads += len(payloads)
+            results = _decode_all(self._codec, payloads)
+            if not self._pending:
+                self._deliver_results(tag, results)
+                return
+            fut = self.loop.create_future()
+            fut.set_result(results)
+            self._pending.append((fut, tag))
+            return
+
+        self.worker_payloads += len(payloads)
+        for i in range(0, len(payloads), self.max_batch):
+            batch = [bytes(p) for p in payloads[i:i + self.max_batch]]
+            cfut = self._executor.submit(_decode_in_worker, self._codec.dictionary, batch)
+            fut = asyncio.wrap_future(cfut, loop=self.loop)
+            fut.add_done_callback(lambda _: self._flush())
+            self._pending.append((fut, tag))
+
+    def close(self):
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _flush(self):
+        while self._pending and self._pending[0][0].done():
+            fut, tag = self._pending.popleft()
+            if fut.cancelled():
+                continue
+            exc = fut.exception()
+            if exc is not None:
+                self.log.error("{} : Worker failed to decode a batch: {}".format(self, exc))
+                continue
+            results = fut.result()
+            self._deliver_results(tag, marshal.loads(results) if isinstance(results, bytes) else results)
+
+    def _deliver_results(self, tag, results: [(dict, str)]):
+        msgs = []
+        for msg, error in results:
+            if error is None:
+                msgs.append(msg)
+            else:
+                self.log.error("{} : Dropping unreadable payload: {}".format(self, error))
+        if msgs:
+            self._deliver(tag, msgs)
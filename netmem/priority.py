@@ -0,0 +1,209 @@
+"""
+Priority classes and rate limits for the changes a NetworkMemory sends.
+
+Every change normally goes out the moment it is made, in the order it was
+made, so a key that changes hundreds of times a second can crowd an e-stop
+flag off a slow link.  Assigning keys, or patterns of keys, to priority
+classes changes that:
+
+    control = PriorityClass("control", priority=10)
+    telemetry = PriorityClass("telemetry", priority=-10, rate=20, burst=40)
+
+    mem = NetworkMemory(priorities={"estop": control, "curr_player_num": control,
+                                    "telemetry/*": telemetry})
+    mem.assign_priority("robot/*/pose", telemetry)
+
+Changes made together, eg, in a "with" block, go out as one message per
+priority, most urgent first.  A class with a rate may send that many
+changes per second, and up to burst at once, taken from a token bucket.
+Past that its changes are held, and only the latest change to each held
+key is kept, so a busy key costs one change per release, not one per set.
+Held changes go out, still most urgent first, as the bucket refills, on
+the event loop of the memory's first connector, and ahead of anything
+sent after them.
+
+Patterns use fnmatch syntax and are tried in the order assigned, after
+exact keys.  Keys that match nothing are in DEFAULT, which has no limit.
+The scheduling is all in the NetworkMemory, so it works with any connector.
+"""
+
+import collections
+import fnmatch
+import threading
+import time
+
+from . import metrics
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+class PriorityClass(object):
+    def __init__(self, name: str, priority: int = 0, rate: float = None, burst: float = None):
+        """
+        :param priority: classes with higher priorities are sent first
+        :param rate: changes per second the class may send, or None for no limit
+        :param burst: most changes the class may send at once, by default one second's worth
+        """
+        self.name = name
+        self.priority = priority
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate or 0)
+
+    def __repr__(self):
+        return "{}({}, priority={}, rate={}, burst={})".format(
+            self.__class__.__name__, self.name, self.priority, self.rate, self.burst)
+
+
+DEFAULT = PriorityClass("default")
+
+
+class TokenBucket(object):
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def __repr__(self):
+        return "{}({:.1f} of {} tokens)".format(self.__class__.__name__, self.tokens, self.burst)
+
+    def refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def take(self, now: float) -> bool:
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait(self) -> float:
+        """ Seconds until the next token, as of the last refill. """
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class OutboundScheduler(object):
+    """ Sorts a NetworkMemory's outgoing changes by priority and holds those over their class's rate. """
+    CACHE_SIZE = 4096  # Most keys whose class is remembered, least recently sent dropped first
+
+    def __init__(self, label: str = "", clock=time.monotonic):
+        self.clock = clock
+        self._label = label
+        self._exact = {}  # type: {object: PriorityClass}
+        self._patterns = []  # type: [(str, PriorityClass)]
+        self._classes = collections.OrderedDict()  # type: {object: PriorityClass}  # Cached lookups
+        self._buckets = {}  # type: {PriorityClass: TokenBucket}
+        self._held = {}  # type: {PriorityClass: {object: [dict]}}  # Held changes by class, then key
+        self._lock = threading.Lock()
+        self._held_metrics = {}
+        self._coalesced_metrics = {}
+
+    def __repr__(self):
+        return "{}({} held)".format(self.__class__.__name__, self.held())
+
+    def unregister_metrics(self):
+        with self._lock:
+            metrics.REGISTRY.unregister(*self._held_metrics.values(), *self._coalesced_metrics.values())
+
+    def assign(self, pattern, cls: PriorityClass):
+        """ Puts keys equal to pattern, or matching it if it is a string with wildcards, in cls. """
+        with self._lock:
+            if isinstance(pattern, str) and any(c in pattern for c in "*?["):
+                self._patterns.append((pattern, cls))
+            else:
+                self._exact[pattern] = cls
+            self._classes.clear()
+            if cls.rate is not None and cls not in self._buckets:
+                self._buckets[cls] = TokenBucket(cls.rate, cls.burst, self.clock())
+                registry = metrics.REGISTRY
+                self._held_metrics[cls] = registry.counter(
+                    "netmem_outbound_held_total", "Changes held back by a rate limit",
+                    memory=self._label, priority=cls.name)
+                self._coalesced_metrics[cls] = registry.counter(
+                    "netmem_outbound_coalesced_total", "Held changes replaced by newer ones before being sent",
+                    memory=self._label, priority=cls.name)
+
+    def class_of(self, key) -> PriorityClass:
+        cls = self._classes.get(key)
+        if cls is not None:
+            self._classes.move_to_end(key)
+            return cls
+        cls = self._exact.get(key)
+        if cls is None:
+            text = str(key)
+            cls = next((c for p, c in self._patterns if fnmatch.fnmatchcase(text, p)), DEFAULT)
+        self._classes[key] = cls
+        if len(self._classes) > self.CACHE_SIZE:
+            self._classes.popitem(last=False)
+        return cls
+
+    def held(self) -> int:
+        """ Returns how many keys have changes held back. """
+        return sum(len(keys) for keys in self._held.values())
+
+    def schedule(self, changes: [dict]) -> ([[dict]], float):
+        """
+        Takes new changes and returns (groups of changes to send now, most
+        urgent first, and seconds until held changes may go, or None if none
+        are held).  Held changes that may go now are included, ahead of the
+        new changes of their class.
+        """
+        with self._lock:
+            now = self.clock()
+            ready = self._release(now)
+            for change in changes:
+                cls = self.class_of(change.get("key"))
+                bucket = self._buckets.get(cls)
+                if bucket is None:
+                    ready.setdefault(cls.priority, []).append(change)
+                    continue
+                keys = self._held.get(cls)
+                if not keys and bucket.take(now):
+                    ready.setdefault(cls.priority, []).append(change)
+                    continue
+                self._hold(cls, change)
+            return self._groups(ready), self._wait()
+
+    def release(self, everything: bool = False) -> ([[dict]], float):
+        """ Returns (groups of held changes that may go now, seconds until more may go) as for schedule(). """
+        with self._lock:
+            return self._groups(self._release(self.clock(), everything)), self._wait()
+
+    def _hold(self, cls: PriorityClass, change: dict):
+        keys = self._held.setdefault(cls, {})
+        key = change.get("key")
+        pending = keys.get(key)
+        if pending is None:
+            keys[key] = [change]
+        elif change.get("action") == "update":
+            self._coalesced_metrics[cls].value += len(pending)
+            pending[:] = [change]  # Replaces everything held for the key before it
+        else:
+            pending.append(change)  # Patches, merges and such depend on what came before
+        self._held_metrics[cls].value += 1
+
+    def _release(self, now: float, everything: bool = False) -> {int: [dict]}:
+        ready = {}
+        for cls, keys in list(self._held.items()):
+            bucket = self._buckets[cls]
+            for key in list(keys):
+                if not everything and not bucket.take(now):
+                    break
+                ready.setdefault(cls.priority, []).extend(keys.pop(key))
+            if not keys:
+                del self._held[cls]
+        return ready
+
+    def _wait(self):
+        if not self._held:
+            return None
+        return min(self._buckets[cls].wait() for cls in self._held)
+
+    @staticmethod
+    def _groups(ready: {int: [dict]}) -> [[dict]]:
+        return [ready[p] for p in sorted(ready, reverse=True)]
@@ -0,0 +1,132 @@
+"""
+Typed numeric arrays that live next to a NetworkMemory's dictionary.
+
+A region is one contiguous buffer of fixed-size numbers, so thousands of
+readings cost one entry rather than thousands of dictionary keys.  Writes
+go to peers as "slice" changes that carry the raw bytes of just the
+elements written, base64 encoded inside the JSON message:
+
+    {"key": "lidar", "action": "slice", "dtype": "f4", "length": 4096,
+     "start": 128, "count": 16, "data": "...", "timestamp": ...}
+
+Element bytes travel little-endian.  Peers that join late catch up from
+slices of whole regions marked "state": true, which state_message() and
+gossip anti-entropy send along with the dictionary's keys.  Listeners receive the written range
+as a memoryview slice of the buffer, and when NumPy is installed
+region.numpy() returns an array that shares the same buffer.
+"""
+
+import array
+import base64
+import sys
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+# Maps NumPy style type strings to struct/memoryview format characters
+DTYPES = {"i1": "b", "u1": "B", "i2": "h", "u2": "H", "i4": "i", "u4": "I",
+          "i8": "q", "u8": "Q", "f4": "f", "f8": "d"}
+
+
+class NumericRegion(object):
+    def __init__(self, bdict, key, dtype: str, length: int):
+        if dtype not in DTYPES:
+            raise ValueError("Unsupported dtype {!r}; expected one of {}".format(dtype, sorted(DTYPES)))
+        self.bdict = bdict
+        self.key = key
+        self.dtype = dtype
+        self.format = DTYPES[dtype]
+        self._buffer = bytearray(length * array.array(self.format).itemsize)
+        self.view = memoryview(self._buffer).cast(self.format)
+        self._listeners = []
+
+    def __repr__(self):
+        return "{}({!r}, {!r}, {})".format(self.__class__.__name__, self.key, self.dtype, len(self))
+
+    def __len__(self):
+        return len(self.view)
+
+    def __getitem__(self, index):
+        """ Returns one element, or a memoryview for a slice. """
+        return self.view[index]
+
+    def __setitem__(self, index, values):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("Only contiguous slices can be assigned")
+            if len(values) != stop - start:
+                raise ValueError("Slice of {} elements cannot be assigned {} values".format(stop - start, len(values)))
+            self.write(start, values)
+        else:
+            if index < 0:
+                index += len(self)
+            self.write(index, [values])
+
+    def write(self, start: int, values):
+        """ Copies values (a sequence, array or buffer of the region's type) in at start and notifies peers. """
+        stop = start + len(values)
+        try:
+            self.view[start:stop] = values
+        except (TypeError, ValueError, NotImplementedError):
+            self.view[start:stop] = array.array(self.format, values)
+        self.bdict._region_written(self, start, stop)
+
+    def mark_changed(self, start: int = 0, stop: int = None):
+        """ Sends a range to peers after it was changed directly, eg, through numpy(). """
+        self.bdict._region_written(self, start, len(self) if stop is None else stop)
+
+    def numpy(self):
+        """ Returns a NumPy array sharing this region's buffer.  Call mark_changed() after writing to it. """
+        import numpy
+        return numpy.frombuffer(self._buffer, dtype=self.dtype)
+
+    def add_listener(self, listener):
+        """
+        Registers a listener to be notified when a range of the region changes.
+        The listener will be called with four arguments:
+
+            def region_changed(region, start, stop, view):
+                ...
+
+        where view is a memoryview of elements start through stop - 1.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def encode(self, start: int, stop: int) -> str:
+        """ Returns elements start through stop - 1 as base64 little-endian bytes. """
+        data = self.view[start:stop].tobytes()
+        if sys.byteorder == "big" and self.view.itemsize > 1:
+            swapped = array.array(self.format)
+            swapped.frombytes(data)
+            swapped.byteswap()
+            data = swapped.tobytes()
+        return base64.b64encode(data).decode()
+
+    def decode_into(self, start: int, data: str, count: int = None) -> int:
+        """
+        Copies base64 little-endian bytes in at start and returns the stop index.
+        Nothing is written unless all of the data fits, and is count elements long if given.
+        """
+        raw = base64.b64decode(data)
+        values = array.array(self.format)
+        values.frombytes(raw)
+        if count is not None and len(values) != count:
+            raise ValueError("Slice carries {} elements rather than {}".format(len(values), count))
+        stop = start + len(values)
+        if start < 0 or stop > len(self):
+            raise IndexError("Slice {}:{} is outside region of length {}".format(start, stop, len(self)))
+        if sys.byteorder == "big" and self.view.itemsize > 1:
+            values.byteswap()
+        self.view[start:stop] = values
+        return stop
+
+    def _notify(self, start: int, stop: int):
+        for listener in self._listeners.copy():
+            listener(self, start, stop, self.view[start:stop])
@@ -0,0 +1,105 @@
+"""
+Connectors by name, imported only when first asked for.
+
+Importing netmem does not import any connector module, so a tool that only
+uses UdpConnector never loads aiohttp for the websocket connectors.  Asking
+for a connector, as netmem.UdpConnector or connector_class("UdpConnector"),
+imports its module then.
+
+Other packages add their own connectors by name, without being imported
+until used, by declaring an entry point in the "netmem.connectors" group:
+
+    setup(..., entry_points={"netmem.connectors": ["MqttConnector = netmem_mqtt:MqttConnector"]})
+
+or, from code that runs anyway, by registering one:
+
+    netmem.register_connector("MqttConnector", "netmem_mqtt:MqttConnector")
+
+Either way netmem.MqttConnector then works like the built in connectors,
+as long as the name ends in "Connector"; other names are only reachable
+through connector_class(), so that looking up an unrelated attribute of
+netmem never reads the entry points.
+"""
+
+import importlib
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+ENTRY_POINT_GROUP = "netmem.connectors"
+
+_targets = {
+    "UdpConnector": "netmem.udp_connector:UdpConnector",
+    "WsServerConnector": "netmem.websocket_connector:WsServerConnector",
+    "WsClientConnector": "netmem.websocket_connector:WsClientConnector",
+    "LoggingConnector": "netmem.logging_connector:LoggingConnector",
+    "SharedMemoryConnector": "netmem.shm_connector:SharedMemoryConnector",
+    "StreamConnector": "netmem.stream_connector:StreamConnector",
+    "StreamServerConnector": "netmem.stream_connector:StreamServerConnector",
+    "StreamClientConnector": "netmem.stream_connector:StreamClientConnector",
+    "GossipConnector": "netmem.gossip_connector:GossipConnector",
+    "CaptureConnector": "netmem.capture_connector:CaptureConnector",
+    "LoopbackConnector": "netmem.loopback_connector:LoopbackConnector",
+}  # type: {str: str}  # maps names to "module:attribute"
+_loaded = {}  # type: {str: type}
+_missing = set()  # type: {str}  # Names asked for and not found, until something is registered
+_entry_points_read = False
+
+
+def register_connector(name: str, target):
+    """
+    Makes a connector available by name.
+
+    :param target: the connector class, or "module:attribute" to import when first asked for
+    """
+    _missing.clear()
+    if isinstance(target, str):
+        if ":" not in target:
+            raise ValueError("Expected 'module:attribute', got {}".format(target))
+        _targets[name] = target
+        _loaded.pop(name, None)
+    else:
+        _targets[name] = "{}:{}".format(target.__module__, target.__qualname__)
+        _loaded[name] = target
+
+
+def connector_names() -> [str]:
+    """ Returns the names of every known connector, built in, registered or declared by entry point. """
+    _read_entry_points()
+    return sorted(_targets)
+
+
+def connector_class(name: str) -> type:
+    """ Returns the connector class registered under name, importing it if need be. """
+    cls = _loaded.get(name)
+    if cls is not None:
+        return cls
+    if name not in _targets and name not in _missing:
+        _read_entry_points()
+    if name not in _targets:
+        _missing.add(name)
+        raise KeyError("No connector named {}".format(name))
+    module_name, _, attribute = _targets[name].partition(":")
+    cls = importlib.import_module(module_name)
+    for part in attribute.split("."):
+        cls = getattr(cls, part)
+    _loaded[name] = cls
+    return cls
+
+
+def _read_entry_points():
+    """ Adds connectors other packages declare, the first time a name is not found. """
+    global _entry_points_read
+    if _entry_points_read:
+        return
+    _entry_points_read = True
+    try:
+        from importlib import metadata
+    except ImportError:
+        return  # Before Python 3.8
+    eps = metadata.entry_points()
+    group = eps.select(group=ENTRY_POINT_GROUP) if hasattr(eps, "select") else eps.get(ENTRY_POINT_GROUP, [])
+    for ep in group:
+        _targets.setdefault(ep.name, ep.value)
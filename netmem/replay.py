@@ -0,0 +1,79 @@
+"""
+Feeds a capture file made by CaptureConnector back into a NetworkMemory.
+
+Messages are applied in the order they were captured, with their original
+timestamps, so replaying a capture into an empty NetworkMemory always
+leaves it in the same state.  Replay can keep the original pacing, run
+faster by some factor, or go as fast as the memory can apply changes:
+
+    mem = NetworkMemory()
+    stats = replay("traffic.nmcap", mem, speed=10)
+
+Listeners, connectors and tracers on the memory see the replayed changes
+as they would live traffic, which makes a capture a workload to benchmark
+and profile against.  From the command line:
+
+    python3 -m netmem.replay traffic.nmcap --speed 0
+"""
+
+import argparse
+import json
+import logging
+import time
+
+from .capture_connector import read_capture
+from .codec import MessageCodec
+from .connector import Connector
+from .network_memory import NetworkMemory
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+def replay(filename: str, memory, speed: float = 1.0, codec: MessageCodec = None,
+           connector: Connector = None) -> dict:
+    """
+    Applies every message in a capture to memory on the calling thread.
+
+    :param speed: 1 for the original pacing, 10 for ten times as fast, 0 for no waiting at all
+    :param codec: decodes the capture; needs the dictionary the capture was made with
+    :param connector: reported to the memory as where the messages came from
+    :return: counts of messages and changes applied and the seconds it took
+    """
+    connector = connector or Connector()
+    messages = changes = 0
+    first = None
+    start = time.perf_counter()
+    for sent, msg in read_capture(filename, codec):
+        if first is None:
+            first = sent
+        if speed:
+            delay = (sent - first) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        memory.message_received(connector, msg)
+        messages += 1
+        changes += len(msg.get("changes") or [])
+    elapsed = time.perf_counter() - start
+    return {"messages": messages, "changes": changes, "seconds": elapsed,
+            "changes_per_sec": changes / elapsed if elapsed else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="capture file written by CaptureConnector")
+    parser.add_argument("--speed", type=float, default=0, help="1 for original pacing, 0 for as fast as possible")
+    parser.add_argument("--lazy", action="store_true", help="replay into a NetworkMemory with lazy=True")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    memory = NetworkMemory(lazy=args.lazy)
+    stats = replay(args.capture, memory, speed=args.speed)
+    stats["keys"] = len(memory)
+    print(json.dumps(stats, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
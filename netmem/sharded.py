@@ -0,0 +1,348 @@
+"""
+A NetworkMemory spread over several worker processes, to use more than one core.
+
+A NetworkMemory applies changes, calls listeners and encodes messages on one
+thread, so one process tops out at about one core.  ShardedNetworkMemory
+instead divides the keys among worker processes by a hash of each key.
+Every worker runs its own NetworkMemory with its own connectors on its own
+event loop, and the ShardedNetworkMemory in the parent process sends each
+operation to the worker that owns the key:
+
+    def connectors(shard):
+        return [UdpConnector(local_addr=("0.0.0.0", 9990 + shard), remote_addr=("10.0.0.2", 9990 + shard))]
+
+    if __name__ == "__main__":
+        mem = ShardedNetworkMemory(shards=4, connectors=connectors)
+        with mem:  # Sets inside go to each worker in one message
+            for i in range(100000):
+                mem["sensor/{}".format(i)] = i
+        mem.add_listener(lambda mem, key, old_val, new_val: print(key, new_val))
+
+Setting from the parent costs little more than sending the key and value
+down a pipe, and inside a "with" block one message per worker carries all
+the sets, so the work of applying, notifying and encoding is what spreads
+across cores.  Reads wait for a reply from the worker.
+
+The connectors function runs in each worker and must be importable, eg,
+a module level function, since workers may be started fresh rather than
+forked.  Each worker drops changes it receives for keys it does not own,
+so give each shard connectors of its own, as above, to spread incoming
+traffic across the workers as well.
+
+Listeners run on a thread in the parent and are given the
+ShardedNetworkMemory as the changed dictionary, which they may read.
+"""
+
+import collections.abc
+import logging
+import multiprocessing
+import multiprocessing.connection
+import queue
+import threading
+import zlib
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+MAX_BATCH = 1000  # Sets held in a "with" block before they are sent anyway
+
+
+def shard_of(key, shards: int) -> int:
+    """ The shard that owns key.  Stable across processes, unlike hash(). """
+    return zlib.crc32(str(key).encode()) % shards
+
+
+def _shard_main(index: int, shards: int, name: str, commands, events, connectors, memory_kwargs: dict):
+    """ Runs one shard's NetworkMemory in a worker process until told to close. """
+    import asyncio
+    from .network_memory import NetworkMemory
+
+    class ShardMemory(NetworkMemory):
+        def _apply_message(self, connector, msg: dict):
+            changes = msg.get("changes")
+            if changes:
+                kept = [c for c in changes if "key" not in c or shard_of(c["key"], shards) == index]
+                if len(kept) < len(changes):
+                    msg = dict(msg, changes=kept)
+            super()._apply_message(connector, msg)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    memory = ShardMemory(name="{}-shard{}".format(name, index), **memory_kwargs)
+    for connector in (connectors(index) if connectors else []):
+        memory.connect(connector, loop=loop)
+
+    watched = set()  # Keys the parent listens to
+    watch_all = [False]
+    pending = []  # Changes waiting to go to the parent
+    outbox = queue.Queue()  # Batches for the pump thread, so a full pipe never stalls replies to commands
+
+    def _pump():
+        for batch in iter(outbox.get, None):
+            try:
+                events.send(batch)
+            except (BrokenPipeError, OSError):
+                return
+
+    def _send_events():
+        outbox.put(pending.copy())
+        pending.clear()
+
+    def _listener(_mem, key, old_val, new_val):
+        if watch_all[0] or key in watched:
+            if not pending:
+                loop.call_soon(_send_events)
+            pending.append((key, old_val, new_val))
+
+    def _command():
+        while commands.poll():
+            try:
+                op, *args = commands.recv()
+            except EOFError:
+                op, args = "close", []
+            try:
+                if op == "set":
+                    memory[args[0]] = args[1]
+                elif op == "update":
+                    with memory:
+                        for key, value in args[0]:
+                            memory[key] = value
+                elif op == "delete":
+                    found = args[0] in memory
+                    if found:
+                        del memory[args[0]]
+                    commands.send((True, found))
+                elif op == "getitem":
+                    commands.send((True, (True, memory[args[0]]) if args[0] in memory else (False, None)))
+                elif op == "get":
+                    commands.send((True, memory.get(args[0], args[1])))
+                elif op == "contains":
+                    commands.send((True, args[0] in memory))
+                elif op == "keys":
+                    commands.send((True, list(memory.keys())))
+                elif op == "len":
+                    commands.send((True, len(memory)))
+                elif op == "items":
+                    commands.send((True, dict(memory.snapshot().items())))
+                elif op == "watch":
+                    if args[0] is None:
+                        watch_all[0] = True
+                    else:
+                        watched.add(args[0])
+                elif op == "unwatch":
+                    watch_all[0] = False
+                    watched.clear()
+                elif op == "close":
+                    loop.remove_reader(commands.fileno())
+                    memory.close_all()
+                    loop.call_later(0.1, loop.stop)
+                    return
+            except Exception as e:
+                memory.log.error("{} : Could not {} {}: {}".format(memory.name, op, args, e))
+                if op in ("delete", "getitem", "get", "contains", "keys", "len", "items"):
+                    commands.send((False, "{}: {}".format(e.__class__.__name__, e)))
+
+    pump = threading.Thread(target=_pump, name="{}-events".format(memory.name), daemon=True)
+    pump.start()
+    memory.add_listener(_listener)
+    loop.add_reader(commands.fileno(), _command)
+    try:
+        loop.run_forever()
+    finally:
+        loop.close()
+        outbox.put(None)
+        pump.join(1.0)
+
+
+class ShardedNetworkMemory(collections.abc.MutableMapping):
+    def __init__(self, shards: int = None, connectors=None, name: str = "ShardedNetworkMemory",
+                 context: multiprocessing.context.BaseContext = None, **memory_kwargs):
+        """
+        :param shards: number of worker processes, by default one per core
+        :param connectors: function given a shard number, run in that shard's worker, returning its connectors
+        :param name: each shard's NetworkMemory is named "<name>-shard<number>"
+        :param context: multiprocessing context to start workers with, eg, multiprocessing.get_context("spawn")
+        :param memory_kwargs: passed to each shard's NetworkMemory, eg, lazy=True
+        """
+        self.log = logging.getLogger(__name__ + '.' + self.__class__.__name__)
+        self.name = name
+        self.shards = shards or multiprocessing.cpu_count()
+        context = context or multiprocessing.get_context()
+        self._commands = []  # type: [multiprocessing.connection.Connection]
+        self._events = []  # type: [multiprocessing.connection.Connection]
+        self._locks = [threading.Lock() for _ in range(self.shards)]
+        self._processes = []
+        for index in range(self.shards):
+            commands, worker_commands = context.Pipe()
+            events, worker_events = context.Pipe(duplex=False)
+            process = context.Process(target=_shard_main, name="{}-shard{}".format(name, index), daemon=True,
+                                      args=(index, self.shards, name, worker_commands, worker_events,
+                                            connectors, memory_kwargs))
+            process.start()
+            worker_commands.close()
+            worker_events.close()
+            self._commands.append(commands)
+            self._events.append(events)
+            self._processes.append(process)
+
+        self._batch = None  # type: [[(str, object)]]  # Sets per shard held while in a "with" block
+        self._listeners = []  # type: [(callable, str)]
+        self._event_thread = None  # type: threading.Thread
+        self._closed = False
+
+    def __repr__(self):
+        return "{}({}, {} shards)".format(self.__class__.__name__, self.name, self.shards)
+
+    def shard_of(self, key) -> int:
+        return shard_of(key, self.shards)
+
+    def _send(self, shard: int, *command):
+        with self._locks[shard]:
+            self._commands[shard].send(command)
+
+    def _request(self, shard: int, *command):
+        self._flush(shard)  # So reads see sets still held in a "with" block
+        with self._locks[shard]:
+            self._commands[shard].send(command)
+            ok, result = self._commands[shard].recv()
+        if not ok:
+            raise RuntimeError("Shard {} failed: {}".format(shard, result))
+        return result
+
+    # ########
+    # Dictionary methods
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def set(self, key, value):
+        shard = self.shard_of(key)
+        if self._batch is None:
+            self._send(shard, "set", key, value)
+        else:
+            self._batch[shard].append((key, value))
+            if len(self._batch[shard]) >= MAX_BATCH:
+                self._flush(shard)
+
+    def __getitem__(self, key):
+        found, value = self._request(self.shard_of(key), "getitem", key)
+        if not found:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        return self._request(self.shard_of(key), "get", key, default)
+
+    def __contains__(self, key):
+        return self._request(self.shard_of(key), "contains", key)
+
+    def __delitem__(self, key):
+        if not self._request(self.shard_of(key), "delete", key):
+            raise KeyError(key)
+
+    def __iter__(self):
+        for shard in range(self.shards):
+            yield from self._request(shard, "keys")
+
+    def __len__(self):
+        return sum(self._request(shard, "len") for shard in range(self.shards))
+
+    def snapshot(self) -> dict:
+        """ Returns a copy of every shard's contents, each shard's as of one moment. """
+        merged = {}
+        for shard in range(self.shards):
+            merged.update(self._request(shard, "items"))
+        return merged
+
+    def __enter__(self):
+        """ Holds sets and sends them to each worker together on exit. """
+        if self._batch is None:
+            self._batch = [[] for _ in range(self.shards)]
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+        self._batch = None
+
+    def flush(self):
+        """ Sends any sets held in a "with" block now. """
+        for shard in range(self.shards):
+            self._flush(shard)
+
+    def _flush(self, shard: int):
+        if self._batch is not None and self._batch[shard]:
+            batch, self._batch[shard] = self._batch[shard], []
+            self._send(shard, "update", batch)
+
+    def sync(self):
+        """ Waits until every worker has applied everything sent to it so far. """
+        for shard in range(self.shards):
+            self._request(shard, "len")
+
+    # ########
+    # Listeners
+
+    def add_listener(self, listener, key=None):
+        """
+        Adds a listener called thus, on a thread of its own, when a key changes:
+
+            def memory_changed(sharded_memory, key, old_val, new_val):
+                ...
+
+        :param key: only call the listener for this key, and only listen to the shard that owns it
+        """
+        self._listeners.append((listener, key))
+        if key is None:
+            for shard in range(self.shards):
+                self._send(shard, "watch", None)
+        else:
+            self._send(self.shard_of(key), "watch", key)
+        if self._event_thread is None:
+            self._event_thread = threading.Thread(target=self._read_events, name="{}-events".format(self.name),
+                                                  daemon=True)
+            self._event_thread.start()
+
+    def remove_listener(self, listener):
+        self._listeners = [(l, k) for l, k in self._listeners if l != listener]
+        if not self._listeners:
+            for shard in range(self.shards):
+                self._send(shard, "unwatch")
+
+    def _read_events(self):
+        events = list(self._events)
+        while events and not self._closed:
+            for conn in multiprocessing.connection.wait(events, timeout=0.5):
+                try:
+                    batch = conn.recv()
+                except (EOFError, OSError):
+                    events.remove(conn)
+                    continue
+                for key, old_val, new_val in batch:
+                    for listener, only in self._listeners:
+                        if only is None or only == key:
+                            try:
+                                listener(self, key, old_val, new_val)
+                            except Exception as e:
+                                self.log.error("{} : Listener {} failed: {}".format(self, listener, e))
+
+    def close(self, timeout: float = 5.0):
+        """ Closes every shard's connectors and stops the worker processes. """
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        for shard in range(self.shards):
+            try:
+                self._send(shard, "close")
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        if self._event_thread is not None:
+            self._event_thread.join(timeout)  # Ends once every worker's end of its event pipe is closed
+        for conn in self._commands + self._events:
+            conn.close()
@@ -0,0 +1,324 @@
+""" Connecting NetworkMemory objects on the same host through shared memory. """
+
+import asyncio
+import errno
+import os
+import struct
+import tempfile
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+from .codec import MessageCodec
+from .connector import Connector, ConnectorListener
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+_owned = set()  # Names of the segments this process created and will unlink
+
+
+def _attach_segment(name: str):
+    """ Attaches to an existing segment without letting this process's
+    resource tracker unlink it out from under its owner at exit. """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if name not in _owned:  # The tracker keeps one entry per name, which the owner's unlink() removes
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, "shared_memory")
+            except Exception:
+                pass
+        return shm
+
+
+def _unlink_segment(name: str):
+    """ Removes a segment left behind by a crashed process. """
+    shm = shared_memory.SharedMemory(name=name)  # Tracked, so that unlink() can untrack it
+    shm.close()
+    shm.unlink()
+
+
+class RingBuffer(object):
+    """
+    Single-writer/multi-reader byte ring living in a shared memory segment.
+
+    The segment starts with a 16 byte header followed by the data area:
+
+        [0:8]   total bytes ever written (u64), published after each record is in place
+        [8:16]  capacity of the data area in bytes (u64)
+
+    Each record is a 4 byte length followed by the payload, wrapping around
+    the end of the data area as needed.  Readers keep their own read position
+    and never write to the segment, so no locks are needed.  A reader that
+    falls more than one capacity behind the writer loses the records it missed.
+    """
+    HEADER = struct.Struct("<QQ")
+    POSITION = struct.Struct("<Q")
+    LENGTH = struct.Struct("<I")
+
+    def __init__(self, name: str, capacity: int = None, create: bool = False):
+        self.name = name
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                                  size=RingBuffer.HEADER.size + capacity)
+            RingBuffer.HEADER.pack_into(self.shm.buf, 0, 0, capacity)
+            _owned.add(name)
+        else:
+            self.shm = _attach_segment(name)
+        self.owner = create
+        self.capacity = RingBuffer.HEADER.unpack_from(self.shm.buf, 0)[1]
+        self._data = self.shm.buf[RingBuffer.HEADER.size:RingBuffer.HEADER.size + self.capacity]
+
+    def __repr__(self):
+        return "{}({}, capacity={})".format(self.__class__.__name__, self.name, self.capacity)
+
+    @property
+    def write_pos(self) -> int:
+        return RingBuffer.POSITION.unpack_from(self.shm.buf, 0)[0]
+
+    def write(self, payload: bytes):
+        """ Appends one record.  Must only ever be called by the owner, and only from one thread. """
+        size = RingBuffer.LENGTH.size + len(payload)
+        if size > self.capacity:
+            raise ValueError("Record of {} bytes does not fit in ring of {} bytes".format(size, self.capacity))
+        pos = self.write_pos
+        self._copy_in(pos, RingBuffer.LENGTH.pack(len(payload)))
+        self._copy_in(pos + RingBuffer.LENGTH.size, payload)
+        RingBuffer.POSITION.pack_into(self.shm.buf, 0, pos + size)  # Publish
+
+    def read_from(self, pos: int) -> ([bytes], int, bool):
+        """
+        Reads every record published since pos.
+
+        :return: the payloads, the new read position, and whether records were lost
+        """
+        end = self.write_pos
+        if end - pos > self.capacity:
+            return [], end, True
+
+        records = []
+        start = pos
+        while pos < end:
+            length = RingBuffer.LENGTH.unpack(self._copy_out(pos, RingBuffer.LENGTH.size))[0]
+            records.append(self._copy_out(pos + RingBuffer.LENGTH.size, length))
+            pos += RingBuffer.LENGTH.size + length
+
+        # The writer may have lapped us while we were copying
+        if self.write_pos - start > self.capacity:
+            return [], self.write_pos, True
+        return records, pos, False
+
+    def _copy_in(self, pos: int, data: bytes):
+        start = pos % self.capacity
+        first = min(len(data), self.capacity - start)
+        self._data[start:start + first] = data[:first]
+        if first < len(data):
+            self._data[:len(data) - first] = data[first:]
+
+    def _copy_out(self, pos: int, length: int) -> bytes:
+        start = pos % self.capacity
+        first = min(length, self.capacity - start)
+        if first == length:
+            return bytes(self._data[start:start + length])
+        return bytes(self._data[start:]) + bytes(self._data[:length - first])
+
+    def close(self):
+        self._data.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+            _owned.discard(self.name)
+
+
+class SharedMemoryConnector(Connector):
+    """
+    Connects NetworkMemory objects in different processes on the same host.
+
+    Every connector on a channel owns one RingBuffer that only it writes to,
+    and reads the rings of all the other connectors on the channel.  Each
+    connector also owns a named pipe in a per-channel directory that serves
+    both to advertise its ring to the others and to wake up its event loop
+    when a peer has written something.  Writes to the ring, and everything
+    else touching the connector's state, happen on its event loop, so any
+    thread may send.
+    """
+
+    RING_COUNTER = 1
+
+    def __init__(self, channel: str = "netmem", capacity: int = 1 << 20,
+                 poll_interval: float = 1.0, directory: str = None, codec: MessageCodec = None):
+        """
+        :param codec: encodes outgoing records, eg, MessageCodec(threshold=1024) to compress large ones
+        """
+        super().__init__()
+        if shared_memory is None:
+            raise RuntimeError("{} requires multiprocessing.shared_memory (Python 3.8+)".format(
+                self.__class__.__name__))
+
+        self.channel = channel
+        self.codec = codec or MessageCodec()
+        self.capacity = capacity
+        self.poll_interval = poll_interval
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "netmem_shm_{}".format(channel))
+        self.ring_name = "netmem_{}_{}_{}".format(channel, os.getpid(), SharedMemoryConnector.RING_COUNTER)
+        SharedMemoryConnector.RING_COUNTER += 1
+
+        self._ring = None  # type: RingBuffer
+        self._wake_path = None  # type: str
+        self._wake_fd = None  # type: int
+        self._peer_rings = {}  # type: {str: RingBuffer}
+        self._read_pos = {}  # type: {str: int}
+        self._peer_wake_fds = {}  # type: {str: int}
+        self._poll_handle = None  # type: asyncio.TimerHandle
+        self._backlog = []  # type: [dict]  # Sent before the ring was ready, or None once it is
+
+    def __repr__(self):
+        return "{}(channel={}, ring={})".format(self.__class__.__name__, self.channel, self.ring_name)
+
+    def connect(self, listener: ConnectorListener, netmem_dict, loop: asyncio.BaseEventLoop = None) -> Connector:
+        super().connect(listener, netmem_dict, loop=loop)
+
+        async def _connect():
+            """ Used internally to connect on the appropriate event loop. """
+            os.makedirs(self.directory, exist_ok=True)
+            self._wake_path = os.path.join(self.directory, self.ring_name)
+            if os.path.exists(self._wake_path):
+                # Left over from a crashed process that had our pid
+                os.unlink(self._wake_path)
+                try:
+                    _unlink_segment(self.ring_name)
+                except FileNotFoundError:
+                    pass
+
+            self._ring = RingBuffer(self.ring_name, capacity=self.capacity, create=True)
+            os.mkfifo(self._wake_path)
+            # Opening read/write keeps the pipe from reporting EOF when writers come and go
+            self._wake_fd = os.open(self._wake_path, os.O_RDWR | os.O_NONBLOCK)
+            self.loop.add_reader(self._wake_fd, self._wakeup_received)
+
+            self._poll()
+            self.log.info("{} : Shared memory ring ready".format(self))
+            backlog, self._backlog = self._backlog, None
+            for msg in backlog:
+                self._send(msg)
+            self.listener.connection_made(self)
+
+        asyncio.run_coroutine_threadsafe(_connect(), loop=self.loop)
+        return self
+
+    def close(self):
+        self.log.debug("{} : close() called".format(self))
+
+        def _close():
+            if self._poll_handle is not None:
+                self._poll_handle.cancel()
+                self._poll_handle = None
+            if self._wake_fd is not None:
+                self.loop.remove_reader(self._wake_fd)
+                os.close(self._wake_fd)
+                self._wake_fd = None
+                os.unlink(self._wake_path)
+            for fd in self._peer_wake_fds.values():
+                os.close(fd)
+            self._peer_wake_fds.clear()
+            for ring in self._peer_rings.values():
+                ring.close()
+            self._peer_rings.clear()
+            self._backlog = None
+            if self._ring is not None:
+                self._ring.close()
+                self._ring = None
+                self.listener.connection_lost(self, "closed upon request")
+
+        self.loop.call_soon_threadsafe(_close)
+
+    def send_message(self, msg: dict):
+        self.log.debug("{} : Writing to shared memory: {}".format(self, msg))
+        self.loop.call_soon_threadsafe(self._send, msg)
+
+    def _send(self, msg: dict):
+        if self._ring is None:
+            if self._backlog is not None:
+                self._backlog.append(msg)  # Still connecting
+            return  # Otherwise closed
+        data = self.codec.encode(msg)
+        try:
+            self._ring.write(data)
+        except ValueError as e:
+            self.log.error("{} : Message dropped: {}".format(self, e))
+            return
+        self.metrics.sent(len(data))
+        self._wake_peers()
+
+    def _wake_peers(self):
+        """ Writes one byte to each peer's pipe.  A full pipe already has a wakeup pending. """
+        for name in list(self._peer_rings):
+            fd = self._peer_wake_fds.get(name)
+            if fd is None:
+                try:
+                    fd = os.open(os.path.join(self.directory, name), os.O_WRONLY | os.O_NONBLOCK)
+                except OSError:
+                    continue  # ENXIO: nobody is reading, ie, a stale peer
+                self._peer_wake_fds[name] = fd
+            try:
+                os.write(fd, b"\0")
+            except BlockingIOError:
+                pass
+            except OSError as e:
+                if e.errno == errno.EPIPE:
+                    os.close(self._peer_wake_fds.pop(name))
+
+    def _peer_names(self) -> [str]:
+        try:
+            return [n for n in os.listdir(self.directory) if n != self.ring_name]
+        except FileNotFoundError:
+            return []
+
+    def _wakeup_received(self):
+        try:
+            while os.read(self._wake_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        self._read_peers()
+
+    def _poll(self):
+        """ Picks up peers that came and went, and anything a lost wakeup missed. """
+        self._attach_peers()
+        self._read_peers()
+        self._poll_handle = self.loop.call_later(self.poll_interval, self._poll)
+
+    def _attach_peers(self):
+        names = set(self._peer_names())
+        for name in names.difference(self._peer_rings):
+            try:
+                ring = RingBuffer(name)
+            except FileNotFoundError:
+                continue
+            self._peer_rings[name] = ring
+            self._read_pos[name] = ring.write_pos  # Only new traffic, not history
+            self.log.info("{} : Attached to peer {}".format(self, ring))
+        for name in set(self._peer_rings).difference(names):
+            self.log.info("{} : Peer {} went away".format(self, name))
+            self._peer_rings.pop(name).close()
+            self._read_pos.pop(name, None)
+            fd = self._peer_wake_fds.pop(name, None)
+            if fd is not None:
+                os.close(fd)
+
+    def _read_peers(self):
+        for name, ring in self._peer_rings.items():
+            records, self._read_pos[name], lost = ring.read_from(self._read_pos[name])
+            if lost:
+                self.log.warning("{} : Fell behind {} and lost messages".format(self, ring))
+            for data in records:
+                self.metrics.received(len(data))
+                self.listener.message_received(self, self._decode(data))
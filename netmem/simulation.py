@@ -0,0 +1,120 @@
+"""
+Clusters of NetworkMemory nodes on a simulated network, for testing at scale.
+
+A Cluster builds any number of NetworkMemory objects in one process, joins
+them with LoopbackConnectors in a chosen topology, and measures how an
+update spreads: how long, in simulated time, until every node has it, and
+how many messages the network carried to get it there.
+
+    cluster = Cluster(200, topology="random", degree=4, link=Link(latency=0.005, loss=0.02), seed=7)
+    print(cluster.converge())
+
+Topologies:
+
+    mesh      every node sends to every other node
+    ring      each node sends to its two neighbors
+    star      node 0 sends to everyone, everyone else only to node 0
+    random    each node is linked both ways to at least degree random others
+"""
+
+import asyncio
+
+from .loopback_connector import Link, LoopbackConnector, LoopbackNetwork
+from .network_memory import NetworkMemory
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+TOPOLOGIES = ("mesh", "ring", "star", "random")
+
+
+class Cluster(object):
+    def __init__(self, size: int, topology: str = "mesh", link: Link = None, degree: int = 3, seed=None,
+                 **memory_kwargs):
+        """
+        :param size: number of nodes
+        :param topology: one of TOPOLOGIES
+        :param link: behavior of every link in the cluster
+        :param degree: links per node in the random topology
+        :param seed: makes jitter, loss, reordering and the random topology repeatable
+        :param memory_kwargs: passed to each NetworkMemory, eg, lazy=True
+        """
+        if topology not in TOPOLOGIES:
+            raise ValueError("Unknown topology {}, expected one of {}".format(topology, TOPOLOGIES))
+        self.size = size
+        self.topology = topology
+        self.network = LoopbackNetwork(link, seed=seed)
+        self.loop = asyncio.new_event_loop()
+        names = ["node{}".format(i) for i in range(size)]
+        self.nodes = []  # type: [NetworkMemory]
+        for name, peers in zip(names, self._peers(names, topology, degree)):
+            mem = NetworkMemory(name=name, **memory_kwargs)
+            mem.connect(LoopbackConnector(self.network, name, peers=peers), loop=self.loop)
+            self.nodes.append(mem)
+
+    def __repr__(self):
+        return "{}({} nodes, {})".format(self.__class__.__name__, self.size, self.topology)
+
+    def _peers(self, names: [str], topology: str, degree: int) -> [[str]]:
+        n = len(names)
+        if topology == "mesh":
+            return [None] * n
+        if topology == "ring":
+            return [sorted({names[(i - 1) % n], names[(i + 1) % n]} - {names[i]}) for i in range(n)]
+        if topology == "star":
+            return [names[1:]] + [names[:1]] * (n - 1)
+        links = [set() for _ in range(n)]
+        for i in range(n):
+            others = [j for j in range(n) if j != i]
+            for j in self.network.random.sample(others, min(degree, len(others))):
+                links[i].add(names[j])
+                links[j].add(names[i])
+        return [sorted(peers) for peers in links]
+
+    def converge(self, origin: int = 0, key: str = "probe", value=None, batch: int = 1,
+                 timeout: float = 60.0) -> dict:
+        """
+        Sets key on the origin node, along with batch - 1 other keys in the
+        same message, and runs the network until every node has the value,
+        nothing is left in flight, or timeout simulated seconds pass.
+
+        Amplification is messages carried per node that needed the update;
+        1.0 means each node got it exactly once.
+        """
+        value = value if value is not None else self.network.random.random()
+        arrived = {}  # type: {str: float}
+
+        def _listener(mem, changed_key, old_val, new_val):
+            if changed_key == key and new_val == value:
+                arrived.setdefault(mem.name, self.network.now)
+
+        for mem in self.nodes:
+            mem.add_listener(_listener)
+        self.network.reset_counts()
+        start = self.network.now
+        try:
+            with self.nodes[origin]:
+                for i in range(1, batch):
+                    self.nodes[origin]["{}/{}".format(key, i)] = value
+                self.nodes[origin][key] = value
+            while len(arrived) < self.size and not self.network.idle:
+                if self.network.run(until=start + timeout, max_messages=1000) == 0:
+                    break  # Timed out
+        finally:
+            for mem in self.nodes:
+                mem.remove_listener(_listener)
+
+        net = self.network
+        return {"nodes": self.size, "topology": self.topology, "batch": batch,
+                "converged": len(arrived) == self.size,
+                "reached": len(arrived),
+                "seconds": max(arrived.values()) - start if arrived else 0.0,
+                "messages": net.messages, "bytes": net.bytes, "dropped": net.dropped,
+                "amplification": net.messages / max(self.size - 1, 1)}
+
+    def close(self):
+        for mem in self.nodes:
+            mem.close_all()
+        self.loop.close()
@@ -0,0 +1,140 @@
+"""
+Read-only snapshots of a NetworkMemory for readers on other threads.
+
+From its first snapshot on, a BindableDict keeps its entries, alongside
+the dictionary itself, spread over a list of small bucket dictionaries, so
+writes cost nothing extra until something takes a snapshot.  Taking a snapshot only copies
+the list of bucket references and bumps an epoch counter, so it costs the
+same no matter how many keys there are.  The first write to a bucket after
+a snapshot copies that one bucket, and values that are edited in place,
+by patches and CRDT merges, are copied before they change, so a snapshot
+never sees later writes.  A snapshot can be iterated on any thread without
+a lock while the loop thread goes on writing.
+
+    snap = mem.snapshot()
+    for key, value in snap.items():
+        ...
+
+Values changed in place by application code (followed by mark_as_changed)
+are shared with snapshots and are not protected.
+"""
+
+import collections.abc
+import threading
+
+from .lazy import LazyValue
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+class Snapshot(collections.abc.Mapping):
+    """ An immutable view of a BindableDict as of one moment. """
+
+    def __init__(self, buckets: tuple, count: int, epoch: int):
+        self._buckets = buckets
+        self._count = count
+        self.epoch = epoch
+
+    def __repr__(self):
+        return "{}(epoch={}, {} keys)".format(self.__class__.__name__, self.epoch, self._count)
+
+    def __getitem__(self, key):
+        _, value = self._buckets[hash(key) % len(self._buckets)][key]
+        return value.peek() if isinstance(value, LazyValue) else value
+
+    def __contains__(self, key):
+        return key in self._buckets[hash(key) % len(self._buckets)]
+
+    def __iter__(self):
+        for bucket in self._buckets:
+            yield from bucket
+
+    def __len__(self):
+        return self._count
+
+    def items(self):
+        for bucket in self._buckets:
+            for key, (_, value) in bucket.items():
+                yield key, value.peek() if isinstance(value, LazyValue) else value
+
+
+class CowIndex(object):
+    """
+    The copy-on-write buckets behind snapshots.  Each entry is kept as
+    (epoch stored, value), so writers can tell whether a snapshot might
+    share the value.  A small lock makes each write and each snapshot atomic.
+    """
+
+    def __init__(self, buckets: int = 64, max_load: int = 64):
+        self.max_load = max_load
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._count = 0
+        self._buckets = [{} for _ in range(buckets)]
+        self._owned = [0] * buckets  # Epoch in which each bucket was last copied
+
+    def put(self, key, value):
+        with self._lock:
+            self._put(key, value)
+
+    def load(self, source: dict, publish):
+        """
+        Fills the index with what is in source, calling publish(self) first
+        so writers start keeping it up to date.  Their writes wait until
+        source has been copied in, so none are lost or overwritten.
+        """
+        with self._lock:
+            publish(self)
+            for key, value in dict.copy(source).items():
+                self._put(key, value)
+
+    def remove(self, key):
+        with self._lock:
+            i = hash(key) % len(self._buckets)
+            if key in self._buckets[i]:
+                del self._own(i)[key]
+                self._count -= 1
+
+    def clear(self):
+        with self._lock:
+            self._buckets = [{} for _ in self._buckets]
+            self._owned = [self._epoch] * len(self._buckets)
+            self._count = 0
+
+    def shared(self, key) -> bool:
+        """ Whether a snapshot may hold the value now stored under key. """
+        entry = self._buckets[hash(key) % len(self._buckets)].get(key)
+        return entry is not None and entry[0] != self._epoch
+
+    def snapshot(self) -> Snapshot:
+        with self._lock:
+            snap = Snapshot(tuple(self._buckets), self._count, self._epoch)
+            self._epoch += 1
+            return snap
+
+    def _put(self, key, value):
+        bucket = self._own(hash(key) % len(self._buckets))
+        if key not in bucket:
+            self._count += 1
+        bucket[key] = (self._epoch, value)
+        if self._count > self.max_load * len(self._buckets):
+            self._grow()
+
+    def _own(self, i: int) -> dict:
+        """ Returns bucket i, first copying it if a snapshot holds it. """
+        if self._owned[i] != self._epoch:
+            self._buckets[i] = dict(self._buckets[i])
+            self._owned[i] = self._epoch
+        return self._buckets[i]
+
+    def _grow(self):
+        """ Doubles the buckets so copying one after a snapshot stays cheap. """
+        buckets = [{} for _ in range(2 * len(self._buckets))]
+        for bucket in self._buckets:
+            for key, entry in bucket.items():
+                buckets[hash(key) % len(buckets)][key] = entry
+        self._buckets = buckets
+        self._owned = [self._epoch] * len(buckets)
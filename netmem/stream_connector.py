@@ -0,0 +1,260 @@
+""" Connecting NetworkMemory objects with length-prefixed frames over TCP or Unix domain sockets. """
+
+import asyncio
+import json
+import socket
+import struct
+
+from . import keytable
+from .codec import MessageCodec
+from .connector import Connector, ConnectorListener
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+def _is_closing(writer: asyncio.StreamWriter) -> bool:
+    """ StreamWriter.is_closing() arrived in Python 3.7, so ask its transport. """
+    return writer.transport.is_closing()
+
+
+class StreamConnector(Connector):
+    """
+    Common framing for the stream server and client connectors.
+
+    Each message is a 4 byte big-endian length followed by that many bytes
+    from the codec, by default plain JSON, with keys replaced by
+    per-connection key IDs (see netmem.keytable) once both ends have said
+    they understand them.  Addresses are either (host, port) tuples for TCP
+    or a string path for a Unix domain socket.
+
+    Each end sends its whole memory when a connection opens, so a client
+    that reconnects catches up on what it missed, and so does the server.
+
+    With nodelay=True, Nagle's algorithm is turned off on TCP sockets so small
+    updates go out immediately.  With cork=True, frames written during one
+    pass of the event loop are gathered and handed to the socket in one write.
+    """
+    LENGTH = struct.Struct(">I")
+    MAX_FRAME = 64 * 1024 * 1024
+
+    def __init__(self, nodelay: bool = True, cork: bool = False, codec: MessageCodec = None):
+        super().__init__()
+        self.nodelay = nodelay
+        self.cork = cork
+        self.codec = codec or MessageCodec()
+        self._writers = []  # type: [asyncio.StreamWriter]
+        self._corked = {}  # type: {asyncio.StreamWriter: [bytes]}
+        self._writer_by_node = {}  # type: {str: asyncio.StreamWriter}
+        self._sessions = {}  # type: {asyncio.StreamWriter: keytable.KeySession}
+        self._keys = keytable.KeyEncoder()
+
+    def send_message(self, msg: dict):
+        self.log.debug("{} : Sending to {} peers: {}".format(self, len(self._writers), msg))
+        self.loop.call_soon_threadsafe(self._send, msg)
+
+    def _send(self, msg: dict):
+        writers = [w for w in self._writers if not _is_closing(w)]
+        sessions = [self._sessions[w] for w in writers]
+        for writer, (_, data) in zip(writers, keytable.encode_for(sessions, msg, self._keys, self.codec)):
+            self._write_frame(writer, StreamConnector.LENGTH.pack(len(data)) + data)
+            self.metrics.sent(StreamConnector.LENGTH.size + len(data))
+
+    def _write_frame(self, writer: asyncio.StreamWriter, frame: bytes):
+        if not self.cork:
+            writer.write(frame)
+        elif writer in self._corked:
+            self._corked[writer].append(frame)
+        else:
+            self._corked[writer] = [frame]
+            self.loop.call_soon(self._uncork, writer)
+
+    def _uncork(self, writer: asyncio.StreamWriter):
+        frames = self._corked.pop(writer, [])
+        if frames and not _is_closing(writer):
+            writer.write(b"".join(frames))
+
+    def _add_writer(self, writer: asyncio.StreamWriter):
+        """ Sets up a newly opened connection, tells the peer we understand key IDs and sends our whole memory. """
+        sock = writer.get_extra_info("socket")
+        if self.nodelay and sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sessions[writer] = keytable.KeySession()
+        self._writers.append(writer)
+        data = json.dumps(keytable.HELLO).encode()
+        writer.write(StreamConnector.LENGTH.pack(len(data)) + data)
+        state = self.netmem.state_message()
+        if state["changes"]:
+            for _, data in keytable.encode_for([self._sessions[writer]], state, self._keys, self.codec):
+                self._write_frame(writer, StreamConnector.LENGTH.pack(len(data)) + data)
+                self.metrics.sent(StreamConnector.LENGTH.size + len(data))
+
+    async def _read_frames(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, peer):
+        """ Passes messages to the listener until the peer goes away. """
+        while True:
+            try:
+                header = await reader.readexactly(StreamConnector.LENGTH.size)
+            except asyncio.IncompleteReadError:
+                return  # Clean EOF
+            length = StreamConnector.LENGTH.unpack(header)[0]
+            if length > StreamConnector.MAX_FRAME:
+                raise ValueError("Frame of {} bytes from {} exceeds maximum".format(length, peer))
+            data = await reader.readexactly(length)
+            self.metrics.received(StreamConnector.LENGTH.size + length)
+            msg = self._sessions[writer].decode(self._decode(data))
+            if "node" in msg:
+                self._writer_by_node[str(msg["node"])] = writer
+            self.listener.message_received(self, msg)
+
+    def _forget_writer(self, writer: asyncio.StreamWriter):
+        if writer in self._writers:
+            self._writers.remove(writer)
+        self._corked.pop(writer, None)
+        self._sessions.pop(writer, None)
+        for node, node_writer in list(self._writer_by_node.items()):
+            if node_writer is writer:
+                del self._writer_by_node[node]
+        writer.close()
+
+    def peer_lost(self, node: str):
+        writer = self._writer_by_node.pop(node, None)  # type: asyncio.StreamWriter
+        if writer is not None:
+            self.log.info("{} : Dropping silent peer {}".format(self, writer.get_extra_info("peername")))
+            self._forget_writer(writer)
+
+
+class StreamServerConnector(StreamConnector):
+    """
+    Accepts any number of StreamClientConnector peers and fans every update out to all of them.
+    """
+
+    def __init__(self, addr=None, nodelay: bool = True, cork: bool = False, codec: MessageCodec = None):
+        """
+        :param addr: (host, port) to listen on with TCP or a filesystem path for a Unix domain socket
+        :param codec: encodes outgoing frames, eg, MessageCodec(threshold=1024) to compress large ones
+        """
+        super().__init__(nodelay=nodelay, cork=cork, codec=codec)
+        self.addr = addr or ("0.0.0.0", 9980)
+        self._srv = None  # type: asyncio.base_events.Server
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self.addr)
+
+    def connect(self, listener: ConnectorListener, netmem_dict, loop: asyncio.BaseEventLoop = None) -> Connector:
+        super().connect(listener, netmem_dict, loop=loop)
+
+        async def _connect():
+            if isinstance(self.addr, str):
+                self._srv = await asyncio.start_unix_server(self._client_connected, path=self.addr)
+            else:
+                host, port = self.addr
+                self._srv = await asyncio.start_server(self._client_connected, host=host, port=port)
+            self.log.info("{} : Stream server listening".format(self))
+            self.listener.connection_made(self)  # Must notify NetworkMemory
+
+        asyncio.run_coroutine_threadsafe(_connect(), loop=self.loop)
+        return self
+
+    async def _client_connected(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        self.log.info("{} : Incoming client connected {}".format(self, peer))
+        self._add_writer(writer)
+        try:
+            await self._read_frames(reader, writer, peer)
+        except Exception as e:
+            self.log.error("{} : Stream connection error from {}: {}".format(self, peer, e))
+            self.listener.connection_error(self, e)
+        finally:
+            self.log.info("{} : Client disconnected {}".format(self, peer))
+            self._forget_writer(writer)
+
+    def close(self):
+        self.log.info("{} : Attempting to close stream server".format(self))
+
+        async def _close():
+            self._srv.close()
+            for writer in self._writers.copy():
+                writer.close()
+            await self._srv.wait_closed()
+            self.listener.connection_lost(self, "closed upon request")
+
+        asyncio.run_coroutine_threadsafe(_close(), self.loop)
+
+
+class StreamClientConnector(StreamConnector):
+    """
+    Keeps a connection open to each server in a pool of addresses, reconnecting
+    with exponential backoff whenever one drops.  Updates go to every server
+    that is currently connected.
+    """
+
+    def __init__(self, addrs=None, nodelay: bool = True, cork: bool = False,
+                 reconnect_delay: float = 0.5, max_reconnect_delay: float = 30, codec: MessageCodec = None):
+        """
+        :param addrs: a list of (host, port) tuples and/or Unix domain socket paths, or a single one of these
+        :param codec: encodes outgoing frames, eg, MessageCodec(threshold=1024) to compress large ones
+        """
+        super().__init__(nodelay=nodelay, cork=cork, codec=codec)
+        if addrs is None:
+            addrs = [("localhost", 9980)]
+        elif isinstance(addrs, (str, tuple)):
+            addrs = [addrs]
+        self.addrs = list(addrs)
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._tasks = []  # type: [asyncio.Task]
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self.addrs)
+
+    def connect(self, listener: ConnectorListener, netmem_dict, loop: asyncio.BaseEventLoop = None) -> Connector:
+        super().connect(listener, netmem_dict, loop=loop)
+
+        async def _connect():
+            self._tasks = [self.loop.create_task(self._maintain(addr)) for addr in self.addrs]
+            self.listener.connection_made(self)  # Must register with NetworkMemory
+
+        asyncio.run_coroutine_threadsafe(_connect(), loop=self.loop)
+        return self
+
+    async def _maintain(self, addr):
+        """ Connects to one server and keeps reconnecting until closed. """
+        delay = self.reconnect_delay
+        while True:
+            try:
+                if isinstance(addr, str):
+                    reader, writer = await asyncio.open_unix_connection(path=addr)
+                else:
+                    reader, writer = await asyncio.open_connection(*addr)
+            except OSError as e:
+                self.log.debug("{} : Could not connect to {}: {}".format(self, addr, e))
+            else:
+                self.log.info("{} : Stream client connected to {}".format(self, addr))
+                delay = self.reconnect_delay
+                self._add_writer(writer)
+                try:
+                    await self._read_frames(reader, writer, addr)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.log.error("{} : Stream connection error from {}: {}".format(self, addr, e))
+                    self.listener.connection_error(self, e)
+                finally:
+                    self._forget_writer(writer)
+                self.log.info("{} : Disconnected from {}".format(self, addr))
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def close(self):
+        self.log.info("{} : Attempting to close stream client".format(self))
+
+        def _close():
+            for task in self._tasks:
+                task.cancel()
+            self._tasks = []
+            self.listener.connection_lost(self, "closed upon request")
+
+        self.loop.call_soon_threadsafe(_close)
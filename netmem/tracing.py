@@ -0,0 +1,118 @@
+"""
+Hooks for following changes through the update pipeline and timing each stage.
+
+Give a NetworkMemory a Tracer and it calls the tracer at each stage a
+change passes through:
+
+    local_set         a key was set locally
+    batch             changes were gathered into one message for the connectors
+    sent              a connector took the message, encoding and writing it
+    decoded           a connector decoded a message that arrived
+    applied           a received message was applied to the dictionary
+    listener_called   a listener returned from handling one change
+
+Subclass Tracer and override the stages of interest:
+
+    class PrintTracer(netmem.tracing.Tracer):
+        def applied(self, memory, connector, trace_ids, seconds):
+            print(trace_ids, seconds)
+
+    mem = NetworkMemory(tracer=PrintTracer())
+
+Every stage is given the trace IDs of the changes involved.  A change's
+trace ID comes from its hybrid logical clock timestamp, which travels with
+the change and is kept by each node that applies it, so the same ID shows
+up on the node that set the key and on every node it reaches, without
+adding anything to the messages.
+
+With no tracer, which is the default, each hook point costs one
+attribute check.
+"""
+
+import logging
+
+from . import metrics
+from .hlc import Timestamp
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+
+def trace_id(timestamp) -> str:
+    """ Returns the trace ID for the change made at this timestamp. """
+    stamp = Timestamp.parse(timestamp)
+    return "{}:{!r}:{}".format(stamp.node, stamp.wall, stamp.logical)
+
+
+def trace_ids(msg: dict) -> [str]:
+    """ Returns the trace IDs of the changes in a message. """
+    return [trace_id(c.get("timestamp")) for c in msg.get("changes") or []]
+
+
+class Tracer(object):
+    """ Does nothing at every stage.  Used more like a Java interface. """
+
+    def local_set(self, memory, key, trace_id: str):
+        pass
+
+    def batch(self, memory, trace_ids: [str]):
+        pass
+
+    def sent(self, memory, connector, trace_ids: [str], seconds: float):
+        pass
+
+    def decoded(self, connector, trace_ids: [str], nbytes: int, seconds: float):
+        pass
+
+    def applied(self, memory, connector, trace_ids: [str], seconds: float):
+        pass
+
+    def listener_called(self, memory, listener, key, trace_id: str, seconds: float):
+        pass
+
+
+class SlowListenerDetector(Tracer):
+    """ Logs a warning for each listener call that runs longer than a threshold. """
+
+    def __init__(self, threshold: float = 0.01):
+        """
+        :param threshold: seconds a listener may run before it is reported
+        """
+        self.log = logging.getLogger(__name__ + '.' + self.__class__.__name__)
+        self.threshold = threshold
+
+    def listener_called(self, memory, listener, key, trace_id: str, seconds: float):
+        if seconds > self.threshold:
+            self.log.warning("{} : Listener {} took {:.1f} ms on key {} ({})".format(
+                getattr(memory, "name", memory.__class__.__name__),
+                getattr(listener, "__qualname__", listener), seconds * 1000, key, trace_id))
+
+
+class StageProfiler(SlowListenerDetector):
+    """
+    Records the time spent in each stage as histograms in the metrics
+    registry, labeled by stage, to see where propagation time goes.
+    Also reports slow listeners.
+    """
+
+    def __init__(self, threshold: float = 0.01, registry: metrics.Registry = None):
+        super().__init__(threshold)
+        registry = registry or metrics.REGISTRY
+        self._stages = {stage: registry.histogram("netmem_stage_seconds", "Time spent in each stage of the pipeline",
+                                                  stage=stage)
+                        for stage in ("send", "decode", "apply", "listener")}
+
+    def sent(self, memory, connector, trace_ids: [str], seconds: float):
+        self._stages["send"].observe(seconds)
+
+    def decoded(self, connector, trace_ids: [str], nbytes: int, seconds: float):
+        self._stages["decode"].observe(seconds)
+
+    def applied(self, memory, connector, trace_ids: [str], seconds: float):
+        self._stages["apply"].observe(seconds)
+
+    def listener_called(self, memory, listener, key, trace_id: str, seconds: float):
+        self._stages["listener"].observe(seconds)
+        super().listener_called(memory, listener, key, trace_id, seconds)
@@ -1,12 +1,13 @@
 """ Connecting NetworkMemory objects with UDP datagrams. """
 import asyncio
 import ipaddress
-import json
 import socket
 import struct
 import threading
 
+from .codec import MessageCodec
 from .connector import Connector, ConnectorListener
+from .pipeline import DecodePipeline
 
 __author__ = "Robert Harder"
 __email__ = "rob@iharder.net"
@@ -15,14 +16,24 @@ __license__ = "Public Domain"
 
 
 class UdpConnector(Connector):
-    def __init__(self, local_addr: (str, int) = None, remote_addr: (str, int) = None):
+    def __init__(self, local_addr: (str, int) = None, remote_addr: (str, int) = None, codec: MessageCodec = None,
+                 max_batch: int = 1000, decoder: DecodePipeline = None):
+        """
+        :param codec: encodes outgoing datagrams, eg, MessageCodec(threshold=1024) to compress large ones
+        :param max_batch: most waiting datagrams to read and apply together
+        :param decoder: decodes large bursts on worker processes instead of the loop's thread
+        """
         super().__init__()
 
         self.local_addr = local_addr or ("225.0.0.1", 9999)
         self.remote_addr = remote_addr or self.local_addr
+        self.codec = codec or MessageCodec()
+        self.max_batch = max_batch
+        self.decoder = decoder
 
         self.loop = None  # type: asyncio.BaseEventLoop
         self._transport = None  # type: asyncio.DatagramTransport
+        self._sock = None  # type: socket.socket  # Kept so bursts can be drained in one go
 
     def __repr__(self):
         return "{}(local_addr={}, remote_addr={})".format(
@@ -30,6 +41,8 @@ class UdpConnector(Connector):
 
     def connect(self, listener: ConnectorListener, netmem_dict, loop: asyncio.BaseEventLoop = None) -> Connector:
         super().connect(listener, netmem_dict, loop=loop)
+        if self.decoder is not None:
+            self.decoder.start(self.loop, self.codec, lambda _, msgs: self.listener.messages_received(self, msgs))
 
         async def _connect():
             """ Used internally to connect on the appropriate event loop. """
@@ -48,10 +61,13 @@ class UdpConnector(Connector):
                     # sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
                     return sock
 
-                trans, proto = await self.loop.create_datagram_endpoint(lambda: self, sock=_make_sock())
+                self._sock = _make_sock()
             else:
                 # Not multicast
-                trans, proto = await self.loop.create_datagram_endpoint(lambda: self, local_addr=self.local_addr)
+                version = ipaddress.ip_address(self.local_addr[0]).version
+                self._sock = socket.socket(socket.AF_INET6 if version == 6 else socket.AF_INET, socket.SOCK_DGRAM)
+                self._sock.bind(self.local_addr)
+            trans, proto = await self.loop.create_datagram_endpoint(lambda: self, sock=self._sock)
 
             assert trans is self._transport
             assert proto is self
@@ -64,11 +80,15 @@ class UdpConnector(Connector):
         if self._transport is not None:
             self._transport.close()
             self._transport = None
+            self._sock = None
+        if self.decoder is not None:
+            self.decoder.close()
 
     def send_message(self, msg: dict):
         self.log.debug("{} : Sending to network: {}".format(self, msg))
-        json_data = json.dumps(msg)
-        self._transport.sendto(json_data.encode(), self.remote_addr)
+        data = self.codec.encode(msg)
+        self._transport.sendto(data, self.remote_addr)
+        self.metrics.sent(len(data))
 
     def connection_made(self, transport):
         self.log.info("{} : Connection made {}".format(self, transport))
@@ -80,12 +100,41 @@ class UdpConnector(Connector):
         if self._transport is not None:
             self._transport.close()
             self._transport = None
+        self._sock = None
         self.listener.connection_lost(self, exc=exc)
 
     def datagram_received(self, data, addr):
-        self.log.debug("{} : Datagram received from {}: {}".format(self, addr, data))
-        msg = json.loads(data.decode())
-        self.listener.message_received(self, msg)
+        """
+        Reads whatever other datagrams are already waiting, up to max_batch,
+        and hands them to the listener together so a burst is applied at once.
+        """
+        datagrams = [(data, addr)]
+        self._drain(datagrams)
+        self.log.debug("{} : {} datagrams received".format(self, len(datagrams)))
+        self.metrics.received(sum(len(data) for data, _ in datagrams), len(datagrams))
+        if self.decoder is not None:
+            self.decoder.feed([data for data, _ in datagrams])
+            return
+
+        msgs = []
+        for data, addr in datagrams:
+            try:
+                msgs.append(self._decode(data))
+            except ValueError as e:
+                self.log.error("{} : Dropping unreadable datagram from {}: {}".format(self, addr, e))
+        if msgs:
+            self.listener.messages_received(self, msgs)
+
+    def _drain(self, datagrams: list):
+        sock = self._sock
+        while sock is not None and len(datagrams) < self.max_batch:
+            try:
+                datagrams.append(sock.recvfrom(65535))
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                self.error_received(e)
+                break
 
     def error_received(self, exc):
         self.log.error("{} : Error received: {}".format(self, exc))
@@ -8,7 +8,10 @@ import aiohttp
 from aiohttp import web
 from yarl import URL
 
+from . import blob, keytable, lazy, metrics
+from .codec import MessageCodec, PLAIN
 from .connector import Connector, ConnectorListener
+from .pipeline import DecodePipeline
 
 __author__ = "Robert Harder"
 __email__ = "rob@iharder.net"
@@ -16,12 +19,38 @@ __date__ = "2 Feb 2017"
 __license__ = "Public Domain"
 
 
+def _send(ws, data: bytes):
+    """ Sends plain JSON as a text frame and anything the codec compressed as a binary frame. """
+    if data[:1] == bytes((PLAIN,)):
+        ws.send_str(data.decode())
+    else:
+        ws.send_bytes(data)
+
+
+def _hello() -> dict:
+    return dict(keytable.HELLO, **blob.HELLO)
+
+
+async def _send_blobs(ws, blobs: blob.BlobTransfer, digests):
+    """ Streams the requested blobs in chunks, letting the loop run between chunks. """
+    for digest in digests:
+        for frame in blobs.chunks(str(digest)):
+            ws.send_bytes(frame)
+            await asyncio.sleep(0)
+
+
 class WsServerConnector(Connector):
     WS_UPDATES = "/ws_updates"
     WS_WHOLE = "/ws_whole"
+    METRICS = "/metrics"
     HTML_VIEW = "/"
 
-    def __init__(self, host="0.0.0.0", port=8080, ssl_context=None, netmem_dict:dict=None):
+    def __init__(self, host="0.0.0.0", port=8080, ssl_context=None, netmem_dict:dict=None,
+                 codec: MessageCodec = None, blob_threshold: int = 1 << 20, decoder: DecodePipeline = None):
+        """
+        :param blob_threshold: values whose JSON is at least this many bytes go to capable clients as chunked blobs
+        :param decoder: decodes large messages on worker processes instead of the loop's thread
+        """
         super().__init__()
 
         self.host = host
@@ -34,6 +63,14 @@ class WsServerConnector(Connector):
         self._srv = None  # type: asyncio.base_events.Server
         self._active_ws_updates_sockets = []  # type: [web.WebSocketResponse]
         self._active_ws_whole_sockets = []  # type: [web.WebSocketResponse]
+        self._ws_whole_prefixes = {}  # type: {web.WebSocketResponse: str}  # From ?prefix=... on ws_whole
+        self._ws_by_node = {}  # type: {str: web.WebSocketResponse}
+        self._sessions = {}  # type: {web.WebSocketResponse: keytable.KeySession}
+        self._keys = keytable.KeyEncoder()
+        self.codec = codec or MessageCodec()
+        self.blobs = blob.BlobTransfer(threshold=blob_threshold)
+        self._blob_sockets = set()  # Clients that said they understand blob references
+        self.decoder = decoder
 
         scheme = 'https' if self.ssl_context else 'http'
         url = URL('{}://localhost'.format(scheme))
@@ -42,21 +79,26 @@ class WsServerConnector(Connector):
         self.url_ws_updates = self.url_base.join(URL(WsServerConnector.WS_UPDATES))
         self.url_ws_whole = self.url_base.join(URL(WsServerConnector.WS_WHOLE))
         self.url_html_view = self.url_base.join(URL(WsServerConnector.HTML_VIEW))
+        self.url_metrics = self.url_base.join(URL(WsServerConnector.METRICS))
 
         self.log.info("{} : Hosting html view at {}".format(self, self.url_html_view))
         self.log.info("{} : Hosting websocket memory updates at {}".format(self, self.url_ws_updates))
         self.log.info("{} : Hosting websocket memory complete reflection at {}".format(self, self.url_ws_whole))
+        self.log.info("{} : Serving metrics at {}".format(self, self.url_metrics))
 
     def __repr__(self):
         return "{}({})".format(self.__class__.__name__, self.url_base)
 
     def connect(self, listener: ConnectorListener, netmem_dict, loop: asyncio.BaseEventLoop=None) -> Connector:
         super().connect(listener, netmem_dict, loop=loop)
+        if self.decoder is not None:
+            self.decoder.start(self.loop, self.codec, self._received)
 
         async def _connect():
             self._app = web.Application(loop=self.loop)
             self._app.router.add_get(WsServerConnector.WS_UPDATES, self.ws_updates_handler)
             self._app.router.add_get(WsServerConnector.WS_WHOLE, self.ws_whole_handler)
+            self._app.router.add_get(WsServerConnector.METRICS, self.metrics_handler)
             self._app.router.add_get(WsServerConnector.HTML_VIEW, self.html_view_handler)
 
             # Provide an HTML page showing activity?
@@ -72,14 +114,54 @@ class WsServerConnector(Connector):
         asyncio.run_coroutine_threadsafe(_connect(), loop=self.loop)
         return self
 
+    def _received(self, ws, msgs: [dict]):
+        """ Handles decoded messages from a client, in the order they arrived. """
+        session = self._sessions.get(ws)
+        if session is None:
+            return  # Disconnected while its messages were being decoded
+        for data in msgs:
+            data = session.decode(data)
+            if "node" in data:
+                self._ws_by_node[str(data["node"])] = ws
+            if data.get("blobs"):
+                self._blob_sockets.add(ws)
+            if data.get("blob_want"):
+                asyncio.ensure_future(_send_blobs(ws, self.blobs, data["blob_want"]), loop=self.loop)
+            data, wants = self.blobs.incoming(data, ws)
+            if wants:
+                ws.send_json({"blob_want": wants})
+            if data is not None:
+                self.listener.message_received(self, data)
+
     def send_message(self, msg: dict):
-        self.log.debug("{} : Sending update to {} connected clients".format(self, len(self._active_ws_updates_sockets)))
-        for ws in self._active_ws_updates_sockets.copy():  # type: web.WebSocketResponse
-            ws.send_json(msg)
+        self.loop.call_soon_threadsafe(self._send_message, msg)  # Blobs are prepared on the loop
 
-        if self.netmem is not None:
+    def _send_message(self, msg: dict):
+        self.log.debug("{} : Sending update to {} connected clients".format(self, len(self._active_ws_updates_sockets)))
+        sockets = self._active_ws_updates_sockets.copy()
+        capable = [ws for ws in sockets if ws in self._blob_sockets]
+        others = [ws for ws in sockets if ws not in self._blob_sockets]
+        if capable:
+            self.blobs.outgoing_in_order(msg, lambda form: self._send_to(capable, form), self.loop)
+        self._send_to(others, msg)
+
+        if self.netmem is not None and msg.get("changes"):
             for ws in self._active_ws_whole_sockets.copy():  # type: web.WebSocketResponse
-                ws.send_json(self.netmem)
+                ws.send_str(self._whole(self._ws_whole_prefixes.get(ws)))
+
+    def _send_to(self, sockets: list, msg: dict):
+        sockets = [ws for ws in sockets if ws in self._sessions]  # Some may have gone while blobs were encoded
+        sessions = [self._sessions[ws] for ws in sockets]
+        for ws, (_, data) in zip(sockets, keytable.encode_for(sessions, msg, self._keys, self.codec)):
+            _send(ws, data)
+            self.metrics.sent(len(data))
+
+    def peer_lost(self, node: str):
+        ws = self._ws_by_node.pop(node, None)  # type: web.WebSocketResponse
+        if ws is not None and ws in self._active_ws_updates_sockets:
+            self.log.info("{} : Dropping silent client on websocket {}".format(self, id(ws)))
+            self._active_ws_updates_sockets.remove(ws)
+            asyncio.run_coroutine_threadsafe(ws.close(), self.loop)
 
     def close(self):
         self.log.info("{} : Attempting to close websocket server".format(self))
@@ -91,6 +173,8 @@ class WsServerConnector(Connector):
             await self._app.shutdown()
             await self._handler.shutdown()
             await self._app.cleanup()
+            if self.decoder is not None:
+                self.decoder.close()
             self.listener.connection_lost(self, "closed upon request")
 
         asyncio.run_coroutine_threadsafe(_close(), self.loop)
@@ -98,14 +182,26 @@ class WsServerConnector(Connector):
     async def ws_updates_handler(self, request):
         ws = web.WebSocketResponse()
         await ws.prepare(request)
+        self._sessions[ws] = keytable.KeySession()
         self._active_ws_updates_sockets.append(ws)
         self.log.info("{} : Incoming client connected to websocket {}".format(self, id(ws)))
 
         exc = None
         try:
+            ws.send_json(_hello())
             async for msg in ws:  # type: aiohttp.WSMessage
-                if msg.type == aiohttp.WSMsgType.TEXT:
-                    self.listener.message_received(self, msg.json())
+                if msg.type == aiohttp.WSMsgType.BINARY and msg.data[:1] == bytes((blob.CHUNK,)):
+                    self.metrics.received(len(msg.data))
+                    for data in self.blobs.receive_chunk(msg.data):
+                        self.listener.message_received(self, data)
+
+                elif msg.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                    raw = msg.data.encode() if msg.type == aiohttp.WSMsgType.TEXT else msg.data
+                    self.metrics.received(len(raw))
+                    if self.decoder is not None:
+                        self.decoder.feed([raw], ws)
+                    else:
+                        self._received(ws, [self._decode(raw)])
 
                 elif msg.type == aiohttp.WSMsgType.ERROR:
                     self.log.error("{} : Websocket {} connection error: {}".format(self, id(ws), ws.exception()))
@@ -120,19 +216,29 @@ class WsServerConnector(Connector):
         finally:
             self.log.info("{} : Client disconnected from websocket connection {}".format(self, id(ws)))
             ws.close()
-            self._active_ws_updates_sockets.remove(ws)
+            if ws in self._active_ws_updates_sockets:
+                self._active_ws_updates_sockets.remove(ws)
+            self._sessions.pop(ws, None)
+            self._blob_sockets.discard(ws)
+            for other, wants in self.blobs.closed(ws).items():  # Asks others for blobs this client was sending
+                if other in self._active_ws_updates_sockets:
+                    other.send_json({"blob_want": wants})
+            for node, node_ws in list(self._ws_by_node.items()):
+                if node_ws is ws:
+                    del self._ws_by_node[node]
         return ws
 
     async def ws_whole_handler(self, request):
         ws = web.WebSocketResponse()
         await ws.prepare(request)
         self._active_ws_whole_sockets.append(ws)
+        self._ws_whole_prefixes[ws] = request.query.get("prefix")
         self.log.info("{} : Incoming client connected to websocket {}".format(self, id(ws)))
 
         exc = None
         try:
             if self.netmem is not None:
-                ws.send_json(self.netmem)
+                ws.send_str(self._whole(self._ws_whole_prefixes[ws]))
 
             async for msg in ws:  # type: aiohttp.WSMessage
                 if msg.type == aiohttp.WSMsgType.TEXT:
@@ -153,8 +259,15 @@ class WsServerConnector(Connector):
             self.log.info("{} : Client disconnected from websocket connection {}".format(self, id(ws)))
             ws.close()
             self._active_ws_whole_sockets.remove(ws)
+            self._ws_whole_prefixes.pop(ws, None)
         return ws
 
+    def _whole(self, prefix: str = None) -> str:
+        """ The memory as JSON, or only its keys beginning with prefix, eg, from /ws_whole?prefix=robot/17/ """
+        if not prefix:
+            return lazy.dumps(self.netmem)
+        return lazy.dumps({key: dict.__getitem__(self.netmem, key) for key in self.netmem.keys(prefix=prefix)})
+
     async def html_view_handler(self, request):
         dir = os.path.dirname(__file__)
         html_dir = os.path.abspath(os.path.join(dir, "html"))
@@ -163,33 +276,63 @@ class WsServerConnector(Connector):
             html_data = f.read()
         return web.Response(text=html_data, content_type="text/html")
 
+    async def metrics_handler(self, request):
+        """ Serves every netmem metric in this process as Prometheus style text. """
+        return web.Response(text=metrics.render_text(), content_type="text/plain")
+
 
 class WsClientConnector(Connector):
-    def __init__(self, url: str = None):
+    def __init__(self, url: str = None, codec: MessageCodec = None, blob_threshold: int = 1 << 20,
+                 decoder: DecodePipeline = None):
+        """
+        :param blob_threshold: values whose JSON is at least this many bytes go to the server as chunked blobs
+        :param decoder: decodes large messages on worker processes instead of the loop's thread
+        """
         super().__init__()
         self.url = url
+        self.codec = codec or MessageCodec()
+        self.blobs = blob.BlobTransfer(threshold=blob_threshold)
+        self._blob_server = False  # Whether the server said it understands blob references
+        self.decoder = decoder
         self.loop = None  # type: asyncio.BaseEventLoop
         self.session = None  # type: aiohttp.ClientSession
         self.ws = None  # type: aiohttp.ClientWebSocketResponse
+        self._keys = keytable.KeyEncoder()
+        self._key_session = None  # type: keytable.KeySession
 
     def __repr__(self):
         return "{}({})".format(self.__class__.__name__, self.url)
 
     def connect(self, listener: ConnectorListener, netmem_dict, loop: asyncio.BaseEventLoop=None) -> Connector:
         super().connect(listener, netmem_dict, loop=loop)
+        if self.decoder is not None:
+            self.decoder.start(self.loop, self.codec, self._received)
 
         async def _connect():
             self.session = aiohttp.ClientSession(loop=self.loop)
             async with self.session.ws_connect(self.url) as ws:  # type: aiohttp.ClientWebSocketResponse
                 self.ws = ws
+                self._key_session = keytable.KeySession()
                 self.log.info("{} : Websocket client connected {}".format(self, id(ws)))
+                self._blob_server = False
+                ws.send_json(_hello())
                 self.listener.connection_made(self)  # Must register with NetworkMemory
 
                 exc = None
                 try:
                     async for msg in ws:  # type: aiohttp.WSMessage
-                        if msg.type == aiohttp.WSMsgType.TEXT:
-                            self.listener.message_received(self, msg.json())
+                        if msg.type == aiohttp.WSMsgType.BINARY and msg.data[:1] == bytes((blob.CHUNK,)):
+                            self.metrics.received(len(msg.data))
+                            for data in self.blobs.receive_chunk(msg.data):
+                                self.listener.message_received(self, data)
+
+                        elif msg.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                            raw = msg.data.encode() if msg.type == aiohttp.WSMsgType.TEXT else msg.data
+                            self.metrics.received(len(raw))
+                            if self.decoder is not None:
+                                self.decoder.feed([raw], ws)
+                            else:
+                                self._received(ws, [self._decode(raw)])
 
                         elif msg.type == aiohttp.WSMsgType.ERROR:
                             self.log.error("{} : Websocket {} connection error: {}".format(self, id(ws), ws.exception()))
@@ -201,6 +344,7 @@ class WsClientConnector(Connector):
                     exc = e
                 finally:
                     self.log.info("{} : Client disconnected from websocket {}".format(self, id(ws)))
+                    self.blobs.closed(ws)
                     self.listener.connection_lost(self, exc)
             self.log.info("{} : Websocket client closed {}".format(self, id(ws)))
             self.listener.connection_lost(self, "connection closed")
@@ -209,10 +353,40 @@ class WsClientConnector(Connector):
         asyncio.run_coroutine_threadsafe(_connect(), loop=self.loop)
         return self
 
+    def _received(self, ws, msgs: [dict]):
+        """ Handles decoded messages from the server, in the order they arrived. """
+        if ws is not self.ws:
+            return  # Disconnected while its messages were being decoded
+        for data in msgs:
+            data = self._key_session.decode(data)
+            if data.get("blobs"):
+                self._blob_server = True
+            if data.get("blob_want"):
+                asyncio.ensure_future(_send_blobs(ws, self.blobs, data["blob_want"]), loop=self.loop)
+            data, wants = self.blobs.incoming(data, ws)
+            if wants:
+                ws.send_json({"blob_want": wants})
+            if data is not None:
+                self.listener.message_received(self, data)
 
     def send_message(self, msg: dict):
+        self.loop.call_soon_threadsafe(self._send_message, msg)  # Blobs are prepared on the loop
+
+    def _send_message(self, msg: dict):
         self.log.debug("Sending message to server on websocket {}".format(id(self.ws)))
-        self.ws.send_json(msg)
+        if self._blob_server:
+            self.blobs.outgoing_in_order(msg, self._send_now, self.loop)
+        else:
+            self._send_now(msg)
+
+    def _send_now(self, msg: dict):
+        if self.ws is None:
+            return
+        for _, data in keytable.encode_for([self._key_session], msg, self._keys, self.codec):
+            _send(self.ws, data)
+            self.metrics.sent(len(data))
 
     def close(self):
+        if self.decoder is not None:
+            self.decoder.close()
         self.loop.call_soon_threadsafe(self.ws.close)
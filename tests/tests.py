@@ -0,0 +1,1281 @@
+"""
+Tests for netmem.  Run from the project directory:
+
+    python3 -m unittest tests/tests.py
+"""
+
+import asyncio
+import collections.abc
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+import netmem
+from netmem import blob, crdt, keytable, lazy, metrics, patch, registry, tracing
+from netmem.budget import SpilledValue
+from netmem.capture_connector import CaptureConnector, read_capture
+from netmem.codec import COMPRESSED, MessageCodec, build_dictionary
+from netmem.hlc import HybridLogicalClock, Timestamp, ZERO
+from netmem.keyindex import KeyIndex, prefix_bounds
+from netmem.lazy import LazyValue
+from netmem.loopback_connector import Link, LoopbackConnector, LoopbackNetwork
+from netmem.membership import Membership
+from netmem.pipeline import DecodePipeline
+from netmem.priority import PriorityClass
+from netmem.replay import replay
+from netmem.simulation import Cluster
+
+__author__ = "Robert Harder"
+__email__ = "rob@iharder.net"
+__date__ = "18 Oct 2026"
+__license__ = "Public Domain"
+
+IMPORT_BUDGET = 1.0  # Seconds "import netmem" may take in a fresh interpreter, generous for slow machines
+
+
+def import_seconds() -> float:
+    """ Returns the fastest of three cold imports of netmem, as reported by python -X importtime. """
+    best = None
+    for _ in range(3):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import netmem"], cwd=PROJECT_DIR,
+                             stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+        for line in out.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() == "netmem":
+                micros = int(parts[1])
+                best = micros if best is None else min(best, micros)
+    return best / 1e6
+
+
+class TestImports(unittest.TestCase):
+    def test_import_loads_no_connectors(self):
+        code = ("import sys, netmem; "
+                "print(','.join(m for m in sys.modules if m.endswith('_connector') or m == 'aiohttp'))")
+        out = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, stdout=subprocess.PIPE,
+                             universal_newlines=True, check=True).stdout
+        self.assertEqual("", out.strip())
+
+    def test_import_time(self):
+        self.assertLess(import_seconds(), IMPORT_BUDGET)
+
+    def test_connectors_load_on_first_use(self):
+        from netmem.udp_connector import UdpConnector
+        self.assertIs(UdpConnector, netmem.UdpConnector)
+        self.assertIn("UdpConnector", dir(netmem))
+        with self.assertRaises(AttributeError):
+            netmem.NoSuchConnector
+
+    def test_other_names_skip_the_entry_points(self):
+        read = []
+        real = registry._read_entry_points
+        registry._read_entry_points = lambda: read.append(1)
+        self.addCleanup(setattr, registry, "_read_entry_points", real)
+        self.assertFalse(hasattr(netmem, "__path_hooks__"))
+        self.assertFalse(hasattr(netmem, "numpy"))
+        self.assertEqual([], read)
+        registry._missing.discard("MissingConnector")
+        for _ in range(2):
+            self.assertFalse(hasattr(netmem, "MissingConnector"))
+        self.assertEqual([1], read)  # The miss is remembered
+
+    def test_register_connector(self):
+        netmem.register_connector("TestCaptureConnector", "netmem.capture_connector:CaptureConnector")
+        try:
+            from netmem.capture_connector import CaptureConnector
+            self.assertIs(CaptureConnector, netmem.connector_class("TestCaptureConnector"))
+            self.assertIn("TestCaptureConnector", netmem.connector_names())
+        finally:
+            registry._targets.pop("TestCaptureConnector")
+            registry._loaded.pop("TestCaptureConnector", None)
+
+
+class TestHybridLogicalClock(unittest.TestCase):
+    def setUp(self):
+        self.wall = 100.0
+        self.clock = HybridLogicalClock("a", clock=lambda: self.wall)
+
+    def test_now_follows_wall_clock(self):
+        self.assertEqual(Timestamp(100.0, 0, "a"), self.clock.now())
+        self.wall = 101.0
+        self.assertEqual(Timestamp(101.0, 0, "a"), self.clock.now())
+
+    def test_now_never_runs_backwards(self):
+        first = self.clock.now()
+        self.wall = 99.0  # Clock stepped back
+        second = self.clock.now()
+        self.assertEqual(Timestamp(100.0, 1, "a"), second)
+        self.assertLess(first, second)
+        self.assertLess(second, self.clock.now())
+
+    def test_update_moves_past_remote(self):
+        self.clock.now()
+        remote = Timestamp(105.0, 3, "b")  # A peer whose clock runs ahead
+        self.assertEqual(Timestamp(105.0, 4, "a"), self.clock.update(remote))
+        self.assertLess(remote, self.clock.now())
+
+    def test_update_with_equal_walls(self):
+        self.clock.now()
+        self.clock.now()  # (100.0, 1)
+        self.assertEqual(Timestamp(100.0, 6, "a"), self.clock.update(Timestamp(100.0, 5, "b")))
+        self.assertEqual(Timestamp(100.0, 7, "a"), self.clock.update(Timestamp(100.0, 2, "b")))
+
+    def test_update_with_older_remote_and_newer_wall(self):
+        self.clock.now()
+        self.wall = 200.0
+        self.assertEqual(Timestamp(200.0, 0, "a"), self.clock.update(Timestamp(150.0, 9, "b")))
+
+    def test_compare_and_parse(self):
+        self.assertLess(Timestamp(1.0, 5, "z"), Timestamp(2.0, 0, "a"))
+        self.assertLess(Timestamp(1.0, 0, "z"), Timestamp(1.0, 1, "a"))
+        self.assertLess(Timestamp(1.0, 1, "a"), Timestamp(1.0, 1, "b"))  # Node breaks ties
+        self.assertEqual(Timestamp(1.5, 2, "n"), Timestamp.parse([1.5, 2, "n"]))
+        self.assertEqual(Timestamp(1.5, 0, ""), Timestamp.parse(1.5))  # Unix time from older peers
+        self.assertEqual(ZERO, Timestamp.parse(None))
+        stamp = Timestamp(1.0, 0, "a")
+        self.assertIs(stamp, Timestamp.parse(stamp))
+
+    def test_stale_remote_change_is_dropped(self):
+        mem = netmem.NetworkMemory()
+        self.assertTrue(mem.set("k", "new", timestamp=[200.0, 0, "b"]))
+        self.assertFalse(mem.set("k", "old", timestamp=[100.0, 0, "c"]))
+        self.assertFalse(mem.set("k", "replay", timestamp=[200.0, 0, "b"]))
+        self.assertEqual("new", mem["k"])
+        mem["k"] = "local"  # Stamped past everything seen
+        self.assertLess(Timestamp(200.0, 0, "b"), mem._timestamps["k"])
+
+
+class RecordingConnector(netmem.Connector):
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+        self.messages = []
+
+    def send_message(self, msg: dict):
+        self.messages.append(json.loads(json.dumps(msg)))  # Encoded when sent, as a real connector would
+        self.sent.append([(c["key"], c.get("new_val")) for c in msg.get("changes", [])])
+
+
+class TestPatches(unittest.TestCase):
+    def test_apply_ops(self):
+        value = {"robots": [{"pose": 1}, {"pose": 2}], "log": ["a"]}
+        patch.apply_op(value, patch.make_op(patch.SET, ["robots", 1, "pose"], 5))
+        patch.apply_op(value, patch.make_op(patch.INSERT, ["log", "-"], "c"))
+        patch.apply_op(value, patch.make_op(patch.INSERT, ["log", 1], "b"))
+        patch.apply_op(value, patch.make_op(patch.REMOVE, ["robots", 0]))
+        patch.apply_op(value, patch.make_op(patch.INSERT, "new", 1))
+        self.assertEqual({"robots": [{"pose": 5}], "log": ["a", "b", "c"], "new": 1}, value)
+
+    def test_bad_ops(self):
+        with self.assertRaises(ValueError):
+            patch.make_op("move", ["a"])
+        with self.assertRaises(ValueError):
+            patch.make_op(patch.SET, [])
+        with self.assertRaises(KeyError):
+            patch.apply_op({}, patch.make_op(patch.SET, ["a", "b"], 1))
+        with self.assertRaises(IndexError):
+            patch.apply_op([], patch.make_op(patch.REMOVE, [0]))
+
+    def test_copy_path_shares_the_rest(self):
+        root = {"a": {"b": [1, 2]}, "other": [3]}
+        copy = patch.copy_path(root, ["a", "b", 0])
+        patch.apply_op(copy, patch.make_op(patch.SET, ["a", "b", 0], 9))
+        self.assertEqual([1, 2], root["a"]["b"])
+        self.assertEqual([9, 2], copy["a"]["b"])
+        self.assertIs(root["other"], copy["other"])
+
+    def test_patches_compose_across_peers(self):
+        a, b = netmem.NetworkMemory(), netmem.NetworkMemory()
+        outbox = RecordingConnector()
+        a._connectors.append(outbox)
+        patched = []
+        b.add_patch_listener(lambda mem, key, path, op, value: patched.append((path, op, value)))
+        a["doc"] = {"items": [], "title": "x"}
+        with a:
+            a.insert_at("doc", ["items", "-"], 1)
+            a.insert_at("doc", ["items", "-"], 2)
+        a.set_at("doc", ["title"], "y")
+        for msg in outbox.messages:
+            b.message_received(outbox, msg)
+        self.assertEqual(a["doc"], b["doc"])
+        self.assertEqual({"items": [1, 2], "title": "y"}, b["doc"])
+        self.assertEqual([(["items", "-"], "insert", 1), (["items", "-"], "insert", 2), (["title"], "set", "y")],
+                         patched)
+        b.message_received(outbox, outbox.messages[1])  # Replayed
+        self.assertEqual([1, 2], b["doc"]["items"])
+
+    def test_patch_older_than_whole_value_is_dropped(self):
+        mem = netmem.NetworkMemory()
+        self.assertTrue(mem.set("doc", {"n": 1}, timestamp=[200.0, 0, "b"]))
+        self.assertFalse(mem.patch("doc", [patch.make_op(patch.SET, ["n"], 2)], timestamp=[150.0, 0, "c"]))
+        self.assertTrue(mem.patch("doc", [patch.make_op(patch.SET, ["n"], 3)], timestamp=[250.0, 0, "c"]))
+        self.assertFalse(mem.patch("doc", [patch.make_op(patch.SET, ["n"], 4)], timestamp=[240.0, 0, "c"]))
+        self.assertTrue(mem.patch("doc", [patch.make_op(patch.SET, ["m"], 5)], timestamp=[240.0, 0, "d"]))
+        self.assertEqual({"n": 3, "m": 5}, mem["doc"])
+        mem.set("doc", {"n": 0}, timestamp=[300.0, 0, "b"])
+        self.assertFalse(mem.patch("doc", [patch.make_op(patch.SET, ["n"], 6)], timestamp=[260.0, 0, "d"]))
+
+    def test_failed_patch_changes_nothing(self):
+        mem = netmem.NetworkMemory()
+        outbox = RecordingConnector()
+        mem._connectors.append(outbox)
+        mem["doc"] = {"items": [1], "title": "x"}
+        stamp = mem._timestamps["doc"]
+        heard = []
+        mem.add_listener(lambda *args: heard.append(args))
+        with self.assertRaises(IndexError):
+            mem.patch("doc", [patch.make_op(patch.SET, ["title"], "y"), patch.make_op(patch.REMOVE, ["items", 5])])
+        self.assertEqual({"items": [1], "title": "x"}, mem["doc"])
+        self.assertEqual(stamp, mem._timestamps["doc"])
+        self.assertEqual([], heard)
+        self.assertEqual(1, len(outbox.messages))
+        mem.patch("doc", [patch.make_op(patch.SET, ["title"], "y"), patch.make_op(patch.REMOVE, ["items", 0])])
+        self.assertEqual({"items": [], "title": "y"}, mem["doc"])
+
+    def test_concurrent_patches_converge(self):
+        a, b = netmem.NetworkMemory(), netmem.NetworkMemory()
+        a_out, b_out = RecordingConnector(), RecordingConnector()
+        a._connectors.append(a_out)
+        b._connectors.append(b_out)
+        a["log"] = []
+        for msg in a_out.messages:
+            b.message_received(a_out, msg)
+        del a_out.messages[:]
+        a.insert_at("log", ["-"], "a")
+        b.insert_at("log", ["-"], "b")
+        # Each hears the other's append, so one of them applies its patch out of order and sends the whole list
+        while a_out.messages or b_out.messages:
+            a_msgs, b_msgs = a_out.messages[:], b_out.messages[:]
+            del a_out.messages[:], b_out.messages[:]
+            for msg in a_msgs:
+                b.message_received(a_out, msg)
+            for msg in b_msgs:
+                a.message_received(b_out, msg)
+        self.assertEqual(a["log"], b["log"])
+        self.assertEqual(["a", "b"], sorted(a["log"]))
+        self.assertEqual(a._timestamps["log"], b._timestamps["log"])
+
+    def test_patch_leaves_snapshot_alone(self):
+        mem = netmem.NetworkMemory()
+        mem["doc"] = {"items": [1]}
+        snap = mem.snapshot()
+        mem.insert_at("doc", ["items", "-"], 2)
+        self.assertEqual({"items": [1]}, snap["doc"])
+        self.assertEqual({"items": [1, 2]}, mem["doc"])
+
+
+class TestCrdts(unittest.TestCase):
+    def check_converges(self, cls, deltas):
+        """ Merges deltas in every order, twice over, and returns the one state they all reach. """
+        states = []
+        for order in itertools.permutations(deltas):
+            state = cls()
+            for delta in order:
+                state.join(json.loads(json.dumps(delta)))
+            for delta in order:
+                self.assertFalse(state.join(delta), "Merging {} again changed {}".format(delta, state))
+            states.append(json.loads(json.dumps(state)))
+        for state in states[1:]:
+            self.assertEqual(states[0], state)
+        return cls(states[0])
+
+    def test_pncounter(self):
+        deltas = [{"crdt": "pncounter", "p": {"a": 3}}, {"crdt": "pncounter", "p": {"a": 5}},
+                  {"crdt": "pncounter", "p": {"b": 2}, "n": {"b": 1}}, {"crdt": "pncounter", "n": {"c": 4}}]
+        self.assertEqual(5 + 2 - 1 - 4, self.check_converges(crdt.PNCounter, deltas).value)
+
+    def test_orset(self):
+        deltas = [{"crdt": "orset", "adds": {"a:1": "x", "a:2": "y"}}, {"crdt": "orset", "removes": {"a:1": 1}},
+                  {"crdt": "orset", "adds": {"b:1": "x"}}, {"crdt": "orset", "adds": {"b:2": "z"}}]
+        state = self.check_converges(crdt.ORSet, deltas)
+        self.assertEqual(["x", "y", "z"], sorted(state.value))  # b's concurrent add of x survives a's remove
+
+    def test_lwwmap(self):
+        deltas = [{"crdt": "lwwmap", "entries": {"speed": [[1.0, 0, "a"], 1, True]}},
+                  {"crdt": "lwwmap", "entries": {"speed": [[2.0, 0, "b"], 2, True]}},
+                  {"crdt": "lwwmap", "entries": {"mode": [[1.0, 0, "a"], "auto", True]}},
+                  {"crdt": "lwwmap", "entries": {"mode": [[1.0, 1, "b"], None, False]}}]
+        self.assertEqual({"speed": 2}, self.check_converges(crdt.LWWMap, deltas).value)
+
+    def exchange(self, *mems):
+        """ Delivers what each memory has sent to every other, as a connected cluster would. """
+        for mem in mems:
+            for msg in mem._connectors[0].messages:
+                for other in mems:
+                    if other is not mem:
+                        other.message_received(mem._connectors[0], msg)
+            mem._connectors[0].messages.clear()
+
+    def test_concurrent_add_and_remove_through_memories(self):
+        a, b = netmem.NetworkMemory(), netmem.NetworkMemory()
+        for mem in (a, b):
+            mem._connectors.append(RecordingConnector())
+        a.orset("online").add("robot-1")
+        a.counter("hits").add(2)
+        self.exchange(a, b)
+        self.assertIn("robot-1", b.orset("online"))
+
+        b.orset("online").remove("robot-1")  # Concurrently with a adding it again
+        a.orset("online").add("robot-1")
+        a.counter("hits").add(1)
+        b.counter("hits").add(-1)
+        a.lwwmap("config")["speed"] = 1
+        b.lwwmap("config")["mode"] = "auto"
+        self.exchange(a, b)
+        for mem in (a, b):
+            self.assertEqual(["robot-1"], list(mem.orset("online")))
+            self.assertEqual(2, mem.counter("hits").value)
+            self.assertEqual({"speed": 1, "mode": "auto"}, mem.lwwmap("config").value)
+
+        a.orset("online").remove("robot-1")
+        self.exchange(a, b)
+        self.assertEqual([], list(b.orset("online")))
+
+
+class TestKeyTables(unittest.TestCase):
+    def send(self, encoder, sender, receiver, *keys) -> (dict, dict):
+        """ Returns a message for keys as it crosses the wire and as the receiver reads it. """
+        msg = {"changes": [{"key": key, "action": "update", "new_val": 1} for key in keys], "name": "a"}
+        [(_, data)] = keytable.encode_for([sender], msg, encoder)
+        wire = json.loads(data.decode())
+        return wire, receiver.decode(json.loads(data.decode()))
+
+    def connection(self) -> (keytable.KeySession, keytable.KeySession):
+        sender, receiver = keytable.KeySession(), keytable.KeySession()
+        sender.decode(dict(keytable.HELLO))  # The receiving end says it understands key IDs
+        return sender, receiver
+
+    def test_keys_defined_once_then_referenced(self):
+        encoder = keytable.KeyEncoder()
+        sender, receiver = self.connection()
+        wire, read = self.send(encoder, sender, receiver, "robot/1/pose", "robot/2/pose")
+        self.assertEqual([("robot/1/pose", 0), ("robot/2/pose", 1)], [(c["key"], c["kid"]) for c in wire["changes"]])
+        self.assertEqual(["robot/1/pose", "robot/2/pose"], [c["key"] for c in read["changes"]])
+
+        wire, read = self.send(encoder, sender, receiver, "robot/2/pose", "robot/1/pose")
+        self.assertEqual([{"action": "update", "new_val": 1, "kid": 1}, {"action": "update", "new_val": 1, "kid": 0}],
+                         wire["changes"])
+        self.assertEqual(["robot/2/pose", "robot/1/pose"], [c["key"] for c in read["changes"]])
+
+        wire, read = self.send(encoder, sender, receiver, "robot/1/pose", "robot/3/pose")
+        self.assertEqual(("robot/3/pose", 2), (wire["changes"][1]["key"], wire["changes"][1]["kid"]))
+        self.assertEqual(["robot/1/pose", "robot/3/pose"], [c["key"] for c in read["changes"]])
+
+    def test_plain_keys_until_peer_says_hello(self):
+        encoder = keytable.KeyEncoder()
+        wire, _ = self.send(encoder, keytable.KeySession(), keytable.KeySession(), "a")
+        self.assertEqual([{"key": "a", "action": "update", "new_val": 1}], wire["changes"])
+
+    def test_tables_start_over_on_reconnect(self):
+        encoder = keytable.KeyEncoder()
+        sender, receiver = self.connection()
+        self.send(encoder, sender, receiver, "a")
+        sender, receiver = self.connection()  # The connection dropped and came back with empty tables
+        wire, read = self.send(encoder, sender, receiver, "a")
+        self.assertEqual(("a", 0), (wire["changes"][0]["key"], wire["changes"][0]["kid"]))
+        self.assertEqual("a", read["changes"][0]["key"])
+        self.assertEqual([], keytable.KeySession().decode({"changes": [{"kid": 0, "action": "update"}]})["changes"])
+
+
+class TestCodec(unittest.TestCase):
+    def message(self, count: int) -> dict:
+        return {"changes": [{"key": "robot/{}/battery".format(i), "action": "update", "new_val": 12.5,
+                             "timestamp": [1700000000.0, 0, "a"]} for i in range(count)], "name": "a"}
+
+    def test_small_messages_go_plain(self):
+        codec = MessageCodec(threshold=1024)
+        msg = self.message(1)
+        data = codec.encode(msg)
+        self.assertEqual(b"{", data[:1])
+        self.assertEqual(msg, codec.decode(data))
+        self.assertEqual(b"{", MessageCodec().encode(self.message(100))[:1])  # No threshold, no compression
+
+    def test_large_messages_compress(self):
+        codec = MessageCodec(threshold=1024)
+        msg = self.message(100)
+        data = codec.encode(msg)
+        self.assertEqual(COMPRESSED, data[0])
+        self.assertLess(len(data), len(json.dumps(msg)) / 4)
+        self.assertEqual(msg, MessageCodec().decode(data))  # Any codec with the same dictionary reads it
+        self.assertEqual(1, codec.metrics()["compressed_out"])
+
+    def test_unreadable_frames(self):
+        data = MessageCodec(threshold=0).encode(self.message(10))
+        with self.assertRaises(ValueError):
+            MessageCodec(dictionary=build_dictionary(keys=["other"])).decode(data)
+        with self.assertRaises(ValueError):
+            MessageCodec().decode(b"\x07" + data[1:])
+
+
+class TestLazyValues(unittest.TestCase):
+    def test_values_stay_raw_until_read(self):
+        sender = netmem.NetworkMemory(lazy=True)
+        sender._connectors.append(RecordingConnector())
+        sender["scan"] = {"points": [1, 2, 3]}
+        sender["count"] = 3
+        changes = [c for msg in sender._connectors[0].messages for c in msg["changes"]]
+        self.assertEqual('{"points": [1, 2, 3]}', changes[0]["raw_val"])
+        self.assertNotIn("new_val", changes[0])
+        self.assertEqual(3, changes[1]["new_val"])  # Only nested values go as text
+
+        relay = netmem.NetworkMemory(lazy=True)
+        relay._connectors.append(RecordingConnector())
+        for msg in sender._connectors[0].messages:
+            relay.message_received(sender._connectors[0], msg)
+        stored = dict.__getitem__(relay, "scan")
+        self.assertIsInstance(stored, LazyValue)
+        self.assertFalse(stored.decoded)
+        self.assertEqual('{"points": [1, 2, 3]}', relay._connectors[0].messages[0]["changes"][0]["raw_val"])
+        self.assertFalse(stored.decoded)  # Passed along without decoding
+        self.assertEqual({"points": [1, 2, 3]}, relay["scan"])
+        self.assertTrue(stored.decoded)
+
+        plain = netmem.NetworkMemory()
+        plain.message_received(sender._connectors[0], sender._connectors[0].messages[0])
+        self.assertEqual({"points": [1, 2, 3]}, dict.__getitem__(plain, "scan"))
+
+    def test_dumps_copies_raw_text(self):
+        value = LazyValue('{"b": 1, "a": [2]}')
+        self.assertEqual('{"x": {"b": 1, "a": [2]}}', lazy.dumps({"x": value}))
+        self.assertFalse(value.decoded)
+
+    def test_dumps_leaves_other_strings_alone(self):
+        value = {"z": [LazyValue("[1]"), "\u0000lazy0", ("t", LazyValue("2"))], "a": "\u0000lazy1"}
+        text = lazy.dumps(value, sort_keys=True, separators=(",", ":"))
+        self.assertEqual('{"a":"\\u0000lazy1","z":[[1],"\\u0000lazy0",["t",2]]}', text)
+        self.assertEqual('{"3": [1]}', lazy.dumps({3: LazyValue("[1]")}))
+        self.assertEqual(json.dumps({"plain": ["\u0000lazy0"]}), lazy.dumps({"plain": ["\u0000lazy0"]}))
+
+
+class TestBursts(unittest.TestCase):
+    def update(self, key, value, wall: float) -> dict:
+        return {"key": key, "action": "update", "new_val": value, "timestamp": [wall, 0, "b"]}
+
+    def test_burst_keeps_newest_update_per_key(self):
+        mem = netmem.NetworkMemory()
+        seen = []
+        mem.add_listener(lambda _mem, key, old_val, new_val: seen.append((key, new_val)))
+        msgs = [{"name": "b", "changes": [self.update("x", 1, 101.0), self.update("y", 1, 101.0)]},
+                {"name": "b", "changes": [self.update("x", 3, 103.0)]},
+                {"name": "b", "changes": [self.update("x", 2, 102.0)]}]  # Arrived out of order
+        mem.messages_received(RecordingConnector(), msgs)
+        self.assertEqual({"x": 3, "y": 1}, dict(mem))
+        self.assertEqual([("x", 3), ("y", 1)], sorted(seen))
+
+    def test_burst_applies_every_update_of_a_patched_key(self):
+        mem = netmem.NetworkMemory()
+        msgs = [{"name": "b", "changes": [self.update("doc", {"items": []}, 101.0)]},
+                {"name": "b", "changes": [{"key": "doc", "action": "patch", "timestamp": [102.0, 0, "b"],
+                                           "ops": [patch.make_op(patch.INSERT, ["items", "-"], 1)]}]},
+                {"name": "b", "changes": [self.update("doc", {"items": [0]}, 100.0)]}]
+        mem.messages_received(RecordingConnector(), msgs)
+        self.assertEqual({"items": [1]}, mem["doc"])
+
+
+class TestDecodePipeline(unittest.TestCase):
+    def test_batches_decode_in_workers_and_stay_in_order(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        pipeline = DecodePipeline(workers=1, min_batch=4)
+        self.addCleanup(pipeline.close)
+        codec = MessageCodec()
+        delivered = []
+        done = loop.create_future()
+
+        def deliver(tag, msgs):
+            delivered.extend((tag, msg["n"]) for msg in msgs)
+            if len(delivered) == 11 and not done.done():
+                done.set_result(None)
+
+        pipeline.start(loop, codec, deliver)
+        payloads = [codec.encode({"n": i}) for i in range(10)]
+        loop.call_soon(pipeline.feed, payloads[:8], "burst")  # To a worker
+        loop.call_soon(pipeline.feed, [b"not json"], "bad")  # Dropped
+        loop.call_soon(pipeline.feed, payloads[8:], "late")  # Decoded right away, delivered after the burst
+        loop.call_soon(pipeline.feed, [codec.encode({"n": 10})], "last")
+        loop.run_until_complete(asyncio.wait_for(done, 30))
+        self.assertEqual([("burst", i) for i in range(8)] + [("late", 8), ("late", 9), ("last", 10)], delivered)
+        self.assertEqual(8, pipeline.worker_payloads)
+        self.assertEqual(4, pipeline.inline_payloads)
+
+
+class RecordingTracer(tracing.Tracer):
+    def __init__(self):
+        self.stages = []
+
+    def local_set(self, memory, key, trace_id: str):
+        self.stages.append(("local_set", trace_id))
+
+    def batch(self, memory, trace_ids: [str]):
+        self.stages.extend(("batch", t) for t in trace_ids)
+
+    def sent(self, memory, connector, trace_ids: [str], seconds: float):
+        self.stages.extend(("sent", t) for t in trace_ids)
+
+    def applied(self, memory, connector, trace_ids: [str], seconds: float):
+        self.stages.extend(("applied", t) for t in trace_ids)
+
+    def listener_called(self, memory, listener, key, trace_id: str, seconds: float):
+        self.stages.append(("listener_called", trace_id))
+
+
+class TestTracing(unittest.TestCase):
+    def test_trace_ids_follow_a_change_across_peers(self):
+        a, b = netmem.NetworkMemory(tracer=RecordingTracer()), netmem.NetworkMemory(tracer=RecordingTracer())
+        a._connectors.append(RecordingConnector())
+        b.add_listener(lambda *args: None)
+        a["k"] = 1
+        b.message_received(a._connectors[0], a._connectors[0].messages[0])
+
+        trace = tracing.trace_id(a._timestamps["k"])
+        self.assertEqual([("local_set", trace), ("batch", trace), ("sent", trace)], a.tracer.stages)
+        self.assertEqual([("applied", trace), ("batch", trace), ("listener_called", trace)], b.tracer.stages)
+        self.assertEqual(trace, tracing.trace_id(b._timestamps["k"]))
+
+    def test_slow_listener_reported(self):
+        mem = netmem.NetworkMemory(tracer=tracing.SlowListenerDetector(threshold=0.0))
+        mem.add_listener(lambda *args: None)
+        with self.assertLogs("netmem.tracing", "WARNING") as logs:
+            mem["k"] = 1
+        self.assertIn("on key k", logs.output[0])
+
+
+class TestCapture(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".nmcap")
+        os.close(fd)
+        os.remove(self.path)
+        self.addCleanup(lambda: os.path.exists(self.path) and os.remove(self.path))
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def test_replay_rebuilds_the_memory(self):
+        mem = netmem.NetworkMemory()
+        mem.connect(CaptureConnector(self.path), loop=self.loop)
+        mem["a"] = 1
+        with mem:
+            mem["b"] = {"nested": [1, 2]}
+            mem["a"] = 2
+        mem["c"] = "x" * 1000
+        mem.close_all()
+
+        self.assertEqual(3, len(list(read_capture(self.path))))
+        copy = netmem.NetworkMemory()
+        stats = replay(self.path, copy, speed=0)
+        self.assertEqual({"messages": 3, "changes": 4}, {k: stats[k] for k in ("messages", "changes")})
+        self.assertEqual(dict(mem), dict(copy))
+        self.assertEqual(mem._timestamps["c"], copy._timestamps["c"])
+
+    def test_record_cut_short_ends_the_capture(self):
+        mem = netmem.NetworkMemory()
+        mem.connect(CaptureConnector(self.path), loop=self.loop)
+        mem["a"] = 1
+        mem["b"] = 2
+        mem.close_all()
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 3)
+        self.assertEqual([[{"key": "a", "new_val": 1}]],
+                         [[{k: c[k] for k in ("key", "new_val")} for c in msg["changes"]]
+                          for _, msg in read_capture(self.path)])
+
+
+class TestLoopback(unittest.TestCase):
+    def test_messages_arrive_after_the_link_latency(self):
+        network = LoopbackNetwork(Link(latency=0.005), seed=1)
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        a, b = netmem.NetworkMemory(), netmem.NetworkMemory()
+        a.connect(LoopbackConnector(network, "a"), loop=loop)
+        b.connect(LoopbackConnector(network, "b"), loop=loop)
+        a["x"] = 1
+        self.assertNotIn("x", b)
+        self.assertEqual(1, network.run(until=0.005))  # Not b's relay of it back to a
+        self.assertEqual(1, b["x"])
+        self.assertAlmostEqual(0.005, network.now)
+
+    def test_cluster_converges_repeatably(self):
+        results = []
+        for _ in range(2):
+            cluster = Cluster(20, topology="random", degree=3, link=Link(latency=0.005, jitter=0.002), seed=7)
+            try:
+                result = cluster.converge()
+                result.pop("bytes")  # Messages carry the wall clock time they were sent
+                results.append(result)
+            finally:
+                cluster.close()
+        self.assertTrue(results[0]["converged"])
+        self.assertEqual(results[0], results[1])
+
+    def test_lossy_cluster_falls_short(self):
+        cluster = Cluster(5, topology="ring", link=Link(loss=1.0), seed=1)
+        try:
+            result = cluster.converge()
+        finally:
+            cluster.close()
+        self.assertFalse(result["converged"])
+        self.assertEqual(1, result["reached"])
+        self.assertEqual(2, result["dropped"])
+
+
+class TestBlobTransfer(unittest.TestCase):
+    def setUp(self):
+        self.sender = blob.BlobTransfer(threshold=100, chunk_size=64)
+        self.receiver = blob.BlobTransfer(threshold=100)
+        self.value = {"data": "x" * 500}
+        msg = {"changes": [{"key": "big", "action": "update", "new_val": self.value}]}
+        self.ref = self.sender.outgoing(msg)["changes"][0]["new_val"]
+
+    def message(self) -> dict:
+        return {"changes": [{"key": "big", "action": "update", "new_val": dict(self.ref)}]}
+
+    def test_wants_follow_the_sender_that_is_still_connected(self):
+        first, second = object(), object()
+        self.assertEqual((None, [self.ref[blob.REF]]), self.receiver.incoming(self.message(), first))
+        self.assertEqual((None, [self.ref[blob.REF]]), self.receiver.incoming(self.message(), second))
+        self.assertEqual({}, self.receiver.closed(first))
+
+        ready = []
+        for frame in self.sender.chunks(self.ref[blob.REF]):
+            ready.extend(self.receiver.receive_chunk(frame))
+        self.assertEqual(1, len(ready))
+        self.assertEqual(self.value, json.loads(ready[0]["changes"][0]["raw_val"]))
+        self.assertEqual({}, self.receiver._held)
+
+    def test_closing_the_only_sender_asks_the_others(self):
+        first, second = object(), object()
+        self.receiver.incoming(self.message(), first)
+        self.receiver._wanted[second] = set()
+        self.receiver._held[self.ref[blob.REF]].append((self.message(), second))
+        self.assertEqual({second: [self.ref[blob.REF]]}, self.receiver.closed(first))
+        self.receiver.closed(second)
+        self.assertEqual({}, self.receiver._held)
+
+    def test_size_in_chunk_must_match_reference(self):
+        self.receiver.incoming(self.message(), None)
+        frame = next(self.sender.chunks(self.ref[blob.REF]))
+        digest = bytes.fromhex(self.ref[blob.REF])
+        bad = blob._HEADER.pack(blob.CHUNK, digest, 1 << 40, 0) + frame[blob._HEADER.size:]
+        self.assertEqual([], self.receiver.receive_chunk(bad))
+        self.assertEqual({}, self.receiver._held)
+        self.assertEqual({}, self.receiver._assemblies)
+
+
+    def test_large_values_are_encoded_off_the_loop_in_order(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        threads, encode = [], blob._encode
+        sent = []
+
+        def _encode(values):
+            threads.append(threading.current_thread())
+            return encode(values)
+
+        big = {"changes": [{"key": "big", "action": "update", "new_val": {"data": "y" * 500}}]}
+        small = {"changes": [{"key": "small", "action": "update", "new_val": 1}]}
+        blob._encode = _encode
+        self.addCleanup(setattr, blob, "_encode", encode)
+
+        async def _send_both():
+            self.sender.outgoing_in_order(big, sent.append, loop)
+            self.sender.outgoing_in_order(small, sent.append, loop)
+            self.assertEqual([], sent)  # The small message waits behind the big one
+            while len(sent) < 2:
+                await asyncio.sleep(0.01)
+
+        loop.run_until_complete(asyncio.wait_for(_send_both(), 10))
+        loop.run_until_complete(loop.shutdown_default_executor())
+        self.assertEqual(["big", "small"], [m["changes"][0]["key"] for m in sent])
+        self.assertEqual(1, len(threads))
+        self.assertIsNot(threading.current_thread(), threads[0])
+        self.assertTrue(blob.is_ref(sent[0]["changes"][0]["new_val"]))
+        self.assertEqual(sent[0], self.sender.outgoing(big))
+        self.sender.outgoing_in_order(small, sent.append, loop)  # Nothing queued, so sent at once
+        self.assertEqual(3, len(sent))
+
+
+class TestGossipDigest(unittest.TestCase):
+    def test_digest_follows_timestamps(self):
+        from netmem.gossip_connector import GossipConnector
+        a, b = netmem.NetworkMemory(), netmem.NetworkMemory()
+        for i in range(100):
+            a["k{}".format(i)] = {"v": i}
+        for key in a:
+            b.set(key, a[key], timestamp=list(a._timestamps[key]))
+        gossip_a, gossip_b = GossipConnector(buckets=16), GossipConnector(buckets=16)
+        gossip_a.netmem, gossip_b.netmem = a, b
+        self.assertEqual(gossip_a.digest(), gossip_b.digest())
+
+        b["k7"] = {"v": 7}  # Same value, newer version
+        differ = [i for i, (x, y) in enumerate(zip(gossip_a.digest(), gossip_b.digest())) if x != y]
+        self.assertEqual([gossip_a._bucket("k7")], differ)
+
+
+class TestSharded(unittest.TestCase):
+    def test_listener_may_read_the_memory(self):
+        from netmem.sharded import ShardedNetworkMemory
+        mem = ShardedNetworkMemory(shards=2)
+        count = 2000
+        seen = []
+        done = threading.Event()
+
+        def _listener(sharded, key, old_val, new_val):
+            seen.append(sharded[key])  # A request to the worker that is sending the events
+            if len(seen) == count:
+                done.set()
+
+        def _work():
+            mem.add_listener(_listener)
+            for i in range(count):
+                mem["k{}".format(i)] = "x" * 1000  # Enough events to fill the pipes
+            mem.sync()
+
+        try:
+            worker = threading.Thread(target=_work, daemon=True)
+            worker.start()
+            worker.join(30)
+            self.assertFalse(worker.is_alive(), "Sets stalled")
+            self.assertTrue(done.wait(30), "Listener stalled after {} of {} changes".format(len(seen), count))
+            self.assertEqual("x" * 1000, seen[-1])
+        finally:
+            mem.close()
+
+
+class TestKeyQueries(unittest.TestCase):
+    def check(self, mem):
+        keys = ["robot/{}/{}".format(r, field) for r in range(30) for field in ("battery", "pose")]
+        for key in keys:
+            mem[key] = 1
+        mem["robots"] = 1
+        mem[7] = "not a string"
+        self.assertEqual(["robot/17/battery", "robot/17/pose"], mem.keys(prefix="robot/17/"))
+        self.assertEqual(60, mem.count(prefix="robot/"))
+        self.assertEqual(sorted(keys + ["robots"])[:5], mem.keys(start="robot/", stop="robot/10/pose"))
+        self.assertEqual(["robot/9/pose", "robots"], mem.keys(start="robot/9/pose"))
+        self.assertEqual([("robot/3/pose", 1)], mem.items(prefix="robot/3/p"))
+
+        del mem["robot/17/pose"]
+        mem.pop("robot/18/pose")
+        mem["robot/17/arm"] = 2
+        self.assertEqual(["robot/17/arm", "robot/17/battery"], mem.keys(prefix="robot/17/"))
+        self.assertEqual(59, mem.count(prefix="robot/"))
+        self.assertEqual(0, mem.count(prefix="robot/18/p"))
+        self.assertEqual(0, mem.count(start="z"))
+        mem.clear()
+        self.assertEqual([], mem.keys(prefix="robot/"))
+
+    def test_scan(self):
+        self.check(netmem.NetworkMemory())
+
+    def test_index(self):
+        self.check(netmem.NetworkMemory(key_index=True))
+
+    def test_index_across_sublists(self):
+        index = KeyIndex()
+        index.LOAD = 4
+        keys = ["{:03d}".format(i) for i in range(100)]
+        for key in reversed(keys):
+            index.add(key)
+        self.assertGreater(len(index._lists), 1)
+        self.assertEqual(keys[10:37], list(index.irange("010", "037")))
+        self.assertEqual(27, index.count("010", "037"))
+        for key in keys[20:30]:
+            index.discard(key)
+        self.assertEqual(keys[10:20] + keys[30:37], list(index.irange("010", "037")))
+        self.assertEqual(17, index.count("010", "037"))
+        self.assertEqual(("a/", "a0"), prefix_bounds("a/"))
+
+    def test_counts_follow_every_change(self):
+        index = KeyIndex()
+        index.LOAD = 4
+        keys = set()
+        for step in range(600):
+            key = "{:03d}".format((step * 37) % 211)
+            if step % 3 == 2:
+                index.discard(key)
+                keys.discard(key)
+            else:
+                index.add(key)
+                keys.add(key)
+            low, high = "{:03d}".format(step % 200), "{:03d}".format(step % 200 + 40)
+            self.assertEqual(sum(1 for k in keys if low <= k < high), index.count(low, high))
+        self.assertEqual(len(keys), index.count())
+
+
+class TestSnapshots(unittest.TestCase):
+    def test_no_index_until_first_snapshot(self):
+        mem = netmem.NetworkMemory()
+        mem["a"] = 1
+        self.assertIsNone(mem._cow)
+        self.assertEqual({"a": 1}, dict(mem.snapshot().items()))
+        self.assertIsNotNone(mem._cow)
+
+    def test_snapshot_isolated_from_later_writes(self):
+        mem = netmem.NetworkMemory()
+        for i in range(5000):  # Enough keys that the index grows after the first snapshot
+            mem["k{}".format(i)] = i
+        first = mem.snapshot()
+        mem["k0"] = "changed"
+        mem["new"] = 1
+        del mem["k1"]
+        mem.pop("k2")
+        second = mem.snapshot()
+        for i in range(5000, 10000):
+            mem["k{}".format(i)] = i
+        mem.clear()
+
+        self.assertEqual(5000, len(first))
+        self.assertEqual(0, first["k0"])
+        self.assertEqual(1, first["k1"])
+        self.assertNotIn("new", first)
+        self.assertEqual(dict(("k{}".format(i), i) for i in range(5000)), dict(first.items()))
+        self.assertEqual(4999, len(second))
+        self.assertEqual("changed", second["k0"])
+        self.assertNotIn("k1", second)
+        self.assertNotIn("k2", second)
+        self.assertNotIn("k5000", second)
+        self.assertEqual(0, len(mem.snapshot()))
+
+    def test_merge_leaves_snapshot_alone(self):
+        mem = netmem.NetworkMemory()
+        mem.orset("online").add("robot-1")
+        snap = mem.snapshot()
+        mem.orset("online").add("robot-2")
+        self.assertEqual(["robot-1"], list(crdt.ORSet(snap["online"]).value))
+        self.assertEqual(["robot-1", "robot-2"], sorted(mem.orset("online")))
+
+    def test_first_snapshot_while_writing(self):
+        mem = netmem.NetworkMemory()
+        for i in range(20000):
+            mem["k{}".format(i)] = 0
+
+        def write():
+            for i in range(20000):
+                mem["k{}".format(i)] = 1
+        writer = threading.Thread(target=write)
+        writer.start()
+        mem.snapshot()
+        writer.join()
+        self.assertEqual(dict(mem), dict(mem.snapshot().items()))
+
+
+class TestDictMethods(unittest.TestCase):
+    def test_setdefault_and_ior_keep_indexes_in_step(self):
+        mem = netmem.NetworkMemory(key_index=True).limit_memory()
+        self.assertEqual(1, mem.setdefault("a/1", 1))
+        self.assertEqual(1, mem.setdefault("a/1", 2))
+        mem |= {"a/2": 2}
+        self.assertEqual(["a/1", "a/2"], mem.keys(prefix="a/"))
+        self.assertEqual({"a/1": 1, "a/2": 2}, dict(mem.snapshot().items()))
+        self.assertEqual(2, mem.memory_usage()["keys"])
+        self.assertIn("a/2", mem._timestamps)
+
+
+class TestMemoryBudget(unittest.TestCase):
+    def test_cold_values_spill_and_fault_in(self):
+        mem = netmem.NetworkMemory(memory_budget=100000)
+        for i in range(100):
+            mem["k{}".format(i)] = {"data": list(range(100)), "i": i}
+        usage = mem.memory_usage()
+        self.assertLessEqual(usage["resident"], 100000)
+        self.assertGreater(usage["spilled_keys"], 0)
+        self.assertIsInstance(dict.__getitem__(mem, "k0"), SpilledValue)
+        self.assertNotIsInstance(dict.__getitem__(mem, "k99"), SpilledValue)
+
+        snap = mem.snapshot()
+        self.assertEqual(0, mem["k0"]["i"])
+        self.assertIsInstance(dict.__getitem__(mem, "k0"), dict)
+        self.assertEqual(1, mem.memory_usage()["misses"])
+        self.assertEqual(1, snap["k1"]["i"])
+        self.assertEqual(list(range(100)), dict(mem.items())["k2"]["data"])
+        self.assertIsInstance(dict.__getitem__(mem, "k2"), SpilledValue)  # Reading every item leaves it on disk
+
+    def test_only_values_that_read_back_unchanged_spill(self):
+        mem = netmem.NetworkMemory().limit_memory(1, min_spill=0)
+        mem["tuple"] = tuple(range(100))
+        mem["int_keys"] = {i: i for i in range(100)}
+        mem["list"] = list(range(100))
+        mem["x"] = 1
+        self.assertEqual(tuple(range(100)), dict.__getitem__(mem, "tuple"))
+        self.assertEqual({i: i for i in range(100)}, dict.__getitem__(mem, "int_keys"))
+        self.assertIsInstance(dict.__getitem__(mem, "list"), SpilledValue)
+
+    def test_spilled_old_value_is_read_from_disk_once(self):
+        mem = netmem.NetworkMemory().limit_memory(1, min_spill=0)
+        mem["a"] = list(range(100))
+        mem["b"] = 1
+        self.assertIsInstance(dict.__getitem__(mem, "a"), SpilledValue)
+        store, reads = mem._budget.store, []
+        get = store.get
+        store.get = lambda ref: reads.append(ref) or get(ref)
+        old_vals = []
+        mem.add_listener(lambda _mem, key, old_val, new_val: old_vals.append(old_val))
+        mem.add_listener(lambda _mem, key, old_val, new_val: old_vals.append(old_val))
+        mem["a"] = []
+        self.assertEqual([list(range(100))] * 2, old_vals)
+        self.assertEqual(1, len(reads))
+
+
+    def test_views_leave_values_on_disk(self):
+        mem = netmem.NetworkMemory().limit_memory(1, min_spill=0)
+        mem["a"] = list(range(100))
+        mem["b"] = 1
+        values, items = mem.values(), mem.items()
+        self.assertIsInstance(values, collections.abc.ValuesView)
+        self.assertIsInstance(items, collections.abc.ItemsView)
+        self.assertEqual(2, len(values))
+        self.assertIn(list(range(100)), values)
+        self.assertIn(("a", list(range(100))), items)
+        self.assertNotIn(("a", []), items)
+        mem["c"] = 2
+        self.assertEqual({"a": list(range(100)), "b": 1, "c": 2}, dict(items))  # Views follow later changes
+        self.assertIsInstance(dict.__getitem__(mem, "a"), SpilledValue)
+
+    def test_nothing_left_to_spill_is_not_rescanned(self):
+        mem = netmem.NetworkMemory().limit_memory(1000, min_spill=10 ** 6)  # Nothing is large enough to spill
+        budget = mem._budget
+        for i in range(200):
+            mem["k{}".format(i)] = i
+        self.assertEqual(0, mem.memory_usage()["spilled_keys"])
+        self.assertEqual([], list(budget.cold_keys()))
+        order = list(budget._sizes)
+        mem["k200"] = 200
+        self.assertEqual(order + ["k200"], list(budget._sizes))  # Not walked again
+        budget.min_spill = 0
+        mem["big"] = list(range(1000))  # Large enough to spill, so the next pass looks again
+        self.assertGreater(mem.memory_usage()["spilled_keys"], 0)
+
+
+class TestMembership(unittest.TestCase):
+    def test_peers_join_and_expire(self):
+        members = Membership(timeout=5.0)
+        a, b = RecordingConnector(), RecordingConnector()
+        peer = members.seen("n1", "mem1", a, sent=time.time() - 0.5)
+        self.assertEqual({"n1": peer}, members.peers())
+        self.assertGreaterEqual(peer.lag, 0.5)
+        members.seen("n2", "mem2", a)
+        self.assertIs(b, members.seen("n1", "mem1", b).connector)  # Heard on another connector
+
+        members.peers()["n2"].last_seen -= 10
+        self.assertEqual(["n2"], [p.node for p in members.evict_expired()])
+        self.assertEqual(["n1"], list(members.peers()))
+        self.assertEqual(["n1"], [p.node for p in members.remove_connector(b)])
+        self.assertEqual(0, len(members))
+
+    def test_table_changes_from_several_threads(self):
+        members = Membership(timeout=60.0)
+        connector = RecordingConnector()
+        done = threading.Event()
+        errors = []
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)  # Switch threads often, so the race would show
+
+        def churn():
+            i = 0
+            while not done.is_set():
+                members.seen("n{}".format(i), "mem", connector)
+                i += 1
+                if i % 200 == 0:
+                    members.remove_connector(connector)
+
+        writer = threading.Thread(target=churn)
+        writer.start()
+        try:
+            for _ in range(10000):
+                members.evict_expired()  # Each iterates the table while churn() changes it
+                members.remove_connector(None)
+        except RuntimeError as e:  # "dictionary changed size during iteration"
+            errors.append(e)
+        finally:
+            done.set()
+            writer.join()
+        self.assertEqual([], errors)
+
+    def test_no_heartbeats_by_default(self):
+        mem = netmem.NetworkMemory()
+        connector = RecordingConnector()
+        connector.loop = asyncio.new_event_loop()
+        self.addCleanup(connector.loop.close)
+        mem.connection_made(connector)
+        connector.loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertEqual([], connector.messages)
+
+        mem.message_received(connector, {"name": "other", "node": "n1", "sent": time.time(), "changes": []})
+        self.assertEqual("other", mem.peers()["n1"].name)
+        mem.connection_lost(connector)
+        self.assertEqual({}, mem.peers())
+
+    def test_heartbeats_expire_quiet_peers(self):
+        mem = netmem.NetworkMemory(heartbeat_interval=0.01, peer_timeout=0.05)
+        connector = RecordingConnector()
+        connector.lost = []
+        connector.peer_lost = connector.lost.append
+        connector.loop = asyncio.new_event_loop()
+        self.addCleanup(connector.loop.close)
+        mem.connection_made(connector)
+        mem.message_received(connector, {"name": "other", "node": "n1", "sent": time.time()})
+        self.assertIn("n1", mem.peers())
+
+        connector.loop.run_until_complete(asyncio.sleep(0.2))
+        self.assertGreater(len(connector.messages), 1)
+        self.assertNotIn("changes", connector.messages[0])
+        self.assertEqual(mem.node_id, connector.messages[0]["node"])
+        self.assertEqual({}, mem.peers())
+        self.assertEqual(["n1"], connector.lost)
+        mem.connection_lost(connector)
+
+
+class TestPriorities(unittest.TestCase):
+    def setUp(self):
+        self.control = PriorityClass("control", priority=10)
+        self.telemetry = PriorityClass("telemetry", priority=-10, rate=10, burst=1)
+        self.mem = netmem.NetworkMemory(priorities={"estop": self.control, "telemetry/*": self.telemetry})
+        self.now = self.mem._outbound.clock()
+        self.mem._outbound.clock = lambda: self.now
+        self.connector = RecordingConnector()
+        self.mem._connectors.append(self.connector)  # Without a loop, so held changes wait for the next send
+
+    def test_urgent_changes_go_first(self):
+        with self.mem:
+            self.mem["telemetry/a"] = 1
+            self.mem["x"] = 1
+            self.mem["estop"] = True
+        self.assertEqual([[("estop", True)], [("x", 1)], [("telemetry/a", 1)]], self.connector.sent)
+
+    def test_rate_limited_changes_coalesce(self):
+        for i in range(10):
+            self.mem["telemetry/a"] = i
+        self.mem["estop"] = True
+        self.assertEqual([[("telemetry/a", 0)], [("estop", True)]], self.connector.sent)
+
+        self.now += 0.15  # One more token
+        self.mem["estop"] = False
+        self.assertEqual([[("estop", False)], [("telemetry/a", 9)]], self.connector.sent[2:])
+
+    def test_flush_outbound(self):
+        self.mem["telemetry/a"] = 1
+        self.mem["telemetry/b"] = 2
+        self.assertEqual([[("telemetry/a", 1)]], self.connector.sent)
+        self.mem.flush_outbound()
+        self.assertEqual([[("telemetry/a", 1)], [("telemetry/b", 2)]], self.connector.sent)
+
+    def test_class_cache_is_bounded(self):
+        outbound = self.mem._outbound
+        outbound.CACHE_SIZE = 10
+        for i in range(100):
+            self.assertIs(self.telemetry, outbound.class_of("telemetry/{}".format(i)))
+            outbound.class_of("estop")  # Kept, being used all along
+        self.assertEqual(10, len(outbound._classes))
+        self.assertIn("estop", outbound._classes)
+        self.assertIs(self.control, outbound.class_of("estop"))
+
+
+def wait_for(condition, timeout: float = 10.0) -> bool:
+    """ Polls condition until it is true or timeout seconds pass, and returns its last result. """
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestSharedMemory(unittest.TestCase):
+    def test_ring_wraps_past_capacity(self):
+        from netmem.shm_connector import RingBuffer
+        ring = RingBuffer("netmem_test_{}".format(os.getpid()), capacity=64, create=True)
+        self.addCleanup(ring.close)
+        reader = RingBuffer(ring.name)
+        self.addCleanup(reader.close)
+        pos, seen = 0, []
+        for i in range(40):
+            ring.write("record {:02d}".format(i).encode())  # 13 bytes with its length
+            if i % 3 == 2:
+                records, pos, lost = reader.read_from(pos)
+                self.assertFalse(lost)
+                seen.extend(records)
+        records, pos, lost = reader.read_from(pos)
+        seen.extend(records)
+        self.assertEqual(["record {:02d}".format(i).encode() for i in range(40)], seen)
+        self.assertEqual(40 * 13, pos)
+
+        for i in range(6):
+            ring.write(b"x" * 9)
+        records, end, lost = reader.read_from(pos)  # Lapped
+        self.assertEqual(([], ring.write_pos, True), (records, end, lost))
+        with self.assertRaises(ValueError):
+            ring.write(b"x" * 61)
+
+    def test_memories_sync_from_any_thread(self):
+        from netmem.shm_connector import SharedMemoryConnector
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        channel = "test{}".format(os.getpid())
+        a, b = netmem.NetworkMemory(), netmem.NetworkMemory()
+        ca = a.connect_on_new_thread(SharedMemoryConnector(channel, poll_interval=0.05, directory=directory))
+        cb = b.connect_on_new_thread(SharedMemoryConnector(channel, poll_interval=0.05, directory=directory))
+        try:
+            self.assertTrue(wait_for(lambda: ca._peer_rings and cb._peer_rings))
+
+            def write(prefix):
+                for i in range(300):
+                    a["{}/{}".format(prefix, i)] = i
+            writers = [threading.Thread(target=write, args=(p,)) for p in ("x", "y")]
+            writers.append(threading.Thread(target=lambda: ca.send_message(a.state_message())))
+            for writer in writers:
+                writer.start()
+            for writer in writers:
+                writer.join()
+            self.assertTrue(wait_for(lambda: len(b) == 600))
+            self.assertEqual(dict(a), dict(b))
+            b["z"] = 1
+            self.assertTrue(wait_for(lambda: "z" in a))
+        finally:
+            for connector in (ca, cb):
+                connector.close()
+                connector.loop.call_soon_threadsafe(connector.loop.stop)
+            self.assertTrue(wait_for(lambda: not os.listdir(directory)))
+
+
+class TestStreams(unittest.TestCase):
+    def test_client_reconnects_and_resyncs(self):
+        from netmem.stream_connector import StreamClientConnector, StreamServerConnector
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "server.sock")
+        self.addCleanup(os.rmdir, directory)
+        a, b = netmem.NetworkMemory(), netmem.NetworkMemory()
+        a["before"] = 1
+        server = a.connect_on_new_thread(StreamServerConnector(path))
+        client = b.connect_on_new_thread(StreamClientConnector(path, reconnect_delay=0.05))
+        try:
+            self.assertTrue(wait_for(lambda: b.get("before") == 1))  # Sent when the connection opened
+            server.close()
+            self.assertTrue(wait_for(lambda: server not in a._connectors and not client._writers))
+            a["while_down"] = 2
+            b["client_while_down"] = 3
+            os.remove(path)
+            server = a.connect(StreamServerConnector(path), loop=server.loop)
+            self.assertTrue(wait_for(lambda: b.get("while_down") == 2 and a.get("client_while_down") == 3))
+            a["after"] = 4
+            self.assertTrue(wait_for(lambda: b.get("after") == 4))
+        finally:
+            tasks = list(client._tasks)
+            for connector in (client, server):
+                connector.close()
+            wait_for(lambda: all(task.done() for task in tasks) and server not in a._connectors)
+            for connector in (client, server):
+                connector.loop.call_soon_threadsafe(connector.loop.stop)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class TestRegions(unittest.TestCase):
+    def setUp(self):
+        self.a, self.b = netmem.NetworkMemory(), netmem.NetworkMemory()
+        self.outbox = RecordingConnector()
+        self.a._connectors.append(self.outbox)
+
+    def deliver(self, to):
+        for msg in self.outbox.messages:
+            to.message_received(self.outbox, msg)
+        del self.outbox.messages[:]
+
+    def test_slices_round_trip(self):
+        heard = []
+        lidar = self.a.array("lidar", "f4", 8)
+        lidar[2:5] = [1.5, 2.5, 3.5]
+        lidar[7] = -1.0
+        self.b.array("lidar", "f4", 8).add_listener(lambda region, start, stop, view: heard.append((start, stop)))
+        self.deliver(self.b)
+        self.assertEqual(list(lidar[:]), list(self.b.array("lidar", "f4")[:]))
+        self.assertEqual([(2, 5), (7, 8)], heard)
+
+    def test_bad_slice_changes_nothing(self):
+        self.a.array("counts", "i4", 4)[0:4] = [1, 2, 3, 4]
+        self.deliver(self.b)
+        good = self.b.array("counts", "i4")
+        for bad in ({"start": 2}, {"count": 3}, {"start": -1}, {"data": "!!"}):
+            self.a.array("counts", "i4")[0:4] = [5, 6, 7, 8]
+            change = self.outbox.messages[-1]["changes"][0]
+            change.update(bad)
+            self.deliver(self.b)
+            self.assertEqual([1, 2, 3, 4], list(good[:]))
+        self.a.array("other", "i4", 2)[0] = 1
+        self.outbox.messages[-1]["changes"][0]["count"] = 2
+        self.deliver(self.b)
+        self.assertNotIn("other", self.b.regions())
+
+    def test_late_joiner_gets_regions(self):
+        from netmem.gossip_connector import GossipConnector
+        self.a.array("lidar", "u1", 4)[1:3] = [7, 9]
+        self.a.array("empty", "u1", 4)
+        late = netmem.NetworkMemory()
+        late.message_received(self.outbox, json.loads(json.dumps(self.a.state_message())))
+        self.assertEqual([0, 7, 9, 0], list(late.array("lidar", "u1")[:]))
+        self.assertNotIn("empty", late.regions())
+
+        gossip_a, gossip_b = GossipConnector(buckets=8), GossipConnector(buckets=8)
+        gossip_a.netmem, gossip_b.netmem = self.a, self.b
+        self.assertNotEqual(gossip_a.digest(), gossip_b.digest())
+        bucket = gossip_a._bucket("lidar")
+        self.b.message_received(self.outbox, {"changes": json.loads(json.dumps(gossip_a.entries([bucket])))})
+        self.assertEqual(gossip_a.digest(), gossip_b.digest())
+        self.assertEqual([0, 7, 9, 0], list(self.b.array("lidar", "u1")[:]))
+
+        self.b.array("lidar", "u1")[0] = 1  # Newer than a's, so a's state no longer replaces it
+        self.assertFalse(self.b.apply_slice(self.a.region_state("lidar")))
+        self.assertEqual([1, 7, 9, 0], list(self.b.array("lidar", "u1")[:]))
+
+
+class TestMetrics(unittest.TestCase):
+    def test_unnamed_memories_get_their_own_names(self):
+        a, b = netmem.NetworkMemory(), netmem.NetworkMemory()
+        self.addCleanup(a.close_all)
+        self.addCleanup(b.close_all)
+        self.assertNotEqual(a.name, b.name)
+        a["x"] = 1
+        changes = metrics.snapshot()["netmem_changes_total"]
+        self.assertEqual(1, changes['memory="{}"'.format(a.name)])
+        self.assertEqual(0, changes['memory="{}"'.format(b.name)])
+
+    def test_counters_and_text(self):
+        a, b = netmem.NetworkMemory(name="metrics-a"), netmem.NetworkMemory(name="metrics-b")
+        self.addCleanup(a.close_all)
+        self.addCleanup(b.close_all)
+        outbox = RecordingConnector()
+        a._connectors.append(outbox)
+        with a:
+            a["x"] = 1
+            a["y"] = 2
+        outbox.metrics.sent(100)
+        b.message_received(outbox, outbox.messages[0])
+        text = metrics.render_text()
+        self.assertIn("# TYPE netmem_changes_total counter", text)
+        self.assertIn('netmem_changes_total{memory="metrics-a"} 2', text)
+        self.assertIn('netmem_messages_sent_total{{connector="{}"}} 1'.format(outbox.metrics.label), text)
+        self.assertIn('netmem_bytes_sent_total{{connector="{}"}} 100'.format(outbox.metrics.label), text)
+        self.assertIn("# TYPE netmem_message_changes histogram", text)
+        self.assertIn('netmem_message_changes_bucket{memory="metrics-b",le="2"} 1', text)
+        self.assertIn('netmem_message_changes_count{memory="metrics-b"} 1', text)
+        self.assertIn('netmem_message_changes_sum{memory="metrics-b"} 2', text)
+
+    def test_closing_unregisters(self):
+        mem = netmem.NetworkMemory(name="metrics-closed", memory_budget=10 ** 6)
+        connector = RecordingConnector()
+        mem._connectors.append(connector)
+        mem["x"] = 1
+        text = metrics.render_text()
+        self.assertIn('memory="metrics-closed"', text)
+        self.assertIn('connector="{}"'.format(connector.metrics.label), text)
+        mem.close_all()
+        text = metrics.render_text()
+        self.assertNotIn('memory="metrics-closed"', text)
+        self.assertNotIn('connector="{}"'.format(connector.metrics.label), text)
+
+
+if __name__ == "__main__":
+    unittest.main()